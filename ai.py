@@ -0,0 +1,1098 @@
+"""
+Cliente de IA de DevPlanner.
+
+Los proveedores (Ollama, OpenAI, Gemini y un simulador local) implementan una
+interfaz común y se registran en PROVIDERS. No depende de Streamlit: los
+errores se señalan con AIError y la interfaz decide cómo mostrarlos. Además
+de la petición completa, ofrece un modo en streaming que va emitiendo cada
+tarea en cuanto su objeto JSON está completo.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from scheduler import schedule_tasks
+from storage import ai_cache_key, get_cached_ai_response, put_cached_ai_response
+
+OLLAMA_URL = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+
+# Temperatura usada en todas las peticiones de planificación
+AI_TEMPERATURE = 0.7
+
+# Timeout de la petición completa (modo sin streaming)
+REQUEST_TIMEOUT = 30
+# En streaming el timeout de lectura se aplica entre fragmentos, no al total
+STREAM_TIMEOUT = (5, 60)
+
+SYSTEM_PROMPT = "Eres un asistente experto en planificación de proyectos de desarrollo de software."
+
+
+class AIError(Exception):
+    """Fallo al generar tareas; `response_text` guarda la respuesta recibida, si la hubo"""
+
+    def __init__(self, message, response_text=None, retryable=False, report=None):
+        super().__init__(message)
+        self.response_text = response_text
+        # True si repetir la petición puede funcionar (red, límites, JSON inválido)
+        self.retryable = retryable
+        # Métricas de PlanBuilder de la generación que falló, si llegó a haber respuesta
+        self.report = report
+
+
+def build_task_prompt(project_description):
+    return f"""
+    Como experto en planificación de proyectos de desarrollo de software, desglosa el siguiente proyecto en tareas técnicas detalladas.
+    Para cada tarea, proporciona una estimación de tiempo en horas.
+
+    Proyecto: {project_description}
+
+    Devuelve la respuesta en formato JSON con la siguiente estructura:
+    {{
+        "tasks": [
+            {{
+                "description": "Descripción de la tarea",
+                "estimated_hours": 8.0,
+                "dependencies": []  // índices (desde 0) de tareas anteriores de las que depende
+            }}
+        ]
+    }}
+
+    Sé preciso y realista con las estimaciones. Considera dependencias entre tareas cuando sea necesario.
+    Responde solo con el JSON.
+    """
+
+
+# Esquema JSON de la respuesta. Ollama lo recibe en `format` y OpenAI en
+# response_format: el modelo queda restringido a generar JSON con esta forma.
+TASK_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'description': {'type': 'string'},
+        'estimated_hours': {'type': 'number'},
+        'dependencies': {'type': 'array', 'items': {'type': 'integer'}},
+    },
+    'required': ['description', 'estimated_hours', 'dependencies'],
+    'additionalProperties': False,
+}
+PLAN_SCHEMA = {
+    'type': 'object',
+    'properties': {'tasks': {'type': 'array', 'items': TASK_SCHEMA}},
+    'required': ['tasks'],
+    'additionalProperties': False,
+}
+# Respuesta a build_repair_prompt(): las tareas corregidas con su posición
+REPAIR_SCHEMA = {
+    'type': 'object',
+    'properties': {'tasks': {'type': 'array', 'items': dict(
+        TASK_SCHEMA,
+        properties=dict(TASK_SCHEMA['properties'], index={'type': 'integer'}),
+        required=['index'] + TASK_SCHEMA['required'],
+    )}},
+    'required': ['tasks'],
+    'additionalProperties': False,
+}
+# Respuesta a build_epic_prompt(): las épicas del proyecto
+EPIC_SCHEMA = {
+    'type': 'object',
+    'properties': {'epics': {'type': 'array', 'items': {
+        'type': 'object',
+        'properties': {
+            'name': {'type': 'string'},
+            'summary': {'type': 'string'},
+            'estimated_hours': {'type': 'number'},
+            'dependencies': {'type': 'array', 'items': {'type': 'integer'}},
+        },
+        'required': ['name', 'summary', 'estimated_hours', 'dependencies'],
+        'additionalProperties': False,
+    }}},
+    'required': ['epics'],
+    'additionalProperties': False,
+}
+
+# Límite de horas de una tarea; por encima se considera una estimación inválida
+MAX_TASK_HOURS = 1000
+# Peticiones de corrección de las tareas inválidas por plan
+REPAIR_RETRIES = 2
+# Aproximación de caracteres por token para las métricas de tokens
+CHARS_PER_TOKEN = 4
+
+
+def build_repair_prompt(project_description, invalid):
+    """Pide de nuevo solo las tareas inválidas (`invalid`: índice -> (texto, errores))"""
+    items = '\n'.join(f"    - Tarea {index}: {raw} -> {'; '.join(errors)}"
+                       for index, (raw, errors) in sorted(invalid.items()))
+    return f"""
+    Estás desglosando en tareas técnicas este proyecto: {project_description}
+
+    Estas tareas de tu respuesta anterior no son válidas:
+{items}
+
+    Devuelve solo esas tareas corregidas, con su índice, en formato JSON:
+    {{"tasks": [{{"index": 3, "description": "Descripción de la tarea", "estimated_hours": 8.0, "dependencies": [0, 1]}}]}}
+
+    estimated_hours es un número de horas mayor que 0 y dependencies son índices de tareas anteriores.
+    Responde solo con el JSON.
+    """
+
+
+# Planificación por épicas (epics.py): épicas por proyecto y tareas por épica
+MAX_EPICS = 15
+MAX_TASKS_PER_EPIC = 25
+# Contexto del proyecto que se repite en el prompt de cada épica (tokens estimados)
+EPIC_CONTEXT_TOKENS = 1500
+
+
+def build_epic_prompt(project_description):
+    return f"""
+    Como experto en planificación de proyectos de desarrollo de software, divide el siguiente proyecto en épicas:
+    módulos o bloques funcionales grandes que se puedan desglosar en tareas por separado.
+    Para cada épica, resume su alcance y estima sus horas de forma aproximada.
+
+    Proyecto: {project_description}
+
+    Devuelve la respuesta en formato JSON con la siguiente estructura:
+    {{
+        "epics": [
+            {{
+                "name": "Nombre corto de la épica",
+                "summary": "Alcance de la épica",
+                "estimated_hours": 80.0,
+                "dependencies": []  // índices (desde 0) de épicas anteriores de las que depende
+            }}
+        ]
+    }}
+
+    Entre 2 y {MAX_EPICS} épicas que no se solapen entre sí. Responde solo con el JSON.
+    """
+
+
+def build_epic_task_prompt(project_description, epics, index):
+    """Prompt de la épica `index`; el proyecto se recorta a EPIC_CONTEXT_TOKENS"""
+    limit = EPIC_CONTEXT_TOKENS * CHARS_PER_TOKEN
+    context = project_description if len(project_description) <= limit else project_description[:limit] + '…'
+    overview = '\n'.join(f"    {i + 1}. {epic['name']}: {epic['summary']}" for i, epic in enumerate(epics))
+    epic = epics[index]
+    return f"""
+    Como experto en planificación de proyectos de desarrollo de software, desglosa en tareas técnicas detalladas
+    una de las épicas del siguiente proyecto. Para cada tarea, proporciona una estimación de tiempo en horas.
+
+    Proyecto: {context}
+
+    Épicas del proyecto:
+{overview}
+
+    Épica a desglosar: {epic['name']}: {epic['summary']}
+
+    Incluye solo las tareas de esta épica (entre 3 y {MAX_TASKS_PER_EPIC}): las demás se desglosan aparte.
+    Devuelve la respuesta en formato JSON con la siguiente estructura:
+    {{
+        "tasks": [
+            {{
+                "description": "Descripción de la tarea",
+                "estimated_hours": 8.0,
+                "dependencies": []  // índices (desde 0) de tareas anteriores de esta épica
+            }}
+        ]
+    }}
+
+    Sé preciso y realista con las estimaciones. Responde solo con el JSON.
+    """
+
+
+# Registro de clientes: una sesión HTTP compartida (keep-alive) y un cliente
+# de OpenAI por API key, en lugar de construirlos en cada llamada.
+HTTP_POOL_SIZE = 16
+# Un health check correcto de Ollama se reutiliza durante este tiempo (segundos)
+HEALTH_CHECK_TTL = 30
+
+# openai, requests y httpx se importan al usarlos, como google.generativeai:
+# cargarlos cuesta cerca de un segundo y la mayoría de páginas no los necesita.
+_clients_lock = threading.Lock()
+_http_session = None
+_openai_clients = {}
+
+
+def get_http_session():
+    global _http_session
+    if _http_session is None:
+        with _clients_lock:
+            if _http_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _http_session = session
+    return _http_session
+
+
+def get_openai_client(api_key):
+    from openai import OpenAI
+    with _clients_lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            client = _openai_clients[api_key] = OpenAI(api_key=api_key)
+        return client
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+_IDENTIFIER = re.compile(r'[^\W\d]\w*')
+_PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+
+def repair_json(text):
+    """
+    Corrige los fallos habituales del JSON que escriben los modelos: texto o
+    bloques ``` alrededor, comentarios, comas finales, comillas simples,
+    literales de Python y estructuras sin cerrar por una respuesta cortada.
+    """
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        return text
+    out, stack = [], []
+    i, n = min(starts), len(text)
+    while i < n:
+        ch = text[i]
+        if ch in '"\'':
+            # Cadena: se reescribe siempre con comillas dobles
+            quote, j, chunk = ch, i + 1, ['"']
+            while j < n and text[j] != quote:
+                if text[j] == '\\' and j + 1 < n:
+                    chunk.append("'" if text[j + 1] == "'" else text[j:j + 2])
+                    j += 2
+                    continue
+                chunk.append('\\"' if text[j] == '"' else text[j])
+                j += 1
+            out.append(''.join(chunk) + '"')
+            i = j + 1
+            continue
+        if text.startswith('//', i):
+            i = text.find('\n', i)
+            i = n if i < 0 else i
+            continue
+        if text.startswith('/*', i):
+            i = text.find('*/', i)
+            i = n if i < 0 else i + 2
+            continue
+        if ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]':
+            # Coma final antes del cierre
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+            if not stack:
+                break
+            out.append(stack.pop())
+            i += 1
+            if not stack:
+                break
+            continue
+        elif ch.isalpha() or ch == '_':
+            word = _IDENTIFIER.match(text, i).group()
+            out.append(_PYTHON_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        out.append(ch)
+        i += 1
+    # Respuesta cortada: quitar la coma colgante y cerrar lo que quede abierto
+    while out and (out[-1].isspace() or out[-1] in ',:'):
+        out.pop()
+    return ''.join(out) + ''.join(reversed(stack))
+
+
+def _loads(text):
+    """json.loads, y si falla, sobre el texto reparado; None si ni así es JSON"""
+    for candidate in (text, repair_json(text)):
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def extract_tasks(response_text):
+    """
+    Extrae la lista de tareas de una respuesta completa, reparando el JSON si
+    hace falta. Si el documento no se puede reparar entero, rescata las tareas
+    completas una a una. Las tareas que ni reparadas son JSON se devuelven
+    como texto, para que la validación las cuente y las pida de nuevo.
+    """
+    start = min((i for i in (response_text.find('{'), response_text.find('[')) if i >= 0), default=-1)
+    data = _loads(response_text[start:]) if start >= 0 else None
+    if isinstance(data, dict) and isinstance(data.get('tasks'), list):
+        return data['tasks']
+    if isinstance(data, list):
+        return data
+    parser = TaskStreamParser()
+    items = parser.feed(response_text)
+    if not items:
+        raise AIError("Error al analizar la respuesta de la IA. La respuesta no tenía formato JSON válido.",
+                      response_text, retryable=True)
+    return items
+
+
+def _hours(value):
+    """Horas estimadas como float, aceptando textos como '8', '8,5' u '8 horas'; None si no valen"""
+    if isinstance(value, str):
+        match = re.match(r'\s*(\d+(?:[.,]\d+)?)', value)
+        value = float(match.group(1).replace(',', '.')) if match else None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value) if 0 < value <= MAX_TASK_HOURS else None
+
+
+def validate_task(item, index):
+    """
+    Comprueba una tarea contra TASK_SCHEMA y la normaliza. Devuelve
+    (tarea, errores); la tarea es None si no es válida. Las dependencias que
+    no apuntan a una tarea anterior se descartan sin invalidar la tarea, así
+    que el grafo de un plan validado nunca tiene ciclos.
+    """
+    if not isinstance(item, dict):
+        return None, ["no es un objeto JSON válido"]
+    errors = []
+    description = item.get('description')
+    if not isinstance(description, str) or not description.strip():
+        errors.append("falta 'description'")
+    hours = _hours(item.get('estimated_hours'))
+    if hours is None:
+        errors.append(f"'estimated_hours' debe ser un número de horas entre 0 y {MAX_TASK_HOURS}")
+    if errors:
+        return None, errors
+    return {'description': description.strip(), 'estimated_hours': hours,
+            'dependencies': _earlier(item.get('dependencies'), index)}, []
+
+
+def _earlier(dependencies, index):
+    """Índices de dependencias válidos y anteriores a `index`, ordenados y sin repetir"""
+    dependencies = dependencies or []
+    if not isinstance(dependencies, list):
+        dependencies = [dependencies]
+    return sorted({int(d) for d in dependencies
+                   if isinstance(d, (int, str)) and not isinstance(d, bool)
+                   and str(d).strip().isdigit() and int(d) < index})
+
+
+def extract_epics(response_text):
+    """
+    Épicas válidas de una respuesta a build_epic_prompt(), como con
+    validate_task(): sin nombre se descartan, las horas son opcionales
+    (None si no valen) y las dependencias solo apuntan a épicas anteriores.
+    Lanza AIError si no queda ninguna.
+    """
+    start = min((i for i in (response_text.find('{'), response_text.find('[')) if i >= 0), default=-1)
+    data = _loads(response_text[start:]) if start >= 0 else None
+    items = data.get('epics') if isinstance(data, dict) else data
+    epics, positions = [], {}
+    for index, item in enumerate(items if isinstance(items, list) else []):
+        if not isinstance(item, dict) or not isinstance(item.get('name'), str) or not item['name'].strip():
+            continue
+        summary = item.get('summary')
+        positions[index] = len(epics)
+        epics.append({
+            'name': item['name'].strip(),
+            'summary': summary.strip() if isinstance(summary, str) else '',
+            'estimated_hours': _hours(item.get('estimated_hours')),
+            'dependencies': [positions[d] for d in _earlier(item.get('dependencies'), index) if d in positions],
+        })
+    if not epics:
+        raise AIError("La IA no devolvió ninguna épica válida.", response_text, retryable=True)
+    return epics[:MAX_EPICS]
+
+
+class PlanBuilder:
+    """
+    Construye un plan válido a partir de las tareas de una o varias
+    respuestas: valida cada tarea según llega, guarda las inválidas para
+    pedirlas de nuevo (build_repair_prompt) y lleva las métricas del plan.
+
+    `report` resume la generación: si la primera respuesta fue válida tal
+    cual, si hubo que reparar el JSON, tareas inválidas, corregidas y
+    descartadas, peticiones de corrección y tokens (estimados) de salida y
+    desperdiciados, los que no acabaron en ninguna tarea del plan.
+    """
+
+    def __init__(self):
+        self.tasks = []         # por posición; None en las inválidas
+        self.invalid = {}       # posición -> (texto, errores)
+        self._useful_chars = 0
+        self.report = {'first_response_valid': True, 'json_repaired': False, 'tasks': 0, 'invalid': 0,
+                       'fixed': 0, 'dropped': 0, 'repair_requests': 0, 'output_tokens': 0, 'wasted_tokens': 0}
+
+    def add(self, item):
+        """Valida la siguiente tarea; la devuelve normalizada, o None si no es válida"""
+        index = len(self.tasks)
+        task, errors = validate_task(item, index)
+        self.tasks.append(task)
+        if task is None:
+            self.invalid[index] = (item if isinstance(item, str) else json.dumps(item, ensure_ascii=False), errors)
+            self.report['invalid'] += 1
+            self.report['first_response_valid'] = False
+        else:
+            self._useful_chars += len(json.dumps(item, ensure_ascii=False))
+        return task
+
+    def add_response(self, text, extract=True):
+        """
+        Cuenta una respuesta completa y, con `extract`, extrae y valida sus
+        tareas (en streaming ya llegan una a una con add()).
+        """
+        self.report['output_tokens'] += estimate_tokens(text)
+        self._update_waste()
+        if not extract:
+            return
+        start = min((i for i in (text.find('{'), text.find('[')) if i >= 0), default=0)
+        try:
+            json.loads(text[start:])
+        except json.JSONDecodeError:
+            self.report['json_repaired'] = True
+            self.report['first_response_valid'] = False
+        try:
+            items = extract_tasks(text)
+        except AIError as e:
+            e.report = self.report
+            raise
+        for item in items:
+            self.add(item)
+        self._update_waste()
+
+    def repair_prompt(self, project_description):
+        return build_repair_prompt(project_description, self.invalid)
+
+    def apply_repair(self, text):
+        """Sustituye las tareas inválidas por las corregidas de la respuesta `text`"""
+        self.report['repair_requests'] += 1
+        self.report['output_tokens'] += estimate_tokens(text)
+        try:
+            items = extract_tasks(text)
+        except AIError:
+            items = []
+        for item in items:
+            index = item.get('index') if isinstance(item, dict) else None
+            # El índice lo escribe la IA: solo valen enteros de tareas pendientes de corregir
+            if not isinstance(index, int) or isinstance(index, bool) or index not in self.invalid:
+                continue
+            task, errors = validate_task(item, index)
+            if task is None:
+                self.invalid[index] = (json.dumps(item, ensure_ascii=False), errors)
+                continue
+            self.tasks[index] = task
+            del self.invalid[index]
+            self.report['fixed'] += 1
+            self._useful_chars += len(json.dumps(item, ensure_ascii=False))
+        self._update_waste()
+
+    def _update_waste(self):
+        self.report['wasted_tokens'] = max(0, self.report['output_tokens'] - self._useful_chars // CHARS_PER_TOKEN)
+
+    def result(self):
+        """Tareas válidas, sin las que no se pudieron corregir y con las dependencias renumeradas"""
+        positions, tasks = {}, []
+        for index, task in enumerate(self.tasks):
+            if task is not None:
+                positions[index] = len(tasks)
+                tasks.append(dict(task, dependencies=[positions[d] for d in task['dependencies']
+                                                      if d in positions]))
+        self.report['tasks'] = len(tasks)
+        self.report['dropped'] = len(self.invalid)
+        return tasks
+
+
+class TaskStreamParser:
+    """
+    Parser JSON incremental para respuestas del tipo {"tasks": [{...}, {...}]}.
+
+    feed() recibe fragmentos de texto y devuelve las tareas cuyo objeto JSON
+    ya se ha cerrado. Ignora el texto previo al primer '{' o '['. Los objetos
+    con JSON inválido se reparan (repair_json) y, si ni así, se devuelven
+    como texto para que la validación los cuente como tareas inválidas.
+    """
+
+    def __init__(self):
+        self.text = []          # respuesta completa, para el análisis final
+        self._buffer = ''
+        self._pos = 0
+        self._stack = []        # contenedores abiertos: '{' o '['
+        self._in_string = False
+        self._escape = False
+        self._task_start = None
+        self.invalid_objects = 0
+
+    def _at_task_level(self):
+        # Elemento del array "tasks" ({"tasks": [ ... ]}) o de un array suelto ([ ... ])
+        return self._stack == ['{', '['] or self._stack == ['[']
+
+    def feed(self, chunk):
+        self.text.append(chunk)
+        self._buffer += chunk
+        tasks = []
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                if self._stack:
+                    self._in_string = True
+            elif ch in '{[':
+                if ch == '{' and self._at_task_level():
+                    self._task_start = i
+                self._stack.append(ch)
+            elif ch in '}]' and self._stack:
+                self._stack.pop()
+                if ch == '}' and self._task_start is not None and self._at_task_level():
+                    raw = buffer[self._task_start:i + 1]
+                    task = _loads(raw)
+                    if isinstance(task, dict):
+                        tasks.append(task)
+                    else:
+                        tasks.append(raw)
+                        self.invalid_objects += 1
+                    self._task_start = None
+
+        # Conservar solo el objeto en curso para no reexaminar el texto ya emitido
+        if self._task_start is not None:
+            self._buffer = buffer[self._task_start:]
+            self._pos = len(buffer) - self._task_start
+            self._task_start = 0
+        else:
+            self._buffer = ''
+            self._pos = 0
+        return tasks
+
+    def full_text(self):
+        return ''.join(self.text)
+
+
+# Proveedores de IA. Cada backend implementa generate (respuesta completa),
+# stream (fragmentos de texto) y health; se registran por nombre en PROVIDERS.
+class AIProvider:
+    name = None
+    label = None
+    models = []
+    requires_api_key = False
+
+    def generate(self, prompt, ai_model, api_key=None, schema=None):
+        """
+        Devuelve el texto completo de la respuesta. Con `schema` (esquema JSON)
+        los backends que lo admiten restringen la salida a ese formato.
+        """
+        return ''.join(self.stream(prompt, ai_model, api_key, schema))
+
+    def stream(self, prompt, ai_model, api_key=None, schema=None):
+        """Genera los fragmentos de texto de la respuesta a medida que llegan"""
+        yield self.generate(prompt, ai_model, api_key, schema)
+
+    def health(self, api_key=None, use_cache=False):
+        """Indica si el proveedor está disponible"""
+        return True
+
+    @asynccontextmanager
+    async def async_requester(self, api_key=None, max_connections=4):
+        """
+        Contexto que entrega una corrutina request(prompt, ai_model, schema=None) -> texto.
+
+        Por defecto ejecuta generate() en un hilo; los backends con cliente
+        asíncrono nativo lo sobrescriben.
+        """
+        async def request(prompt, ai_model, schema=None):
+            return await asyncio.to_thread(self.generate, prompt, ai_model, api_key, schema)
+        yield request
+
+
+class OllamaProvider(AIProvider):
+    name = 'ollama'
+    label = 'Ollama (local)'
+    models = ["phi3", "llama2", "mistral", "mixtral", "codellama", "gemma", "llama3"]
+
+    def __init__(self):
+        self._healthy_until = 0.0
+
+    def _payload(self, prompt, ai_model, stream, schema=None):
+        payload = {
+            'model': ai_model,
+            'prompt': prompt,
+            'stream': stream,
+            'options': {
+                'temperature': AI_TEMPERATURE
+            }
+        }
+        if schema:
+            # Salida estructurada (Ollama >= 0.5): el modelo solo puede generar JSON con este esquema
+            payload['format'] = schema
+        return payload
+
+    def health(self, api_key=None, use_cache=False):
+        """
+        Prueba la conexión con Ollama
+
+        Con use_cache=True se da por buena una comprobación correcta de hace menos
+        de HEALTH_CHECK_TTL segundos. Los fallos no se cachean.
+        """
+        if use_cache and time.monotonic() < self._healthy_until:
+            return True
+        import requests
+        try:
+            response = get_http_session().get(f'{OLLAMA_URL}/api/tags', timeout=10)
+            ok = response.status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        self._healthy_until = time.monotonic() + HEALTH_CHECK_TTL if ok else 0.0
+        return ok
+
+    def _post(self, prompt, ai_model, stream, schema=None):
+        import requests
+        if not self.health(use_cache=True):
+            raise AIError("Ollama no está disponible. Asegúrate de que esté instalado y ejecutándose.",
+                          retryable=True)
+        try:
+            response = get_http_session().post(
+                f'{OLLAMA_URL}/api/generate',
+                json=self._payload(prompt, ai_model, stream, schema),
+                timeout=STREAM_TIMEOUT if stream else REQUEST_TIMEOUT,
+                stream=stream
+            )
+        except requests.exceptions.RequestException as e:
+            self._healthy_until = 0.0
+            raise AIError(f"Error de conexión con Ollama: {str(e)}", retryable=True)
+        if response.status_code != 200:
+            raise AIError(f"Error al conectar con Ollama: {response.status_code}",
+                          retryable=response.status_code == 429 or response.status_code >= 500)
+        return response
+
+    def generate(self, prompt, ai_model, api_key=None, schema=None):
+        return self._post(prompt, ai_model, stream=False, schema=schema).json()['response']
+
+    def stream(self, prompt, ai_model, api_key=None, schema=None):
+        # Ollama devuelve NDJSON: un objeto por línea con el fragmento en 'response'
+        import requests
+        response = self._post(prompt, ai_model, stream=True, schema=schema)
+        try:
+            with response:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get('response'):
+                        yield data['response']
+                    if data.get('done'):
+                        break
+        except requests.exceptions.RequestException as e:
+            self._healthy_until = 0.0
+            raise AIError(f"Error de conexión con Ollama: {str(e)}", retryable=True)
+
+    @asynccontextmanager
+    async def async_requester(self, api_key=None, max_connections=4):
+        import httpx
+        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT,
+                                     limits=httpx.Limits(max_connections=max_connections)) as http:
+            async def request(prompt, ai_model, schema=None):
+                try:
+                    response = await http.post(f'{OLLAMA_URL}/api/generate',
+                                               json=self._payload(prompt, ai_model, False, schema))
+                except httpx.TransportError as e:
+                    raise AIError(f"Error de conexión con Ollama: {str(e)}", retryable=True)
+                if response.status_code != 200:
+                    raise AIError(f"Error al conectar con Ollama: {response.status_code}",
+                                  retryable=response.status_code == 429 or response.status_code >= 500)
+                return response.json()['response']
+            yield request
+
+
+class OpenAIProvider(AIProvider):
+    name = 'openai'
+    label = 'OpenAI'
+    models = ["gpt-4o-mini", "gpt-4o", "gpt-3.5-turbo", "gpt-4", "gpt-4-turbo"]
+    requires_api_key = True
+    # Modelos con salidas estructuradas (json_schema estricto) y con modo JSON;
+    # los demás (gpt-4) reciben el esquema solo en el prompt
+    STRUCTURED_OUTPUT_MODELS = ('gpt-4o', 'gpt-4.1', 'o1', 'o3', 'o4')
+    JSON_MODE_MODELS = ('gpt-3.5-turbo', 'gpt-4-turbo')
+
+    def _messages(self, prompt):
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _error(self, e):
+        import openai
+        # Errores transitorios que merece la pena reintentar
+        retryable = isinstance(e, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError))
+        return AIError(f"Error al conectar con OpenAI: {str(e)}", retryable=retryable)
+
+    def _options(self, ai_model, schema):
+        """Argumentos de chat.completions.create: temperatura y response_format según el modelo"""
+        options = {'temperature': AI_TEMPERATURE}
+        if schema and ai_model.startswith(self.STRUCTURED_OUTPUT_MODELS):
+            options['response_format'] = {'type': 'json_schema', 'json_schema': {
+                'name': 'devplanner_tasks', 'schema': schema, 'strict': True}}
+        elif schema and ai_model.startswith(self.JSON_MODE_MODELS):
+            options['response_format'] = {'type': 'json_object'}
+        return options
+
+    def _create(self, prompt, ai_model, api_key, stream, schema=None):
+        if not api_key:
+            raise AIError("Se requiere una API key de OpenAI")
+        try:
+            return get_openai_client(api_key).chat.completions.create(
+                model=ai_model,
+                messages=self._messages(prompt),
+                stream=stream,
+                **self._options(ai_model, schema)
+            )
+        except Exception as e:
+            raise self._error(e)
+
+    def generate(self, prompt, ai_model, api_key=None, schema=None):
+        return self._create(prompt, ai_model, api_key, stream=False, schema=schema).choices[0].message.content
+
+    def stream(self, prompt, ai_model, api_key=None, schema=None):
+        # OpenAI envía eventos SSE con deltas de contenido
+        stream = self._create(prompt, ai_model, api_key, stream=True, schema=schema)
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise self._error(e)
+
+    def health(self, api_key=None, use_cache=False):
+        """Prueba la conexión con OpenAI"""
+        try:
+            get_openai_client(api_key).models.list()
+            return True
+        except Exception:
+            return False
+
+    @asynccontextmanager
+    async def async_requester(self, api_key=None, max_connections=4):
+        if not api_key:
+            raise AIError("Se requiere una API key de OpenAI")
+        import openai
+        client = openai.AsyncOpenAI(api_key=api_key, max_retries=0, timeout=REQUEST_TIMEOUT)
+        try:
+            async def request(prompt, ai_model, schema=None):
+                try:
+                    response = await client.chat.completions.create(
+                        model=ai_model,
+                        messages=self._messages(prompt),
+                        **self._options(ai_model, schema)
+                    )
+                except Exception as e:
+                    raise self._error(e)
+                return response.choices[0].message.content
+            yield request
+        finally:
+            await client.close()
+
+
+class GeminiProvider(AIProvider):
+    name = 'gemini'
+    label = 'Google Gemini'
+    models = ["gemini-1.5-flash", "gemini-1.5-pro"]
+    requires_api_key = True
+
+    def __init__(self):
+        # genai.configure() es global: serializar los cambios de API key
+        self._lock = threading.Lock()
+        self._configured_key = None
+
+    def _model(self, ai_model, api_key):
+        if not api_key:
+            raise AIError("Se requiere una API key de Google Gemini")
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            raise AIError("Falta el paquete google-generativeai (pip install google-generativeai)")
+        with self._lock:
+            if api_key != self._configured_key:
+                genai.configure(api_key=api_key)
+                self._configured_key = api_key
+        return genai.GenerativeModel(ai_model, system_instruction=SYSTEM_PROMPT)
+
+    @staticmethod
+    def _generation_config(schema):
+        # Gemini 1.5 admite respuesta JSON; su response_schema no acepta el esquema completo
+        config = {'temperature': AI_TEMPERATURE}
+        if schema:
+            config['response_mime_type'] = 'application/json'
+        return config
+
+    def generate(self, prompt, ai_model, api_key=None, schema=None):
+        model = self._model(ai_model, api_key)
+        try:
+            return model.generate_content(prompt, generation_config=self._generation_config(schema)).text
+        except Exception as e:
+            raise AIError(f"Error al conectar con Gemini: {str(e)}", retryable=True)
+
+    def stream(self, prompt, ai_model, api_key=None, schema=None):
+        model = self._model(ai_model, api_key)
+        try:
+            for chunk in model.generate_content(prompt, stream=True,
+                                                generation_config=self._generation_config(schema)):
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise AIError(f"Error al conectar con Gemini: {str(e)}", retryable=True)
+
+    def health(self, api_key=None, use_cache=False):
+        try:
+            import google.generativeai as genai
+            self._model(self.models[0], api_key)
+            next(iter(genai.list_models()), None)
+            return True
+        except Exception:
+            return False
+
+
+class StubProvider(AIProvider):
+    """
+    Proveedor local y determinista para pruebas de carga y benchmarks sin red.
+
+    El plan depende solo del prompt. `latency` es la espera antes del primer
+    fragmento, `chunk_delay` la espera entre fragmentos y `failure_rate` la
+    probabilidad de que una petición falle con un error reintentable.
+    `malformed_rate` es la probabilidad de que cada tarea salga mal formada
+    (sin horas, con horas no numéricas o con JSON roto), como las de un
+    modelo sin salida estructurada; las peticiones de corrección
+    (build_repair_prompt) se responden siempre bien.
+
+    A build_epic_prompt() responde con `epics` épicas, y al desglosar cada
+    una repite la tarea de preparar el entorno, como suelen hacer los
+    modelos reales, para que epics.py tenga duplicados que fusionar.
+    """
+    name = 'stub'
+    label = 'Simulado (pruebas)'
+    models = ['stub']
+
+    def __init__(self, latency=0.0, chunk_delay=0.0, failure_rate=0.0, tasks=8, chunk_size=32, seed=0,
+                 malformed_rate=0.0, epics=6):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.tasks = tasks
+        self.epics = epics
+        self.chunk_size = chunk_size
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def plan(self, prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        return {'tasks': [{
+            'description': f"Tarea {i + 1} del plan {digest[:4].hex()}",
+            'estimated_hours': float(2 + digest[i % len(digest)] % 15),
+            'dependencies': [i - 1] if i and digest[i % len(digest)] % 3 else [],
+        } for i in range(self.tasks)]}
+
+    def epic_plan(self, prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        return {'epics': [{
+            'name': f"Épica {i + 1}",
+            'summary': f"Módulo {i + 1} del proyecto {digest[:4].hex()}",
+            'estimated_hours': float(20 + digest[i % len(digest)] % 80),
+            'dependencies': [i - 1] if i and digest[i % len(digest)] % 2 else [],
+        } for i in range(self.epics)]}
+
+    _EPIC_STAGE = 'divide el siguiente proyecto en épicas'
+    _EPIC_TASKS = 'Épica a desglosar:'
+    _SETUP_TASK = "Preparar el repositorio y el entorno de desarrollo"
+    _REPAIR_ITEM = re.compile(r'- Tarea (\d+):')
+    _REPAIR_PROJECT = re.compile(r'este proyecto: (.*)')
+
+    def _malformed(self, task):
+        with self._lock:
+            kind = self._rng.randrange(3) if self._rng.random() < self.malformed_rate else None
+        if kind is None:
+            return json.dumps(task, ensure_ascii=False)
+        if kind == 0:
+            return json.dumps({'description': task['description']}, ensure_ascii=False)
+        if kind == 1:
+            return json.dumps(dict(task, estimated_hours="unas horas"), ensure_ascii=False)
+        return json.dumps(task, ensure_ascii=False).replace('", "estimated_hours"', '" "estimated_hours"')
+
+    def _response_text(self, prompt):
+        indices = [int(i) for i in self._REPAIR_ITEM.findall(prompt)]
+        if indices:
+            # Corrección: las mismas tareas del plan original del proyecto
+            project = self._REPAIR_PROJECT.search(prompt).group(1)
+            tasks = self.plan(build_task_prompt(project))['tasks']
+            fixed = [dict(tasks[i % len(tasks)], index=i) for i in indices]
+            return json.dumps({'tasks': fixed}, ensure_ascii=False)
+        if self._EPIC_STAGE in prompt:
+            return json.dumps(self.epic_plan(prompt), ensure_ascii=False)
+        tasks = self.plan(prompt)['tasks']
+        if self._EPIC_TASKS in prompt:
+            tasks[0]['description'] = self._SETUP_TASK
+        if not self.malformed_rate:
+            return "Plan generado:\n" + json.dumps({'tasks': tasks}, ensure_ascii=False)
+        return '{"tasks": [' + ', '.join(self._malformed(task) for task in tasks) + ']}'
+
+    def _check_failure(self):
+        with self._lock:
+            self.calls += 1
+            failed = self._rng.random() < self.failure_rate
+        if failed:
+            raise AIError("Fallo simulado del proveedor de pruebas", retryable=True)
+
+    def stream(self, prompt, ai_model, api_key=None, schema=None):
+        if self.latency:
+            time.sleep(self.latency)
+        self._check_failure()
+        text = self._response_text(prompt)
+        for i in range(0, len(text), self.chunk_size):
+            if i and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield text[i:i + self.chunk_size]
+
+    @asynccontextmanager
+    async def async_requester(self, api_key=None, max_connections=4):
+        async def request(prompt, ai_model, schema=None):
+            text = self._response_text(prompt)
+            chunks = -(-len(text) // self.chunk_size)
+            await asyncio.sleep(self.latency + self.chunk_delay * (chunks - 1))
+            self._check_failure()
+            return text
+        yield request
+
+
+PROVIDERS = {}
+
+
+def register_provider(provider):
+    PROVIDERS[provider.name] = provider
+    return provider
+
+
+def get_provider(ai_provider):
+    try:
+        return PROVIDERS[ai_provider]
+    except KeyError:
+        raise AIError(f"Proveedor de IA desconocido: {ai_provider}")
+
+
+for _provider in (OpenAIProvider(), OllamaProvider(), GeminiProvider(), StubProvider()):
+    register_provider(_provider)
+
+
+def test_ollama_connection(use_cache=False):
+    """Prueba la conexión con Ollama"""
+    return get_provider('ollama').health(use_cache=use_cache)
+
+
+def test_openai_connection(api_key):
+    """Prueba la conexión con OpenAI"""
+    return get_provider('openai').health(api_key)
+
+
+def request_tasks(prompt, ai_provider, ai_model, api_key=None):
+    """Envía el prompt al proveedor de IA y devuelve la lista de tareas (respuesta completa, sin validar)"""
+    return extract_tasks(get_provider(ai_provider).generate(prompt, ai_model, api_key, PLAN_SCHEMA))
+
+
+def stream_text(prompt, ai_provider, ai_model, api_key=None, schema=None):
+    """Genera los fragmentos de texto de la respuesta a medida que llegan"""
+    return get_provider(ai_provider).stream(prompt, ai_model, api_key, schema)
+
+
+def plan_to_task_rows(ai_tasks, start_date=None, calendar=None, plan=None):
+    """
+    Asigna fechas a las tareas generadas y las prepara para storage.add_tasks().
+
+    Las fechas salen del planificador por camino crítico: cada tarea empieza
+    en cuanto terminan sus dependencias, en días laborables del calendario.
+    Las dependencias se guardan como índices dentro del plan, ya sin los
+    inválidos ni los que cerraban un ciclo (esos se descartan).
+    Acepta un `plan` ya calculado con schedule_tasks() para no repetir el cálculo.
+    """
+    plan = plan or schedule_tasks(ai_tasks, start_date, calendar, break_cycles=True)
+    return [{
+        'description': task['description'],
+        'estimated_hours': task['estimated_hours'],
+        'start_date': plan.start_date(i),
+        'end_date': plan.end_date(i),
+        'dependencies': list(plan.predecessors[i]),
+    } for i, task in enumerate(ai_tasks)]
+
+
+def generate_tasks(project_description, ai_provider, ai_model, api_key=None, use_cache=True, stream=True,
+                   report=None):
+    """
+    Genera las tareas válidas de un proyecto, emitiéndolas una a una.
+
+    La respuesta se pide restringida a PLAN_SCHEMA y cada tarea se valida:
+    las inválidas se piden de nuevo, solo ellas, hasta REPAIR_RETRIES veces,
+    y las que siguen mal se descartan. En streaming las tareas salen según
+    llegan hasta la primera inválida; las demás, tras las correcciones.
+
+    Consulta primero la caché de respuestas; con use_cache=False la ignora y la
+    sustituye por la nueva respuesta. Con stream=False espera a la respuesta
+    completa antes de emitir. `report`, si se pasa un dict, recibe las
+    métricas de PlanBuilder. Lanza AIError si no queda ninguna tarea válida.
+    """
+    prompt = build_task_prompt(project_description)
+    cache_key = ai_cache_key(ai_provider, ai_model, AI_TEMPERATURE, prompt)
+    builder = PlanBuilder()
+
+    if use_cache:
+        cached_tasks = get_cached_ai_response(cache_key)
+        if cached_tasks is not None:
+            for item in cached_tasks:
+                builder.add(item)
+            tasks = builder.result()
+            if report is not None:
+                report.update(builder.report, cached=True)
+            yield from tasks
+            return
+
+    provider = get_provider(ai_provider)
+    emitted = 0
+    if stream:
+        parser = TaskStreamParser()
+        for chunk in provider.stream(prompt, ai_model, api_key, PLAN_SCHEMA):
+            for item in parser.feed(chunk):
+                task = builder.add(item)
+                # Solo mientras no haya inválidas: las posiciones ya emitidas no cambian
+                if task is not None and not builder.invalid:
+                    emitted += 1
+                    yield task
+        response_text = parser.full_text()
+        # Sin tareas en el stream (otra estructura o JSON roto): análisis completo
+        builder.add_response(response_text, extract=not builder.tasks)
+    else:
+        response_text = provider.generate(prompt, ai_model, api_key, PLAN_SCHEMA)
+        builder.add_response(response_text)
+
+    for _ in range(REPAIR_RETRIES):
+        if not builder.invalid:
+            break
+        builder.apply_repair(provider.generate(builder.repair_prompt(project_description), ai_model, api_key,
+                                               REPAIR_SCHEMA))
+    tasks = builder.result()
+    if report is not None:
+        report.update(builder.report, cached=False)
+    if not tasks:
+        raise AIError("La IA no devolvió ninguna tarea válida.", response_text, retryable=True,
+                      report=builder.report)
+    put_cached_ai_response(cache_key, ai_provider, ai_model, tasks)
+    yield from tasks[emitted:]
@@ -0,0 +1,214 @@
+"""
+Generación de planes con IA para muchos proyectos a la vez.
+
+Lanza las peticiones de forma concurrente con asyncio, con un límite de
+peticiones simultáneas, limitación de ritmo por proveedor y reintentos con
+backoff exponencial. Cada plan se guarda con storage.add_tasks() en cuanto
+llega, así que un fallo a mitad del lote no pierde el trabajo ya hecho.
+Los proyectos con descripciones largas se planifican por épicas (epics.py)
+dentro de los mismos límites.
+
+Uso sin interfaz:
+    python batch.py                       # proyectos que aún no tienen tareas
+    python batch.py --project-id 3 --project-id 7 --concurrency 4
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+import storage
+from ai import (
+    AI_TEMPERATURE, PLAN_SCHEMA, PROVIDERS, REPAIR_RETRIES, REPAIR_SCHEMA, AIError, PlanBuilder, build_task_prompt,
+    get_provider, plan_to_task_rows,
+)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RETRIES = 3
+BACKOFF_BASE = 1.0      # segundos; se duplica en cada reintento
+
+# Peticiones por segundo permitidas por proveedor (sin entrada = sin límite)
+RATE_LIMITS = {
+    'openai': 3.0,
+    'gemini': 1.0,
+}
+
+
+class RateLimiter:
+    """Cubo de fichas: como máximo `rate` peticiones por segundo, con ráfagas de `burst`"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _is_retryable(error):
+    # Red, límites de ritmo, errores 5xx o JSON inválido: volver a preguntar suele funcionar
+    return isinstance(error, AIError) and error.retryable
+
+
+async def _generate_plan(project, ai_provider, ai_model, request, semaphore, limiter,
+                         retries, use_cache):
+    description = project[2]
+    # Import local: epics.py usa RateLimiter y las constantes de este módulo
+    from epics import plan_by_epics, should_decompose
+    if should_decompose(description):
+        # Las peticiones de las épicas comparten el semáforo y el ritmo del lote
+        return await plan_by_epics(description, ai_provider, ai_model, request, semaphore, limiter,
+                                   retries=retries, use_cache=use_cache)
+
+    prompt = build_task_prompt(description)
+    cache_key = storage.ai_cache_key(ai_provider, ai_model, AI_TEMPERATURE, prompt)
+    if use_cache:
+        cached_tasks = storage.get_cached_ai_response(cache_key)
+        if cached_tasks is not None:
+            # Las entradas antiguas de la caché pueden no haber pasado la validación
+            builder = PlanBuilder()
+            for item in cached_tasks:
+                builder.add(item)
+            return builder.result()
+
+    async def ask(text, schema):
+        async with semaphore:
+            await limiter.acquire()
+            return await request(text, ai_model, schema)
+
+    for attempt in range(retries + 1):
+        try:
+            # Como generate_tasks(): se validan las tareas y se piden de nuevo solo las inválidas
+            builder = PlanBuilder()
+            response_text = await ask(prompt, PLAN_SCHEMA)
+            builder.add_response(response_text)
+            for _ in range(REPAIR_RETRIES):
+                if not builder.invalid:
+                    break
+                builder.apply_repair(await ask(builder.repair_prompt(description), REPAIR_SCHEMA))
+            tasks = builder.result()
+            if not tasks:
+                raise AIError("La IA no devolvió ninguna tarea válida.", response_text, retryable=True,
+                              report=builder.report)
+            storage.put_cached_ai_response(cache_key, ai_provider, ai_model, tasks)
+            return tasks
+        except Exception as e:
+            if attempt == retries or not _is_retryable(e):
+                raise
+            delay = BACKOFF_BASE * 2 ** attempt
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+
+async def generate_plans(projects, ai_provider, ai_model, api_key=None,
+                         concurrency=DEFAULT_CONCURRENCY, rate=None, retries=DEFAULT_RETRIES,
+                         use_cache=True, save=True, on_progress=None):
+    """
+    Genera (y por defecto guarda) el plan de cada proyecto de `projects`.
+
+    Devuelve un dict project_id -> lista de tareas, o la excepción si ese
+    proyecto falló tras agotar los reintentos. on_progress(done, total,
+    project_id, result) se llama al terminar cada proyecto.
+    """
+    provider = get_provider(ai_provider)
+    if provider.requires_api_key and not api_key:
+        raise AIError(f"Se requiere una API key de {provider.label}")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate if rate is not None else RATE_LIMITS.get(ai_provider))
+    results = {}
+
+    async with provider.async_requester(api_key, max_connections=concurrency) as request:
+        async def run(project):
+            try:
+                result = await _generate_plan(project, ai_provider, ai_model, request,
+                                              semaphore, limiter, retries, use_cache)
+                if save:
+                    storage.add_tasks(project[0], plan_to_task_rows(result))
+            except Exception as e:
+                result = e
+            results[project[0]] = result
+            if on_progress:
+                on_progress(len(results), len(projects), project[0], result)
+
+        await asyncio.gather(*(run(project) for project in projects))
+
+    return results
+
+
+def run_batch(projects, ai_provider, ai_model, api_key=None, **kwargs):
+    """Versión síncrona de generate_plans() para la interfaz y la línea de comandos"""
+    return asyncio.run(generate_plans(projects, ai_provider, ai_model, api_key, **kwargs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera planes de tareas con IA para varios proyectos")
+    parser.add_argument('--db', default=storage.DB_PATH, help="Ruta de la base de datos")
+    parser.add_argument('--project-id', type=int, action='append',
+                        help="Proyecto a planificar (repetible). Por defecto, los que no tienen tareas")
+    parser.add_argument('--provider', choices=sorted(PROVIDERS),
+                        help="Proveedor de IA (por defecto, el de la configuración guardada)")
+    parser.add_argument('--model', help="Modelo (por defecto, el de la configuración guardada)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--rate', type=float, help="Peticiones por segundo (0 = sin límite)")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    parser.add_argument('--refresh', action='store_true', help="Ignorar la caché de respuestas")
+    args = parser.parse_args()
+
+    storage.set_pool(storage.ConnectionPool(args.db))
+    storage.init_db()
+
+    config = storage.get_ai_config()
+    ai_provider = args.provider or config[1]
+    ai_model = args.model or config[2]
+    # La API key guardada es la del proveedor de la configuración: no se envía a otro
+    api_key = config[3] if config[1] == ai_provider else None
+
+    if args.project_id:
+        projects = [p for p in map(storage.get_project, args.project_id) if p]
+    else:
+        projects = storage.get_projects_without_tasks()
+    if not projects:
+        print("No hay proyectos que planificar.")
+        return
+
+    print(f"Planificando {len(projects)} proyectos con {ai_provider}/{ai_model} "
+          f"(concurrencia {args.concurrency})")
+    start = time.perf_counter()
+
+    def report(done, total, project_id, result):
+        if isinstance(result, Exception):
+            status = f"ERROR: {result}"
+        else:
+            status = f"{len(result)} tareas"
+        print(f"[{done}/{total}] proyecto {project_id}: {status}", flush=True)
+
+    try:
+        results = run_batch(projects, ai_provider, ai_model, api_key,
+                            concurrency=args.concurrency, rate=args.rate, retries=args.retries,
+                            use_cache=not args.refresh, on_progress=report)
+    except AIError as e:
+        sys.exit(f"Error: {e}")
+
+    failed = sum(1 for r in results.values() if isinstance(r, Exception))
+    print(f"Completado en {time.perf_counter() - start:.1f} s: "
+          f"{len(results) - failed} correctos, {failed} con error")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
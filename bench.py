@@ -0,0 +1,1114 @@
+"""
+Micro-benchmarks de DevPlanner.
+
+Cada benchmark trabaja sobre una base de datos temporal y no toca devplanner.db.
+
+Uso:
+    python bench.py storage [--ops 5000]
+    python bench.py tracing [--ops 200000]
+    python bench.py rerun [--script devplanner.py] [--projects 1] [--tasks 30] [--reruns 50] [--budget-ms 400]
+    python bench.py startup [--script devplanner.py] [--runs 5] [--import-budget-ms 1500] [--render-budget-ms 2500]
+    python bench.py bulk-insert [--sizes 100 1000 10000]
+    python bench.py http-clients [--calls 200]
+    python bench.py pipeline [--projects 200] [--latency 0.2] [--failure-rate 0.1]
+    python bench.py structured [--plans 200] [--malformed-rate 0.05]
+    python bench.py epics [--epics 12] [--tasks 20] [--tokens-per-s 2000] [--concurrency 4 12]
+    python bench.py jobs [--projects 40] [--latency 0.2] [--workers 1 2 4 8] [--limit 4]
+    python bench.py scheduler [--sizes 1000 10000 100000] [--budget-ms 1000]
+    python bench.py leveling [--tasks 5000] [--people 40] [--updates 50]
+    python bench.py reschedule [--tasks 50000] [--edits 20]
+    python bench.py task-edits [--tasks 10000] [--sizes 10 100 1000]
+    python bench.py gantt [--sizes 1000 10000 100000] [--legacy-max 10000]
+    python bench.py kpis [--projects 10000] [--tasks 1000000]
+    python bench.py snapshots [--projects 2000] [--days 1095]
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import storage
+
+# Presupuesto de latencia (p95) para un rerun de la página de proyectos
+RERUN_BUDGET_MS = 400
+
+# Presupuestos de arranque en frío (mediana): importar devplanner y primer
+# render de la página de proyectos en un proceso nuevo
+STARTUP_IMPORT_BUDGET_MS = 1500
+STARTUP_RENDER_BUDGET_MS = 2500
+# Módulos pesados que no deben cargarse hasta que una página los use
+LAZY_MODULES = ('pandas', 'plotly.express', 'openai', 'requests', 'httpx')
+
+# Presupuesto para planificar el mayor de los grafos del benchmark de scheduler
+SCHEDULER_BUDGET_MS = 1000
+
+
+def _temp_db(tmpdir, name='bench.db'):
+    """Apunta el pool de storage a una base de datos nueva e inicializada"""
+    db_path = os.path.join(tmpdir, name)
+    storage.set_pool(storage.ConnectionPool(db_path))
+    storage.init_db()
+    return db_path
+
+
+def _report(label, ops, elapsed):
+    print(f"  {label:<32} {ops / elapsed:>12,.0f} ops/s  ({elapsed * 1000:,.1f} ms)")
+
+
+def _timed(fn, ops):
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    return time.perf_counter() - start
+
+
+# Benchmark: arranque en frío (python -X importtime y primer render)
+_FIRST_RENDER = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.run()
+print(json.dumps({'ms': (time.perf_counter() - start) * 1000, 'error': str(at.exception[0].message) if at.exception else None,
+                  'loaded': [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def _import_times(stderr, module):
+    """(ms de importar `module`, {hijo directo: ms}, módulos cargados) según la salida de -X importtime"""
+    total, children, loaded = None, {}, set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = len(name) - len(name.lstrip())
+        name = name.strip()
+        loaded.add(name)
+        if name == module and depth == 1:
+            total = int(cumulative) / 1000
+        elif depth == 3:
+            children[name] = int(cumulative) / 1000
+    return total, children, loaded
+
+
+def bench_startup(args):
+    script = os.path.abspath(args.script)
+    module = os.path.splitext(os.path.basename(script))[0]
+    here = os.path.dirname(os.path.abspath(__file__))
+    imports, renders, children = [], [], {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Los módulos del proyecto se buscan junto a bench.py aunque el script esté en otra parte
+        env = dict(os.environ, DEVPLANNER_DB=os.path.join(tmpdir, 'startup.db'),
+                   PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get('PYTHONPATH')])))
+        code = f"import sys; sys.path.insert(0, {os.path.dirname(script)!r}); import {module}"
+        for _ in range(args.runs):
+            result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=tmpdir, env=env,
+                                    capture_output=True, text=True)
+            total, run_children, loaded = _import_times(result.stderr, module)
+            if total is None:
+                raise SystemExit(f"No se pudo importar {module}:\n{result.stderr[-2000:]}")
+            imports.append(total)
+            for name, ms in run_children.items():
+                children.setdefault(name, []).append(ms)
+
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, '-c', _FIRST_RENDER, script, *LAZY_MODULES], cwd=tmpdir,
+                                    env=env, capture_output=True, text=True)
+            wall = (time.perf_counter() - start) * 1000
+            render = json.loads(result.stdout.strip().splitlines()[-1])
+            if render['error']:
+                raise SystemExit(f"El script falló: {render['error']}")
+            renders.append(wall)
+
+    median = lambda values: sorted(values)[len(values) // 2]
+    print(f"startup: {os.path.basename(script)}, {args.runs} procesos nuevos")
+    print(f"  import {module:<30} mediana {median(imports):8.1f} ms")
+    for name, ms in sorted(children.items(), key=lambda item: -median(item[1]))[:args.top]:
+        print(f"    {name:<34} {median(ms):8.1f} ms")
+    print(f"  primer render (proceso completo)     mediana {median(renders):8.1f} ms")
+    eager = [m for m in LAZY_MODULES if m in loaded]
+    print(f"  cargados al importar: {', '.join(eager) or 'ninguno de ' + ', '.join(LAZY_MODULES)}")
+    print(f"  cargados tras el primer render: {', '.join(render['loaded']) or 'ninguno'}")
+
+    failures = []
+    if args.import_budget_ms and median(imports) > args.import_budget_ms:
+        failures.append(f"importar tarda {median(imports):.0f} ms (presupuesto {args.import_budget_ms:.0f} ms)")
+    if args.render_budget_ms and median(renders) > args.render_budget_ms:
+        failures.append(f"el primer render tarda {median(renders):.0f} ms (presupuesto {args.render_budget_ms:.0f} ms)")
+    if args.strict and (eager or render['loaded']):
+        failures.append(f"módulos pesados cargados antes de usarse: {', '.join(sorted(set(eager + render['loaded'])))}")
+    if failures:
+        raise SystemExit("; ".join(failures))
+
+
+# Benchmark: pool de conexiones frente a abrir/cerrar por llamada
+def bench_storage(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = _temp_db(tmpdir)
+        project_id = storage.create_project('bench', 'benchmark')
+        for i in range(50):
+            storage.add_task(project_id, f'Tarea {i}', 8.0, '2024-01-01', '2024-01-02')
+
+        # Patrón original: sqlite3.connect + consulta + commit + close
+        def legacy_read(_):
+            conn = sqlite3.connect(db_path)
+            c = conn.cursor()
+            c.execute('SELECT * FROM tasks WHERE project_id = ? ORDER BY start_date', (project_id,))
+            c.fetchall()
+            conn.close()
+
+        def legacy_write(i):
+            conn = sqlite3.connect(db_path)
+            c = conn.cursor()
+            c.execute('UPDATE tasks SET actual_hours = ? WHERE id = ?', (i % 10, 1))
+            conn.commit()
+            conn.close()
+
+        def pooled_read(_):
+            storage.get_tasks.uncached(project_id)
+
+        def cached_read(_):
+            storage.get_tasks(project_id)
+
+        def pooled_write(i):
+            storage.update_task_actual_hours(1, i % 10)
+
+        print(f"storage: {args.ops} operaciones por caso")
+        _report('lectura (abrir/cerrar)', args.ops, _timed(legacy_read, args.ops))
+        _report('lectura (pool)', args.ops, _timed(pooled_read, args.ops))
+        _report('lectura (pool + caché)', args.ops, _timed(cached_read, args.ops))
+        _report('escritura (abrir/cerrar)', args.ops, _timed(legacy_write, args.ops))
+        _report('escritura (pool)', args.ops, _timed(pooled_write, args.ops))
+        # Cada escritura invalida la caché: la siguiente lectura es un fallo
+        storage.clear_read_cache()
+        _report('lectura tras escritura', args.ops, _timed(lambda i: (pooled_write(i), cached_read(i)), args.ops))
+        stats = storage.get_read_cache_stats()
+        print(f"  caché de lecturas: {stats['hits']:,} aciertos, {stats['misses']:,} fallos, "
+              f"{stats['invalidations']:,} invalidaciones")
+        storage.get_pool().close()
+
+
+# Benchmark: coste de la instrumentación con las trazas desactivadas y activadas
+def bench_tracing(args):
+    import tracing
+
+    def plain(i):
+        return i
+
+    traced = tracing.traced(plain)
+
+    def spanned(i):
+        with tracing.span('bench.span'):
+            return i
+
+    def per_call_ns(fn, ops):
+        return _timed(fn, ops) / ops * 1e9
+
+    was_enabled = tracing.is_enabled()
+    try:
+        print(f"tracing: {args.ops} llamadas por caso")
+        baseline = per_call_ns(plain, args.ops)
+        print(f"  {'sin instrumentar':<32} {baseline:>8.0f} ns/llamada")
+        for enabled in (False, True):
+            tracing.enable(enabled)
+            tracing.reset()
+            state = 'activadas' if enabled else 'desactivadas'
+            for label, fn in (('@traced', traced), ('span()', spanned)):
+                cost = per_call_ns(fn, args.ops)
+                print(f"  {f'{label}, trazas {state}':<32} {cost:>8.0f} ns/llamada (+{cost - baseline:.0f} ns)")
+
+        # Una lectura real de storage servida por la caché, la ruta más corta instrumentada
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _temp_db(tmpdir)
+            project_id = storage.create_project('bench', 'benchmark')
+            storage.add_task(project_id, 'Tarea', 8.0, '2024-01-01', '2024-01-02')
+            for enabled in (False, True):
+                tracing.enable(enabled)
+                _report(f"get_tasks cacheada, trazas {'activadas' if enabled else 'desactivadas'}",
+                        args.ops, _timed(lambda _: storage.get_tasks(project_id), args.ops))
+            storage.get_pool().close()
+    finally:
+        tracing.enable(was_enabled)
+        tracing.reset()
+
+
+def _seed(projects, tasks):
+    """Inserta `projects` proyectos y `tasks` tareas repartidas entre ellos"""
+    statuses = ('pending', 'in_progress', 'completed')
+    base = datetime.date(2024, 1, 1)
+    rng = random.Random(42)
+    with storage.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO projects (name, description, status, created_at) VALUES (?, ?, ?, ?)',
+            ((f'Proyecto {i}', 'seed', 'active', f'2024-01-01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}')
+             for i in range(projects)))
+        first_id = conn.execute('SELECT MIN(id) FROM projects').fetchone()[0]
+
+        def rows():
+            for i in range(tasks):
+                start = base + datetime.timedelta(days=rng.randrange(365))
+                yield (first_id + i % projects, f'Tarea {i}', rng.choice((2.0, 4.0, 8.0, 16.0)),
+                       rng.choice((0.0, 4.0, 8.0)), rng.choice(statuses),
+                       start.isoformat(), (start + datetime.timedelta(days=2)).isoformat())
+
+        conn.executemany('''
+            INSERT INTO tasks (project_id, description, estimated_hours, actual_hours, status, start_date, end_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows())
+    return first_id
+
+
+# Benchmark: tiempo de pared por rerun del script de Streamlit
+def bench_rerun(args):
+    from streamlit.testing.v1 import AppTest
+
+    script = os.path.abspath(args.script)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Las versiones antiguas del script abren 'devplanner.db' relativo al cwd
+        os.chdir(tmpdir)
+        try:
+            _temp_db(tmpdir, 'devplanner.db')
+            # Proyectos de relleno: la página de proyectos no debería notarlos
+            for i in range(args.projects - 1):
+                storage.create_project(f'relleno {i}', 'benchmark de reruns')
+            project_id = storage.create_project('bench', 'benchmark de reruns')
+            storage.add_tasks(project_id, [{
+                'description': f'Tarea {i}',
+                'estimated_hours': 8.0,
+                'start_date': '2024-01-01',
+                'end_date': '2024-01-02',
+            } for i in range(args.tasks)])
+
+            at = AppTest.from_file(script, default_timeout=60)
+            at.session_state['current_project'] = project_id
+            at.run()
+            if at.exception:
+                raise SystemExit(f"El script falló: {at.exception}")
+
+            timings = []
+            for _ in range(args.reruns):
+                start = time.perf_counter()
+                at.run()
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            storage.get_pool().close()
+            os.chdir(cwd)
+
+    timings.sort()
+    median = timings[len(timings) // 2]
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"rerun: {os.path.basename(script)}, {args.projects} proyectos, {args.tasks} tareas, {args.reruns} reruns")
+    print(f"  mediana {median:.1f} ms | p95 {p95:.1f} ms | máx {timings[-1]:.1f} ms")
+    if args.budget_ms and p95 > args.budget_ms:
+        raise SystemExit(f"p95 {p95:.1f} ms supera el presupuesto de {args.budget_ms:.0f} ms")
+
+
+# Benchmark: add_tasks() en una transacción frente a add_task() fila a fila
+def bench_bulk_insert(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _temp_db(tmpdir)
+        project_id = storage.create_project('bench', 'bulk insert')
+        print("bulk-insert: add_task() por fila frente a add_tasks()")
+        for size in args.sizes:
+            tasks = [{
+                'description': f'Tarea {i}',
+                'estimated_hours': 8.0,
+                'start_date': '2024-01-01',
+                'end_date': '2024-01-02',
+                'dependencies': [],
+            } for i in range(size)]
+
+            start = time.perf_counter()
+            for task in tasks:
+                storage.add_task(project_id, task['description'], task['estimated_hours'],
+                                 task['start_date'], task['end_date'], task['dependencies'])
+            per_row = time.perf_counter() - start
+
+            start = time.perf_counter()
+            ids = storage.add_tasks(project_id, tasks)
+            bulk = time.perf_counter() - start
+            assert len(ids) == size
+
+            print(f"  {size:>6} tareas: por fila {per_row * 1000:9.1f} ms | "
+                  f"add_tasks {bulk * 1000:7.1f} ms | x{per_row / bulk:.0f}")
+        storage.get_pool().close()
+
+
+class _StubOllamaHandler(BaseHTTPRequestHandler):
+    """Imita /api/tags y /api/generate de Ollama con un plan fijo"""
+    protocol_version = 'HTTP/1.1'
+    # Como el servidor real, sin Nagle: evita esperas de ACK retardado con keep-alive
+    disable_nagle_algorithm = True
+    plan = json.dumps({'tasks': [{'description': f'Tarea {i}', 'estimated_hours': 8.0, 'dependencies': []}
+                                 for i in range(10)]})
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send_json({'models': []})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._send_json({'response': self.plan, 'done': True})
+
+
+@contextmanager
+def _stub_ollama_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _latency_report(label, timings):
+    timings = sorted(timings)
+    mean = sum(timings) / len(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"  {label:<42} media {mean:7.3f} ms | p50 {timings[len(timings) // 2]:7.3f} ms | p95 {p95:7.3f} ms")
+
+
+# Benchmark: sesiones HTTP y clientes de IA reutilizados frente a nuevos por llamada
+def bench_http_clients(args):
+    import ai
+    import requests
+    from openai import OpenAI
+
+    prompt = ai.build_task_prompt('benchmark')
+    with _stub_ollama_server() as url:
+        ai.OLLAMA_URL = url
+        print(f"http-clients: {args.calls} generaciones contra un Ollama simulado en {url}")
+
+        # Patrón original: health check + generate, cada uno con su conexión TCP
+        def legacy():
+            requests.get(f'{url}/api/tags', timeout=10)
+            response = requests.post(f'{url}/api/generate', json={'model': 'stub', 'prompt': prompt,
+                                                                   'stream': False}, timeout=30)
+            ai.extract_tasks(response.json()['response'])
+
+        def pooled():
+            ai.request_tasks(prompt, 'ollama', 'stub')
+
+        for label, fn in (('health check + generate sin sesión', legacy),
+                          ('sesión compartida + health check cacheado', pooled)):
+            fn()  # calentamiento
+            timings = []
+            for _ in range(args.calls):
+                start = time.perf_counter()
+                fn()
+                timings.append((time.perf_counter() - start) * 1000)
+            _latency_report(label, timings)
+
+    # Construir un cliente de OpenAI no requiere red, pero tampoco es gratis
+    timings = []
+    for _ in range(args.calls):
+        start = time.perf_counter()
+        OpenAI(api_key='sk-bench')
+        timings.append((time.perf_counter() - start) * 1000)
+    _latency_report('OpenAI(api_key=...) por llamada', timings)
+    timings = []
+    for _ in range(args.calls):
+        start = time.perf_counter()
+        ai.get_openai_client('sk-bench')
+        timings.append((time.perf_counter() - start) * 1000)
+    _latency_report('get_openai_client() cacheado', timings)
+
+
+# Benchmark: flujo de planificación completo con el proveedor simulado
+def bench_pipeline(args):
+    import ai
+    import batch
+
+    stub = ai.register_provider(ai.StubProvider(latency=args.latency, chunk_delay=args.chunk_delay,
+                                                failure_rate=args.failure_rate, tasks=args.tasks))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _temp_db(tmpdir)
+        print(f"pipeline: proveedor simulado (latencia {args.latency * 1000:.0f} ms, "
+              f"{args.tasks} tareas/plan, fallos {args.failure_rate:.0%})")
+
+        # Interactivo: streaming de un plan, tiempo hasta la primera tarea
+        first_task, totals = [], []
+        for i in range(args.interactive):
+            start = time.perf_counter()
+            first = None
+            for _ in ai.generate_tasks(f'Proyecto interactivo {i}', 'stub', 'stub', use_cache=False):
+                first = first or time.perf_counter() - start
+            first_task.append(first * 1000)
+            totals.append((time.perf_counter() - start) * 1000)
+        _latency_report('streaming: primera tarea', first_task)
+        _latency_report('streaming: plan completo', totals)
+
+        # Lote: planes concurrentes guardados con add_tasks()
+        for i in range(args.projects):
+            storage.create_project(f'Proyecto {i}', f'Descripción del proyecto {i}')
+        projects = storage.get_projects_without_tasks()
+        batch.BACKOFF_BASE = 0.01
+        start = time.perf_counter()
+        results = batch.run_batch(projects, 'stub', 'stub', concurrency=args.concurrency, use_cache=False)
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for r in results.values() if isinstance(r, Exception))
+        saved = sum(len(r) for r in results.values() if not isinstance(r, Exception))
+        print(f"  lote: {len(projects)} proyectos, concurrencia {args.concurrency}: {elapsed:.2f} s | "
+              f"{len(projects) / elapsed:,.1f} planes/s | {saved / elapsed:,.0f} tareas/s | "
+              f"{stub.calls} peticiones, {failed} fallidos")
+        storage.get_pool().close()
+
+
+def _legacy_parse(text):
+    """Análisis original: del primer '{' al último '}', y todo el plan falla si una tarea está mal"""
+    tasks = json.loads(text[text.find('{'):text.rfind('}') + 1]).get('tasks', [])
+    if not tasks or not all(isinstance(t, dict) and isinstance(t.get('description'), str)
+                            and isinstance(t.get('estimated_hours'), (int, float)) for t in tasks):
+        raise ValueError("tarea incompleta")
+    return tasks
+
+
+# Benchmark: análisis tolerante y correcciones dirigidas frente a regenerar el plan
+def bench_structured(args):
+    import ai
+
+    stub = ai.register_provider(ai.StubProvider(tasks=args.tasks, malformed_rate=args.malformed_rate))
+    print(f"structured: {args.plans} planes de {args.tasks} tareas, "
+          f"{args.malformed_rate:.0%} de tareas mal formadas, hasta {args.retries} reintentos")
+
+    def report(label, ok, first_ok, requests, tokens, wasted):
+        print(f"  {label:<24} {ok / args.plans:>6.1%} planes | {first_ok / args.plans:>6.1%} a la primera | "
+              f"{requests / args.plans:.2f} peticiones/plan | {tokens / args.plans:,.0f} tokens/plan, "
+              f"{wasted / args.plans:,.0f} desperdiciados")
+
+    # Original: cualquier fallo obliga a regenerar el plan entero
+    ok = first_ok = requests = tokens = wasted = 0
+    for i in range(args.plans):
+        for attempt in range(args.retries + 1):
+            text = stub.generate(ai.build_task_prompt(f'Proyecto {i}'), 'stub')
+            requests += 1
+            tokens += ai.estimate_tokens(text)
+            try:
+                _legacy_parse(text)
+            except ValueError:
+                wasted += ai.estimate_tokens(text)
+                continue
+            ok += 1
+            first_ok += attempt == 0
+            break
+    report('regenerar el plan', ok, first_ok, requests, tokens, wasted)
+
+    # Estructurado: reparación del JSON, validación y corrección solo de las tareas inválidas
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _temp_db(tmpdir)
+        ok = first_ok = tokens = wasted = 0
+        calls = stub.calls
+        for i in range(args.plans):
+            for attempt in range(args.retries + 1):
+                generation = {}
+                try:
+                    list(ai.generate_tasks(f'Proyecto {i}', 'stub', 'stub', use_cache=False, stream=False,
+                                           report=generation))
+                except ai.AIError as e:
+                    generation = e.report or {}
+                    tokens += generation.get('output_tokens', 0)
+                    wasted += generation.get('output_tokens', 0)
+                    continue
+                ok += 1
+                first_ok += attempt == 0 and generation['first_response_valid']
+                tokens += generation['output_tokens']
+                wasted += generation['wasted_tokens']
+                break
+        report('corregir solo lo inválido', ok, first_ok, stub.calls - calls, tokens, wasted)
+        storage.get_pool().close()
+
+
+# Benchmark: plan de un proyecto grande en una sola petición frente a por épicas
+def bench_epics(args):
+    import ai
+    import epics
+    from scheduler import schedule_tasks
+
+    # Latencia del simulador proporcional a la salida, como la de un modelo real
+    chunk_size = 32
+    chunk_delay = chunk_size / ai.CHARS_PER_TOKEN / args.tokens_per_s
+    total = args.epics * args.tasks
+    print(f"epics: {args.epics} épicas de {args.tasks} tareas, {args.tokens_per_s} tokens/s por petición, "
+          f"{args.latency * 1000:.0f} ms hasta el primer token")
+    description = "Proyecto grande. " * 100
+
+    def report(label, elapsed, tasks, requests, extra=''):
+        plan = schedule_tasks(tasks, break_cycles=True)
+        print(f"  {label:<28} {elapsed:>6.2f} s | {len(tasks):>4} tareas | {requests:>3} peticiones | "
+              f"{plan.length} días{extra}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _temp_db(tmpdir)
+        stub = ai.register_provider(ai.StubProvider(latency=args.latency, chunk_delay=chunk_delay,
+                                                    chunk_size=chunk_size, tasks=total))
+        start = time.perf_counter()
+        tasks = list(ai.generate_tasks(description, 'stub', 'stub', use_cache=False, stream=False))
+        report('una sola petición', time.perf_counter() - start, tasks, stub.calls)
+
+        for concurrency in args.concurrency:
+            stub = ai.register_provider(ai.StubProvider(latency=args.latency, chunk_delay=chunk_delay,
+                                                        chunk_size=chunk_size, tasks=args.tasks, epics=args.epics))
+            generation = {}
+            start = time.perf_counter()
+            tasks = epics.generate_tasks_by_epics(description, 'stub', 'stub', use_cache=False, report=generation,
+                                                  concurrency=concurrency)
+            report(f'por épicas, {concurrency} a la vez', time.perf_counter() - start, tasks, stub.calls,
+                   f" | {generation['duplicates']} duplicadas fusionadas | {generation['used_tokens']:,} tokens")
+        storage.get_pool().close()
+
+
+# Benchmark: cola de trabajos de IA con varios trabajadores y límite por proveedor
+def bench_jobs(args):
+    import ai
+    import worker
+
+    ai.register_provider(ai.StubProvider(latency=args.latency, tasks=args.tasks))
+    print(f"jobs: {args.projects} planes, proveedor simulado con latencia {args.latency * 1000:.0f} ms, "
+          f"límite {args.limit or 'ninguno'} en curso")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _temp_db(tmpdir)
+            project_ids = [storage.create_project(f'Proyecto {i}', f'Descripción {i}') for i in range(args.projects)]
+            storage.enqueue_ai_jobs(project_ids, 'stub', 'stub', {'use_cache': False})
+            limits = {'stub': args.limit} if args.limit else {}
+            peak = [0]
+            done = threading.Event()
+
+            # Cada hilo hace de proceso trabajador: reserva y ejecuta hasta vaciar la cola
+            def run(name):
+                while (job := storage.claim_ai_job(name, limits)) or storage.get_ai_job_counts.uncached()['queued']:
+                    if job:
+                        worker.run_job(job, name)
+                    else:
+                        time.sleep(0.01)
+
+            def watch():
+                while not done.wait(0.02):
+                    peak[0] = max(peak[0], storage.get_ai_job_counts.uncached()['running'])
+
+            watcher = threading.Thread(target=watch)
+            watcher.start()
+            start = time.perf_counter()
+            threads = [threading.Thread(target=run, args=(f'bench-{i}',)) for i in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            done.set()
+            watcher.join()
+
+            counts = storage.get_ai_job_counts.uncached()
+            with storage.connection() as conn:
+                saved = conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+            duplicated = saved - counts['done'] * args.tasks
+            print(f"  {workers:>2} trabajadores: {elapsed:6.2f} s | {args.projects / elapsed:6.1f} planes/s | "
+                  f"máx. {peak[0]} en curso | {counts['done']} hechos, {counts['failed']} fallidos, "
+                  f"{duplicated} tareas duplicadas")
+            storage.get_pool().close()
+
+
+def _random_plan(n, max_deps=3, window=50, seed=0):
+    """Grafo acíclico aleatorio con índices barajados, como los que devuelve la IA"""
+    rng = random.Random(seed)
+    labels = list(range(n))
+    rng.shuffle(labels)
+    tasks = [None] * n
+    for i in range(n):
+        deps = [labels[rng.randrange(max(0, i - window), i)] for _ in range(rng.randint(0, max_deps))] if i else []
+        tasks[labels[i]] = {'description': f'Tarea {i}', 'estimated_hours': rng.choice([2, 4, 8, 16, 24, 40]),
+                            'dependencies': deps}
+    return tasks
+
+
+# Benchmark: planificador por camino crítico sobre grafos grandes
+def bench_scheduler(args):
+    import scheduler
+
+    calendar = scheduler.WorkCalendar(holidays=[datetime.date.today() + datetime.timedelta(days=d)
+                                                for d in range(0, 3650, 30)])
+    print(f"scheduler: hasta {args.max_deps} dependencias por tarea, mejor de {args.repeat}")
+    elapsed = 0
+    for size in args.sizes:
+        tasks = _random_plan(size, args.max_deps)
+        edges = sum(len(t['dependencies']) for t in tasks)
+        elapsed = min(_timed(lambda i: scheduler.schedule_tasks(tasks, calendar=calendar), 1)
+                      for _ in range(args.repeat))
+        plan = scheduler.schedule_tasks(tasks, calendar=calendar)
+        print(f"  {size:>9,} tareas {edges:>9,} aristas: {elapsed * 1000:8.1f} ms | "
+              f"{plan.length:,} días, {len(plan.critical_tasks):,} críticas")
+
+        # Cerrar el camino crítico sobre sí mismo: el ciclo más largo posible
+        first, last = plan.critical_path[0], plan.critical_path[-1]
+        tasks[first]['dependencies'] = tasks[first]['dependencies'] + [last]
+        start = time.perf_counter()
+        try:
+            scheduler.schedule_tasks(tasks, calendar=calendar)
+        except scheduler.ScheduleError as e:
+            print(f"  {'':>9} detección de ciclo: {(time.perf_counter() - start) * 1000:8.1f} ms "
+                  f"({len(e.cycle):,} tareas en el ciclo)")
+    if args.budget_ms and elapsed * 1000 > args.budget_ms:
+        raise SystemExit(f"{elapsed * 1000:.0f} ms supera el presupuesto de {args.budget_ms:.0f} ms")
+
+
+# Benchmark: nivelación de recursos completa frente a incremental
+def bench_leveling(args):
+    import leveling
+
+    rng = random.Random(0)
+    start_date = datetime.date.today()
+    people = [leveling.Person(p, f'Persona {p}', rng.choice([4, 6, 8]), range(5),
+                              {start_date + datetime.timedelta(days=rng.randrange(180)) for _ in range(5)})
+              for p in range(args.people)]
+    tasks = []
+    for i in range(args.tasks):
+        first = i - i % args.project_size
+        predecessors = [rng.randrange(first, i) for _ in range(rng.randint(0, 2))] if i > first else []
+        tasks.append({'id': i, 'project_id': i // args.project_size, 'hours': rng.choice([2, 4, 8, 16, 24, 40]),
+                      'assignee_id': rng.randrange(args.people) if rng.random() > 0.1 else None,
+                      'predecessors': predecessors})
+    print(f"leveling: {args.tasks} tareas, {args.people} personas, "
+          f"{args.tasks // args.project_size} proyectos")
+
+    for rule in leveling.PRIORITY_RULES:
+        elapsed = _timed(lambda i: leveling.Leveling(tasks, people, start_date, rule), 1)
+        result = leveling.Leveling(tasks, people, start_date, rule)
+        busy = sorted(row['utilization'] for row in result.utilization().values())
+        print(f"  {rule:<16} completa {elapsed * 1000:7.1f} ms | horizonte {result.horizon} días | "
+              f"ocupación mediana {busy[len(busy) // 2]:.0%}")
+
+    # Reasignar o re-estimar una tarea cualquiera y re-nivelar solo lo posterior
+    result = leveling.Leveling(tasks, people, start_date)
+    timings, changed = [], []
+    for _ in range(args.updates):
+        task_id = rng.randrange(args.tasks)
+        start = time.perf_counter()
+        changed.append(len(result.update_task(task_id, hours=rng.choice([4, 8, 16]),
+                                              assignee_id=rng.randrange(args.people))))
+        timings.append((time.perf_counter() - start) * 1000)
+    _latency_report('incremental: una tarea', timings)
+    changed.sort()
+    print(f"  tareas con fechas nuevas por cambio: mediana {changed[len(changed) // 2]}, máx {changed[-1]}")
+
+
+# Benchmark: replanificación incremental tras editar una tarea de un proyecto grande
+def bench_reschedule(args):
+    import scheduler
+    from ai import plan_to_task_rows
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _temp_db(tmpdir)
+        project_id = storage.create_project('bench', 'reschedule')
+        plan = _random_plan(args.tasks)
+        start = time.perf_counter()
+        ids = storage.add_tasks(project_id, plan_to_task_rows(plan))
+        print(f"reschedule: proyecto de {args.tasks:,} tareas creado en {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        tasks = storage.get_tasks(project_id)
+        edges = storage.get_project_dependencies(project_id)
+        position = {task[0]: i for i, task in enumerate(tasks)}
+        dependencies = [[] for _ in tasks]
+        for task_id, depends_on_id in edges:
+            dependencies[position[task_id]].append(position[depends_on_id])
+        scheduler.schedule_tasks([{'estimated_hours': t[3], 'dependencies': d} for t, d in zip(tasks, dependencies)])
+        full = (time.perf_counter() - start) * 1000
+        print(f"  replanificación completa (leer + planificar, sin guardar): {full:8.1f} ms")
+
+        rng = random.Random(1)
+        timings, violations = [], 0
+        for _ in range(args.edits):
+            task_id = rng.choice(ids)
+            with storage.connection() as conn:
+                end = datetime.date.fromisoformat(
+                    conn.execute('SELECT end_date FROM tasks WHERE id = ?', (task_id,)).fetchone()[0])
+            descendants = storage.get_all_successors(task_id)
+            # Se descubre el retraso diez días después del fin previsto
+            start = time.perf_counter()
+            changed, visited = storage.update_task_progress(task_id, status='in_progress', actual_hours=1000,
+                                                            today=end + datetime.timedelta(days=10))
+            elapsed = (time.perf_counter() - start) * 1000
+            timings.append(elapsed)
+            outside = set(changed) - descendants - {task_id}
+            violations += len(outside)
+            print(f"  tarea {task_id:>6}: {len(descendants):>6,} descendientes | {visited:>6,} sucesoras leídas | "
+                  f"{len(changed):>6,} filas escritas | {elapsed:8.1f} ms"
+                  + (f" | {len(outside)} FUERA DE LOS DESCENDIENTES" if outside else ""))
+        _latency_report('incremental: una edición', timings)
+        storage.get_pool().close()
+    if violations:
+        raise SystemExit(f"{violations} filas modificadas fuera de los descendientes de la tarea editada")
+
+
+def _legacy_gantt(tasks):
+    """create_gantt_chart() anterior: bucle por tupla, strptime y todas las tareas en el gráfico"""
+    import pandas as pd
+    import plotly.express as px
+
+    task_data = []
+    for task in tasks:
+        start_date = datetime.datetime.strptime(task[6], '%Y-%m-%d').date() if isinstance(task[6], str) else task[6]
+        end_date = datetime.datetime.strptime(task[7], '%Y-%m-%d').date() if isinstance(task[7], str) else task[7]
+        task_data.append({'Task': task[2], 'Start': start_date, 'Finish': end_date,
+                          'Hours': task[3], 'Status': task[5]})
+    fig = px.timeline(pd.DataFrame(task_data), x_start="Start", x_end="Finish", y="Task", color="Status",
+                      hover_data=["Hours"], title="Diagrama de Gantt del Proyecto")
+    fig.update_yaxes(autorange="reversed")
+    fig.update_layout(height=400)
+    return fig
+
+
+# Benchmark: construcción y tamaño del Gantt por modo y número de tareas
+def bench_gantt(args):
+    import gantt
+
+    rng = random.Random(0)
+    statuses = ['pending', 'in_progress', 'completed']
+    print("gantt: tiempo de construcción (lectura + figura) y JSON enviado al navegador")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _temp_db(tmpdir)
+        for size in args.sizes:
+            project_id = storage.create_project(f'bench {size}', 'gantt')
+            base = datetime.date(2025, 1, 1)
+            rows = []
+            for i in range(size):
+                start = base + datetime.timedelta(days=rng.randrange(365))
+                rows.append({'description': f'Tarea {i}', 'estimated_hours': rng.choice([4, 8, 16]),
+                             'start_date': start, 'end_date': start + datetime.timedelta(days=rng.randint(1, 10))})
+            ids = storage.add_tasks(project_id, rows)
+            with storage.transaction() as conn:
+                conn.executemany('UPDATE tasks SET status = ? WHERE id = ?',
+                                 [(rng.choice(statuses), task_id) for task_id in ids])
+
+            modes = [('detalle p.1', lambda: gantt.create_gantt_chart(project_id, 'detail')),
+                     ('agrupado', lambda: gantt.create_gantt_chart(project_id, 'grouped'))]
+            if size <= args.legacy_max:
+                modes.insert(0, ('anterior', lambda: _legacy_gantt(storage.get_tasks(project_id))))
+            for label, build in modes:
+                start = time.perf_counter()
+                fig = build()
+                elapsed = (time.perf_counter() - start) * 1000
+                payload = len(fig.to_json())
+                print(f"  {size:>7,} tareas {label:<12} {elapsed:9.1f} ms | {payload / 1024:10,.1f} KiB")
+        storage.get_pool().close()
+
+
+def _legacy_kpis(tasks):
+    """calculate_kpis() anterior más el recuento por estado de la página de KPIs: pasadas en Python"""
+    total_estimated = sum(task[3] for task in tasks if task[3])
+    total_actual = sum(task[4] for task in tasks if task[4])
+    completed_tasks = sum(1 for task in tasks if task[5] == 'completed')
+    status_counts = {}
+    for task in tasks:
+        status_counts[task[5]] = status_counts.get(task[5], 0) + 1
+    return {
+        'total_tasks': len(tasks),
+        'completed_tasks': completed_tasks,
+        'total_estimated_hours': total_estimated,
+        'total_actual_hours': total_actual,
+        'status_counts': status_counts,
+    }
+
+
+# Benchmark: lote de ediciones en una transacción frente a una por edición
+def bench_task_edits(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _temp_db(tmpdir)
+        project_id = storage.create_project('bench', 'task edits')
+        ids = storage.add_tasks(project_id, [{
+            'description': f'Tarea {i}',
+            'estimated_hours': 8.0,
+            'start_date': '2024-01-01',
+            'end_date': '2024-01-02',
+        } for i in range(args.tasks)])
+        print(f"task-edits: {args.tasks:,} tareas, horas reales y responsable de N tareas")
+        person_id = storage.create_person('bench')
+        rng = random.Random(1)
+        for size in args.sizes:
+            edited = rng.sample(ids, size)
+            with storage.connection() as conn:
+                versions = dict(conn.execute('SELECT id, version FROM tasks').fetchall())
+
+            start = time.perf_counter()
+            for hours, task_id in enumerate(edited):
+                storage.update_task_progress(task_id, actual_hours=hours + 1.0)
+                storage.assign_task(task_id, person_id)
+            per_edit = time.perf_counter() - start
+
+            edits = {task_id: {'version': versions[task_id] + 2, 'actual_hours': hours + 2.0, 'assignee_id': None}
+                     for hours, task_id in enumerate(edited)}
+            start = time.perf_counter()
+            saved, conflicts, _ = storage.save_task_edits(edits)
+            batch = time.perf_counter() - start
+            if conflicts or len(saved) != size:
+                raise SystemExit(f"{len(conflicts)} conflictos inesperados en el lote de {size}")
+
+            # Con la versión antigua todo el lote es conflicto y no se escribe nada
+            stale = {task_id: dict(changes, version=versions[task_id]) for task_id, changes in edits.items()}
+            saved, conflicts, _ = storage.save_task_edits(stale)
+            if saved or len(conflicts) != size:
+                raise SystemExit("Se sobrescribieron tareas con una versión antigua")
+            print(f"  {size:>6,} ediciones | una transacción por edición {per_edit * 1000:9.1f} ms | "
+                  f"lote {batch * 1000:8.1f} ms | x{per_edit / batch:5.1f}")
+        storage.get_pool().close()
+
+
+# Benchmark: KPIs agregados en SQL frente a get_tasks() y bucles en Python
+def bench_kpis(args):
+    import kpis
+
+    compared = ('total_tasks', 'completed_tasks', 'total_estimated_hours', 'total_actual_hours', 'status_counts')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _temp_db(tmpdir)
+        start = time.perf_counter()
+        first_id = _seed(args.projects, args.tasks)
+        print(f"kpis: {args.tasks:,} tareas en {args.projects:,} proyectos "
+              f"(seed {time.perf_counter() - start:.1f} s)")
+        sample = random.Random(0).sample(range(first_id, first_id + args.projects), min(args.samples, args.projects))
+
+        def per_project(fn):
+            timings = []
+            for project_id in sample:
+                start = time.perf_counter()
+                result = fn(project_id)
+                timings.append((time.perf_counter() - start) * 1000)
+            return result, timings
+
+        legacy, timings = per_project(lambda project_id: _legacy_kpis(storage.get_tasks(project_id)))
+        _latency_report('anterior: un proyecto', timings)
+        new, timings = per_project(kpis.project_kpis)
+        _latency_report('SQL: un proyecto', timings)
+        mismatch = any(legacy[key] != new[key] for key in compared)
+
+        start = time.perf_counter()
+        with storage.connection() as conn:
+            project_ids = [row[0] for row in conn.execute('SELECT id FROM projects')]
+        legacy_all = {project_id: _legacy_kpis(storage.get_tasks(project_id)) for project_id in project_ids}
+        print(f"  {'anterior: todos los proyectos':<42} {(time.perf_counter() - start) * 1000:9.1f} ms")
+        start = time.perf_counter()
+        new_all = kpis.portfolio_kpis()
+        print(f"  {'SQL: todos los proyectos':<42} {(time.perf_counter() - start) * 1000:9.1f} ms")
+        mismatch |= any(legacy_all[p][key] != new_all[p][key] for p in new_all for key in compared)
+        mismatch |= len(new_all) != sum(1 for result in legacy_all.values() if result['total_tasks'])
+        storage.get_pool().close()
+    if mismatch:
+        raise SystemExit("Los KPIs en SQL no coinciden con el cálculo anterior")
+
+
+# Benchmark: series del dashboard de portfolio con años de instantáneas
+def bench_snapshots(args):
+    import snapshots
+
+    columns = ', '.join(snapshots.SNAPSHOT_COLUMNS)
+    today = datetime.date(2026, 1, 1)
+    days = [(today - datetime.timedelta(days=k)).isoformat() for k in range(args.days, -1, -1)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _temp_db(tmpdir)
+        start = time.perf_counter()
+        with storage.transaction() as conn:
+            conn.executemany('INSERT INTO projects (name, description) VALUES (?, ?)',
+                             ((f'Proyecto {i}', 'seed') for i in range(args.projects)))
+            project_ids = [row[0] for row in conn.execute('SELECT id FROM projects')]
+
+            def rows():
+                for k, day in enumerate(days):
+                    for project_id in project_ids:
+                        done = min(100, k * 100 // len(days) + project_id % 7)
+                        yield (day, project_id, 100, 100 - done, 0, done, 800.0, done * 8.5, done * 8.0, done * 8.5)
+
+            conn.executemany(f'INSERT INTO project_snapshots (day, project_id, {columns}) '
+                             f'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows())
+            conn.execute(f'''
+                INSERT INTO portfolio_snapshots (day, projects, {columns})
+                SELECT day, COUNT(*), {', '.join(f'TOTAL({column})' for column in snapshots.SNAPSHOT_COLUMNS)}
+                FROM project_snapshots GROUP BY day
+            ''')
+        print(f"snapshots: {args.projects:,} proyectos x {len(days):,} días = {args.projects * len(days):,} filas "
+              f"(seed {time.perf_counter() - start:.1f} s)")
+
+        def measure(label, fn, repeat=5):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = fn()
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"  {label:<42} {min(timings):9.1f} ms | {len(result):>7,} puntos")
+
+        def from_project_rows(since):
+            # Alternativa sin portfolio_snapshots: sumar las filas de todos los proyectos por día
+            with storage.connection() as conn:
+                return conn.execute(f'''
+                    SELECT day, {', '.join(f'TOTAL({column})' for column in snapshots.SNAPSHOT_COLUMNS)}
+                    FROM project_snapshots WHERE day >= ? GROUP BY day
+                ''', (since,)).fetchall()
+
+        year_ago = today - datetime.timedelta(days=365)
+        for label in ('sin retención', 'con retención'):
+            print(f"  -- {label}")
+            measure('portfolio: último año', lambda: snapshots.portfolio_series(year_ago))
+            measure('portfolio: toda la historia', lambda: snapshots.portfolio_series())
+            measure('velocidad semanal (toda la historia)',
+                    lambda: snapshots.weekly_velocity(snapshots.portfolio_series()))
+            measure('proyecto: toda la historia', lambda: snapshots.project_series(project_ids[len(project_ids) // 2]))
+            measure('suma por día de project_snapshots (1 año)',
+                    lambda: from_project_rows(year_ago.isoformat()), repeat=1)
+            if label == 'sin retención':
+                start = time.perf_counter()
+                deleted = snapshots.apply_retention(today)
+                with storage.connection() as conn:
+                    remaining = conn.execute('SELECT COUNT(*) FROM project_snapshots').fetchone()[0]
+                print(f"  retención: {deleted:,} filas borradas en {time.perf_counter() - start:.1f} s, "
+                      f"quedan {remaining:,}")
+        with storage.transaction() as conn:
+            conn.execute('UPDATE project_stats SET total_tasks = 100, pending_tasks = 100, estimated_hours = 800')
+        start = time.perf_counter()
+        snapshots.take_snapshot(today + datetime.timedelta(days=1))
+        print(f"  instantánea diaria de {args.projects:,} proyectos: {(time.perf_counter() - start) * 1000:.1f} ms")
+        storage.get_pool().close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de DevPlanner")
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    p = sub.add_parser('storage', help="Pool de conexiones frente a abrir/cerrar por llamada")
+    p.add_argument('--ops', type=int, default=5000)
+    p.set_defaults(func=bench_storage)
+
+    p = sub.add_parser('tracing', help="Coste por llamada de @traced y span() con las trazas desactivadas y activadas")
+    p.add_argument('--ops', type=int, default=200_000)
+    p.set_defaults(func=bench_tracing)
+
+    p = sub.add_parser('rerun', help="Tiempo por rerun de la página de proyectos (Streamlit AppTest)")
+    p.add_argument('--script', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'devplanner.py'),
+                   help="Script a medir (permite comparar con versiones anteriores)")
+    p.add_argument('--projects', type=int, default=1)
+    p.add_argument('--tasks', type=int, default=30)
+    p.add_argument('--reruns', type=int, default=50)
+    p.add_argument('--budget-ms', type=float, default=RERUN_BUDGET_MS,
+                   help="Falla si el p95 supera este valor (0 para desactivar)")
+    p.set_defaults(func=bench_rerun)
+
+    p = sub.add_parser('startup', help="Arranque en frío: -X importtime y primer render en procesos nuevos")
+    p.add_argument('--script', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'devplanner.py'),
+                   help="Script a medir (permite comparar con versiones anteriores)")
+    p.add_argument('--runs', type=int, default=5)
+    p.add_argument('--top', type=int, default=8, help="Importaciones directas más lentas a mostrar")
+    p.add_argument('--import-budget-ms', type=float, default=STARTUP_IMPORT_BUDGET_MS,
+                   help="Falla si la mediana de importación lo supera (0 para desactivar)")
+    p.add_argument('--render-budget-ms', type=float, default=STARTUP_RENDER_BUDGET_MS,
+                   help="Falla si la mediana del primer render lo supera (0 para desactivar)")
+    p.add_argument('--strict', action=argparse.BooleanOptionalAction, default=True,
+                   help="Falla si se cargan módulos de LAZY_MODULES al arrancar")
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser('bulk-insert', help="Inserción masiva de tareas frente a inserción fila a fila")
+    p.add_argument('--sizes', type=int, nargs='+', default=[100, 1_000, 10_000])
+    p.set_defaults(func=bench_bulk_insert)
+
+    p = sub.add_parser('http-clients', help="Latencia con sesión HTTP y clientes reutilizados frente a nuevos")
+    p.add_argument('--calls', type=int, default=200)
+    p.set_defaults(func=bench_http_clients)
+
+    p = sub.add_parser('pipeline', help="Planificación interactiva y en lote con el proveedor simulado")
+    p.add_argument('--projects', type=int, default=200)
+    p.add_argument('--interactive', type=int, default=10, help="Generaciones en streaming a medir")
+    p.add_argument('--tasks', type=int, default=20, help="Tareas por plan")
+    p.add_argument('--latency', type=float, default=0.2, help="Segundos hasta el primer fragmento")
+    p.add_argument('--chunk-delay', type=float, default=0.005, help="Segundos entre fragmentos")
+    p.add_argument('--failure-rate', type=float, default=0.1)
+    p.add_argument('--concurrency', type=int, default=16)
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser('structured', help="Planes válidos y tokens desperdiciados con respuestas mal formadas")
+    p.add_argument('--plans', type=int, default=200)
+    p.add_argument('--tasks', type=int, default=12, help="Tareas por plan")
+    p.add_argument('--malformed-rate', type=float, default=0.05, help="Probabilidad de que una tarea salga mal")
+    p.add_argument('--retries', type=int, default=3, help="Regeneraciones completas permitidas por plan")
+    p.set_defaults(func=bench_structured)
+
+    p = sub.add_parser('epics', help="Latencia y tamaño del plan de un proyecto grande, plano frente a por épicas")
+    p.add_argument('--epics', type=int, default=12)
+    p.add_argument('--tasks', type=int, default=20, help="Tareas por épica")
+    p.add_argument('--tokens-per-s', type=float, default=2000, help="Velocidad de salida del proveedor simulado")
+    p.add_argument('--latency', type=float, default=0.2, help="Segundos hasta el primer token")
+    p.add_argument('--concurrency', type=int, nargs='+', default=[4, 12], help="Épicas desglosadas a la vez")
+    p.set_defaults(func=bench_epics)
+
+    p = sub.add_parser('jobs', help="Rendimiento de la cola de trabajos de IA según trabajadores y límite")
+    p.add_argument('--projects', type=int, default=40)
+    p.add_argument('--latency', type=float, default=0.2, help="Segundos por generación del proveedor simulado")
+    p.add_argument('--tasks', type=int, default=8, help="Tareas por plan")
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    p.add_argument('--limit', type=int, default=4, help="Trabajos en curso a la vez del proveedor (0 = sin límite)")
+    p.set_defaults(func=bench_jobs)
+
+    p = sub.add_parser('scheduler', help="Planificación por camino crítico de grafos grandes")
+    p.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    p.add_argument('--max-deps', type=int, default=3)
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--budget-ms', type=float, default=SCHEDULER_BUDGET_MS,
+                   help="Falla si el mayor tamaño supera este valor (0 para desactivar)")
+    p.set_defaults(func=bench_scheduler)
+
+    p = sub.add_parser('leveling', help="Nivelación de recursos completa frente a incremental")
+    p.add_argument('--tasks', type=int, default=5_000)
+    p.add_argument('--people', type=int, default=40)
+    p.add_argument('--project-size', type=int, default=100, help="Tareas por proyecto")
+    p.add_argument('--updates', type=int, default=50)
+    p.set_defaults(func=bench_leveling)
+
+    p = sub.add_parser('task-edits', help="Ediciones de tareas en lote frente a una transacción por edición")
+    p.add_argument('--tasks', type=int, default=10_000)
+    p.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1_000])
+    p.set_defaults(func=bench_task_edits)
+
+    p = sub.add_parser('reschedule', help="Replanificación incremental tras editar una tarea")
+    p.add_argument('--tasks', type=int, default=50_000)
+    p.add_argument('--edits', type=int, default=20)
+    p.set_defaults(func=bench_reschedule)
+
+    p = sub.add_parser('gantt', help="Tiempo de construcción y tamaño del diagrama de Gantt")
+    p.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    p.add_argument('--legacy-max', type=int, default=10_000,
+                   help="Mayor tamaño en el que se mide también la versión anterior")
+    p.set_defaults(func=bench_gantt)
+
+    p = sub.add_parser('kpis', help="KPIs agregados en SQL frente a recorrer las tareas en Python")
+    p.add_argument('--projects', type=int, default=10_000)
+    p.add_argument('--tasks', type=int, default=1_000_000)
+    p.add_argument('--samples', type=int, default=200, help="Proyectos en los que medir la latencia individual")
+    p.set_defaults(func=bench_kpis)
+
+    p = sub.add_parser('snapshots', help="Series del portfolio con años de instantáneas, antes y después de la retención")
+    p.add_argument('--projects', type=int, default=2_000)
+    p.add_argument('--days', type=int, default=1_095)
+    p.set_defaults(func=bench_snapshots)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
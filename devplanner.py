@@ -1,14 +1,48 @@
 import streamlit as st
-import sqlite3
-import json
-import plotly.express as px
-import pandas as pd
-import requests
 import datetime
 from datetime import timedelta
 import time
 import os
-from openai import OpenAI
+
+# plotly, pandas y los clientes de IA (openai, requests, httpx) no se importan
+# aquí: cada página los importa al renderizarse, y ai.py al hacer peticiones.
+from storage import (
+    init_db, get_pool, create_project, get_projects, get_projects_page, get_projects_without_tasks, get_project,
+    add_task, get_tasks_page, get_task_names, get_predecessor_names, get_blocked_task_counts,
+    save_task_edits,
+    get_ai_config, save_ai_config,
+    enqueue_ai_jobs, get_latest_ai_job, get_ai_job_position, get_ai_job_counts, get_recent_ai_jobs,
+    clear_ai_cache, get_ai_cache_stats, get_read_cache_stats,
+    create_person, get_people, delete_person, add_time_off, get_time_off,
+)
+from ai import PROVIDERS
+from worker import DEFAULT_WORKERS, default_limits, start_worker_pool
+from scheduler import WorkCalendar, parse_holidays
+from gantt import GANTT_DETAIL_THRESHOLD, GANTT_LANES, GANTT_PAGE_SIZE, count_gantt_tasks, create_gantt_chart
+from kpis import portfolio_kpis, portfolio_totals, project_kpis
+from snapshots import (
+    SNAPSHOT_DAILY_DAYS, SNAPSHOT_WEEKLY_DAYS, portfolio_series, start_snapshot_job, take_snapshot, weekly_velocity,
+)
+from leveling import DEFAULT_RULE, PRIORITY_RULES, level_active_projects, save_dates
+import tracing
+from tracing import span
+
+# Recursos estáticos locales: la aplicación no descarga nada al renderizar
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+WEEKDAY_NAMES = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+TASK_STATUSES = ["pending", "in_progress", "completed"]
+# Campo de save_task_edits() -> columna del editor de tareas
+TASK_EDIT_COLUMNS = {'status': 'Estado', 'actual_hours': 'Real (h)', 'assignee_id': 'Responsable'}
+# Elementos por página en la página de proyectos
+PROJECTS_PAGE_SIZE = 20
+TASKS_PAGE_SIZE = 50
+PRIORITY_RULE_LABELS = {
+    'min_slack': "Menor holgura primero",
+    'shortest': "Tareas más cortas primero",
+    'most_successors': "Más tareas dependientes primero",
+    'project': "Proyectos más antiguos primero",
+}
 
 # Configuración de la página
 st.set_page_config(
@@ -69,332 +103,558 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Inicialización de la base de datos
-def init_db():
-    conn = sqlite3.connect('devplanner.db')
-    c = conn.cursor()
-    
-    # Tabla de proyectos
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS projects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            status TEXT DEFAULT 'planning'
-        )
-    ''')
-    
-    # Tabla de tareas
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id INTEGER,
-            description TEXT NOT NULL,
-            estimated_hours REAL,
-            actual_hours REAL DEFAULT 0,
-            status TEXT DEFAULT 'pending',
-            start_date DATE,
-            end_date DATE,
-            dependencies TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects (id)
-        )
-    ''')
-    
-    # Tabla de configuraciones de IA
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS ai_config (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ai_provider TEXT DEFAULT 'openai',
-            ai_model TEXT DEFAULT 'gpt-3.5-turbo',
-            api_key TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+# Cola de generación con IA: el estado se consulta cada pocos segundos
+AI_JOB_POLL_INTERVAL = 2
+AI_JOB_STATUS_LABELS = {'queued': "En cola", 'running': "En curso", 'done': "Terminados", 'failed': "Fallidos"}
+# Modo de planificación: parámetro `hierarchical` del trabajo (None = según la longitud de la descripción)
+AI_PLAN_MODES = {
+    None: "Automático (por épicas si la descripción es larga)",
+    False: "Una sola petición",
+    True: "Por épicas, en paralelo (proyectos grandes)",
+}
+
+
+def plan_summary(result):
+    """Resumen de un plan generado por la cola (el `result` del trabajo)"""
+    summary = (f"Plan de {result['tasks']} tareas: {result['length']} días laborables. "
+               f"Camino crítico: {' → '.join(str(i + 1) for i in result['critical_path'])}.")
+    if result['dropped_edges']:
+        summary += f" Se ignoraron {result['dropped_edges']} dependencias circulares."
+    generation = result.get('generation') or {}
+    if generation.get('mode') == 'epics':
+        summary += f" {generation['epics_expanded']} de {generation['epics']} épicas desglosadas"
+        if generation['duplicates']:
+            summary += f", {generation['duplicates']} tareas repetidas fusionadas"
+        summary += "."
+        if generation['epics_skipped']:
+            summary += f" {generation['epics_skipped']} épicas quedaron sin desglosar por el presupuesto de tokens."
+        if generation['epics_failed']:
+            summary += f" {generation['epics_failed']} épicas quedaron sin desglosar por errores de la IA."
+    return summary
+
+
+@st.fragment(run_every=AI_JOB_POLL_INTERVAL)
+def show_ai_job_status(project_id):
+    """Estado del último trabajo de IA del proyecto; al terminar recarga la página con las tareas"""
+    job = get_latest_ai_job(project_id)
+    if job is None:
+        return
+    waiting_key = f"ai_job_waiting_{project_id}"
+    if job['status'] == 'queued':
+        st.session_state[waiting_key] = job['id']
+        st.info(f"⏳ Plan en cola (posición {get_ai_job_position(job['id'])}). "
+                "Puedes seguir trabajando o cerrar la página: se generará igualmente.")
+    elif job['status'] == 'running':
+        st.session_state[waiting_key] = job['id']
+        # Tareas que el trabajador ya recibió de la IA, en el orden en que llegaron
+        received = (job['result'] or {}).get('progress', [])
+        st.info(f"🤖 Generando el plan con {job['ai_provider']} - {job['ai_model']}... "
+                f"{time.time() - job['started_at']:.0f} s"
+                + (f", {len(received)} tareas recibidas" if received else ""))
+        for task in received:
+            st.markdown(f"- {task['description']} ({task['estimated_hours']} h)")
+    elif st.session_state.pop(waiting_key, None) == job['id']:
+        # Acaba de terminar: recargar la página entera para mostrar las tareas
+        if job['status'] == 'done':
+            st.session_state[f"schedule_summary_{project_id}"] = plan_summary(job['result'])
+        st.rerun()
+    elif job['status'] == 'done':
+        st.caption(f"Último plan generado ({datetime.datetime.fromtimestamp(job['finished_at']):%d/%m %H:%M}). "
+                   + plan_summary(job['result']))
+    else:
+        st.error(f"No se pudo generar el plan tras {job['attempts']} intentos: {job['error']}")
+
+
+# Paginación por clave: en session_state se guarda la pila de cursores de
+# las páginas visitadas, que se vacía al cambiar los filtros
+def keyset_cursor(key, filters):
+    """Cursor de la página actual de la lista `key`"""
+    state = st.session_state.setdefault(f"pager_{key}", {'filters': filters, 'cursors': [None]})
+    if state['filters'] != filters:
+        state.update(filters=filters, cursors=[None])
+    return state['cursors'][-1]
+
+
+def keyset_controls(key, next_cursor):
+    """Botones de página anterior y siguiente de la lista `key`"""
+    state = st.session_state[f"pager_{key}"]
+    col1, col2, col3 = st.columns([1, 2, 1])
+    # Los callbacks mueven la pila antes del siguiente rerun, así que sirven
+    # igual dentro de un fragmento
+    with col1:
+        st.button("← Anterior", key=f"prev_{key}", disabled=len(state['cursors']) == 1,
+                  on_click=state['cursors'].pop)
+    with col2:
+        st.caption(f"Página {len(state['cursors'])}")
+    with col3:
+        st.button("Siguiente →", key=f"next_{key}", disabled=next_cursor is None,
+                  on_click=state['cursors'].append, args=(next_cursor,))
+
+
+# Funciones para visualización
+def reschedule_summary(task_ids, changed):
+    """Mensaje tras replanificar; None si solo cambiaron las fechas de las propias tareas"""
+    moved = set(changed) - set(task_ids)
+    if moved:
+        return f"Se reprogramaron {len(moved)} tareas dependientes."
+    return None
+
+
+ACCURACY_HELP = "Compara horas estimadas y reales de las tareas completadas que tienen horas reales registradas."
+
+
+def format_accuracy(ratio, empty="—"):
+    """Precisión de estimación en porcentaje; `empty` si aún no hay tareas con las que medirla"""
+    return empty if ratio is None else f"{ratio * 100:.1f}%"
+
+
+def show_gantt_chart(project_id, key):
+    """Gantt con controles de vista: detalle paginado o agrupado en carriles"""
+    total = count_gantt_tasks(project_id)
+    mode, page, lane = 'auto', 0, 'Status'
+    if total > GANTT_PAGE_SIZE:
+        col1, col2 = st.columns(2)
+        with col1:
+            view = st.radio("Vista", ["Automática", "Detalle", "Agrupada"], horizontal=True, key=f"gantt_view_{key}",
+                            help=f"La vista automática agrupa las tareas a partir de {GANTT_DETAIL_THRESHOLD}.")
+            mode = {"Automática": 'auto', "Detalle": 'detail', "Agrupada": 'grouped'}[view]
+            if mode == 'auto':
+                mode = 'grouped' if total > GANTT_DETAIL_THRESHOLD else 'detail'
+        with col2:
+            if mode == 'detail':
+                pages = -(-total // GANTT_PAGE_SIZE)
+                page = st.number_input(f"Página (de {pages})", min_value=1, max_value=pages, value=1,
+                                       key=f"gantt_page_{key}") - 1
+            else:
+                lane = GANTT_LANES[st.selectbox("Agrupar por", list(GANTT_LANES), key=f"gantt_lane_{key}")]
+    return create_gantt_chart(project_id, mode, page, lane=lane)
+
+# Periodos del dashboard de portfolio: etiqueta -> días (None para toda la historia)
+PORTFOLIO_PERIODS = {
+    "Últimos 30 días": 30,
+    "Últimos 90 días": 90,
+    "Último año": 365,
+    "Todo": None,
+}
+
+
+def show_portfolio_dashboard(projects):
+    """KPIs de todos los proyectos y su evolución a partir de las instantáneas diarias"""
+    import pandas as pd
+    import plotly.express as px
+    totals = portfolio_totals()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Proyectos con tareas", f"{totals['projects']} / {len(projects)}")
+    with col2:
+        st.metric("Total de Tareas", totals['total_tasks'])
+    with col3:
+        st.metric("Progreso", f"{totals['completion_ratio']*100:.1f}%")
+    with col4:
+        st.metric("Precisión Estimación", format_accuracy(totals['accuracy_ratio']), help=ACCURACY_HELP)
     
-    # Insertar configuración por defecto si no existe
-    c.execute('SELECT COUNT(*) FROM ai_config')
-    if c.fetchone()[0] == 0:
-        c.execute('INSERT INTO ai_config (ai_provider, ai_model) VALUES (?, ?)', 
-                 ('openai', 'gpt-3.5-turbo'))
+    days = PORTFOLIO_PERIODS[st.selectbox("Periodo", list(PORTFOLIO_PERIODS), index=1, key="portfolio_period")]
+    since = datetime.date.today() - timedelta(days=days) if days else None
+    series = portfolio_series(since)
+    if series.empty:
+        st.info("Aún no hay instantáneas diarias. Se toman automáticamente una vez al día.")
+        if st.button("Tomar instantánea ahora"):
+            take_snapshot()
+            st.rerun()
+    else:
+        st.caption(f"{len(series)} instantáneas; última del {series['day'].iloc[-1]:%Y-%m-%d}. "
+                   f"Las de hace más de {SNAPSHOT_DAILY_DAYS} días se guardan semanales y, "
+                   f"pasados {SNAPSHOT_WEEKLY_DAYS} días, mensuales.")
+        series = series.rename(columns={'day': 'Fecha', 'total_tasks': 'Alcance', 'completed_tasks': 'Completadas',
+                                        'remaining_tasks': 'Pendientes'})
+        col1, col2 = st.columns(2)
+        with col1:
+            fig = px.line(series, x='Fecha', y=['Alcance', 'Completadas'], title="Burn-up (tareas)")
+            st.plotly_chart(fig, use_container_width=True)
+        with col2:
+            fig = px.area(series, x='Fecha', y='Pendientes', title="Burn-down (tareas pendientes)")
+            st.plotly_chart(fig, use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            accuracy = series.assign(**{'Precisión (%)': series['accuracy_ratio'] * 100})
+            fig = px.line(accuracy, x='Fecha', y='Precisión (%)', title="Precisión de estimación",
+                          range_y=[0, 100])
+            st.plotly_chart(fig, use_container_width=True)
+        with col2:
+            velocity = weekly_velocity(series.rename(columns={'Fecha': 'day', 'Completadas': 'completed_tasks'}))
+            fig = px.bar(velocity.rename(columns={'day': 'Semana', 'velocity': 'Tareas completadas'}),
+                         x='Semana', y='Tareas completadas', title="Velocidad semanal")
+            st.plotly_chart(fig, use_container_width=True)
     
-    conn.commit()
-    conn.close()
-
-# Funciones de base de datos
-def get_db_connection():
-    return sqlite3.connect('devplanner.db')
-
-# Funciones para proyectos
-def create_project(name, description, status='planning'):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('INSERT INTO projects (name, description, status) VALUES (?, ?, ?)', 
-             (name, description, status))
-    project_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    return project_id
-
-def get_projects():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM projects ORDER BY created_at DESC')
-    projects = c.fetchall()
-    conn.close()
-    return projects
-
-def get_project(project_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM projects WHERE id = ?', (project_id,))
-    project = c.fetchone()
-    conn.close()
-    return project
-
-# Funciones para tareas
-def add_task(project_id, description, estimated_hours, start_date, end_date, dependencies=None):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO tasks (project_id, description, estimated_hours, start_date, end_date, dependencies)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (project_id, description, estimated_hours, start_date, end_date, dependencies))
-    conn.commit()
-    conn.close()
-
-def get_tasks(project_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM tasks WHERE project_id = ? ORDER BY start_date', (project_id,))
-    tasks = c.fetchall()
-    conn.close()
-    return tasks
-
-# Funciones para IA
-def get_ai_config():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM ai_config ORDER BY created_at DESC LIMIT 1')
-    config = c.fetchone()
-    conn.close()
-    return config
-
-def save_ai_config(ai_provider, ai_model, api_key=None):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO ai_config (ai_provider, ai_model, api_key)
-        VALUES (?, ?, ?)
-    ''', (ai_provider, ai_model, api_key))
-    conn.commit()
-    conn.close()
-
-def test_ollama_connection():
-    """Prueba la conexión con Ollama"""
-    try:
-        response = requests.get('http://localhost:11434/api/tags', timeout=10)
-        return response.status_code == 200
-    except:
-        return False
-
-def test_openai_connection(api_key):
-    """Prueba la conexión con OpenAI"""
-    try:
-        client = OpenAI(api_key=api_key)
-        response = client.models.list()
-        return True
-    except:
-        return False
-
-def generate_tasks_with_ai(project_description, ai_provider, ai_model, api_key=None):
-    """
-    Genera tareas para un proyecto usando IA (OpenAI u Ollama)
+    # Tabla por proyecto, de project_stats (una fila por proyecto)
+    portfolio = portfolio_kpis()
+    rows = []
+    for project in projects:
+        kpis = portfolio.get(project[0])
+        if kpis and kpis['total_tasks']:
+            rows.append({
+                'Proyecto': project[1],
+                'Estado': project[4],
+                'Tareas': kpis['total_tasks'],
+                'Progreso (%)': round(kpis['completion_ratio'] * 100, 1),
+                'Precisión': format_accuracy(kpis['accuracy_ratio']),
+                'Horas estimadas': kpis['total_estimated_hours'],
+                'Horas reales': kpis['total_actual_hours'],
+                'Inicio': kpis['start_date'],
+                'Fin': kpis['end_date'],
+            })
+    if rows:
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+
+def task_edit_buffer(project_id):
+    """Cambios de tareas pendientes de guardar: {task_id: cambios para save_task_edits()}"""
+    return st.session_state.setdefault(f"task_edits_{project_id}", {})
+
+
+@st.fragment
+def show_task_list(project_id):
     """
-    prompt = f"""
-    Como experto en planificación de proyectos de desarrollo de software, desglosa el siguiente proyecto en tareas técnicas detalladas.
-    Para cada tarea, proporciona una estimación de tiempo en horas.
-    
-    Proyecto: {project_description}
-    
-    Devuelve la respuesta en formato JSON con la siguiente estructura:
-    {{
-        "tasks": [
-            {{
-                "description": "Descripción de la tarea",
-                "estimated_hours": 8.0,
-                "dependencies": []  // opcional: índices de tareas de las que depende (0-indexed)
-            }}
-        ]
-    }}
-    
-    Sé preciso y realista con las estimaciones. Considera dependencias entre tareas cuando sea necesario.
+    Página de tareas del proyecto en un st.data_editor. Al ser un fragmento,
+    editar una celda o cambiar de página solo vuelve a ejecutar esta lista.
+    Los cambios se acumulan en task_edit_buffer(), también entre páginas y
+    filtros, y se guardan todos juntos en una transacción con "Guardar cambios".
     """
+    buffer = task_edit_buffer(project_id)
+    conflicts = st.session_state.pop(f"task_conflicts_{project_id}", None)
+    if conflicts:
+        st.warning(f"{conflicts} tareas habían cambiado en otra sesión y no se guardaron; se muestran sus valores actuales.")
     
-    if ai_provider == 'ollama':
-        # Usar Ollama local
-        try:
-            # Verificar que Ollama esté disponible
-            if not test_ollama_connection():
-                st.error("Ollama no está disponible. Asegúrate de que esté instalado y ejecutándose.")
-                return []
-                
-            response = requests.post(
-                'http://localhost:11434/api/generate',
-                json={
-                    'model': ai_model,
-                    'prompt': prompt,
-                    'stream': False,
-                    'options': {
-                        'temperature': 0.7
-                    }
-                },
-                timeout=30
-            )
-            if response.status_code == 200:
-                result = response.json()
-                # Parsear la respuesta para extraer el JSON
-                response_text = result['response']
-                # Intentar encontrar JSON en la respuesta
-                try:
-                    start_idx = response_text.find('{')
-                    end_idx = response_text.rfind('}') + 1
-                    json_str = response_text[start_idx:end_idx]
-                    tasks_data = json.loads(json_str)
-                    return tasks_data.get('tasks', [])
-                except json.JSONDecodeError:
-                    st.error("Error al analizar la respuesta de la IA. La respuesta no tenía formato JSON válido.")
-                    st.text(f"Respuesta recibida: {response_text}")
-                    return []
-            else:
-                st.error(f"Error al conectar con Ollama: {response.status_code}")
-                return []
-        except requests.exceptions.RequestException as e:
-            st.error(f"Error de conexión con Ollama: {str(e)}")
-            return []
-    
-    elif ai_provider == 'openai':
-        # Usar OpenAI (requiere API key)
-        try:
-            if not api_key:
-                st.error("Se requiere una API key de OpenAI")
-                return []
-                
-            client = OpenAI(api_key=api_key)
-            
-            response = client.chat.completions.create(
-                model=ai_model,
-                messages=[
-                    {"role": "system", "content": "Eres un asistente experto en planificación de proyectos de desarrollo de software."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7
-            )
-            
-            response_text = response.choices[0].message.content
-            # Intentar encontrar JSON en la respuesta
-            try:
-                start_idx = response_text.find('{')
-                end_idx = response_text.rfind('}') + 1
-                json_str = response_text[start_idx:end_idx]
-                tasks_data = json.loads(json_str)
-                return tasks_data.get('tasks', [])
-            except json.JSONDecodeError:
-                st.error("Error al analizar la respuesta de la IA. La respuesta no tenía formato JSON válido.")
-                st.text(f"Respuesta recibida: {response_text}")
-                return []
-                
-        except Exception as e:
-            st.error(f"Error al conectar con OpenAI: {str(e)}")
-            return []
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        task_search = st.text_input("Buscar tarea", key=f"task_search_{project_id}")
+    with col2:
+        task_filter = st.selectbox("Estado", [None] + TASK_STATUSES, key=f"task_status_filter_{project_id}",
+                                   format_func=lambda status: status or "Todos")
+    pager = f"tasks_{project_id}"
+    cursor = keyset_cursor(pager, (task_search, task_filter))
+    tasks, next_cursor = get_tasks_page(project_id, cursor, TASKS_PAGE_SIZE, task_search, task_filter)
+    if tasks:
+        show_task_editor(project_id, tasks, buffer)
+    else:
+        st.info("Ninguna tarea coincide con la búsqueda.")
+    keyset_controls(pager, next_cursor)
     
-    return []
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        st.caption(f"{len(buffer)} tareas con cambios sin guardar" if buffer else "Sin cambios pendientes")
+    with col2:
+        if st.button("Guardar cambios", key=f"save_tasks_{project_id}", type="primary", disabled=not buffer):
+            flush_task_edits(project_id, buffer)
+    with col3:
+        st.button("Descartar cambios", key=f"discard_tasks_{project_id}", disabled=not buffer,
+                  on_click=discard_task_edits, args=(project_id,))
 
-# Funciones para visualización
-def create_gantt_chart(tasks):
-    if not tasks:
-        return None
-    
-    task_data = []
-    for i, task in enumerate(tasks):
-        # task structure: (id, project_id, description, estimated_hours, actual_hours, status, start_date, end_date, dependencies)
-        start_date = datetime.datetime.strptime(task[6], '%Y-%m-%d').date() if isinstance(task[6], str) else task[6]
-        end_date = datetime.datetime.strptime(task[7], '%Y-%m-%d').date() if isinstance(task[7], str) else task[7]
-        
-        task_data.append({
-            'Task': task[2],
-            'Start': start_date,
-            'Finish': end_date,
-            'Hours': task[3],
-            'Status': task[5]
-        })
-    
-    df = pd.DataFrame(task_data)
-    
-    color_map = {
-        'pending': '#FFC107',
-        'in_progress': '#2196F3',
-        'completed': '#4CAF50'
-    }
+
+def discard_task_edits(project_id):
+    task_edit_buffer(project_id).clear()
+    reset_task_editor(project_id)
+
+
+def reset_task_editor(project_id):
+    # Una clave nueva del editor descarta las ediciones que guarda el widget
+    generation = f"task_editor_generation_{project_id}"
+    st.session_state[generation] = st.session_state.get(generation, 0) + 1
+
+
+def show_task_editor(project_id, tasks, buffer):
+    """Editor de una página de tareas; vuelca al buffer las diferencias con la base de datos"""
+    import pandas as pd
+    task_ids = [task[0] for task in tasks]
+    predecessors = get_predecessor_names(task_ids)
+    blocked_counts = get_blocked_task_counts(project_id, task_ids)
+    people = {person[0]: person[1] for person in get_people()}
+    # Etiquetas únicas por persona para el selector del editor
+    labels = {pid: name if list(people.values()).count(name) == 1 else f"{name} (#{pid})"
+              for pid, name in people.items()}
+    person_by_label = {label: pid for pid, label in labels.items()}
     
-    fig = px.timeline(
-        df, 
-        x_start="Start", 
-        x_end="Finish", 
-        y="Task",
-        color="Status",
-        color_discrete_map=color_map,
-        hover_data=["Hours"],
-        title="Diagrama de Gantt del Proyecto"
-    )
+    saved = pd.DataFrame({
+        'Tarea': [task[1] for task in tasks],
+        'Estado': [task[4] for task in tasks],
+        'Estimado (h)': [task[2] for task in tasks],
+        'Real (h)': [float(task[3] or 0) for task in tasks],
+        'Inicio': [task[5] for task in tasks],
+        'Fin': [task[6] for task in tasks],
+        'Responsable': [labels.get(task[7]) for task in tasks],
+        'Depende de': [", ".join(predecessors.get(task[0], [])) for task in tasks],
+        'Bloqueada por': [blocked_counts.get(task[0], 0) if task[4] != 'completed' else 0 for task in tasks],
+        'Eliminar': False,
+    }, index=task_ids)
+    # Lo que se muestra es la base de datos más los cambios pendientes
+    rows = saved.copy()
+    for task_id, changes in buffer.items():
+        if task_id in rows.index:
+            for field, column in TASK_EDIT_COLUMNS.items():
+                if field in changes:
+                    rows.at[task_id, column] = labels.get(changes[field]) if field == 'assignee_id' else changes[field]
+            rows.at[task_id, 'Eliminar'] = changes.get('delete', False)
     
-    fig.update_yaxes(autorange="reversed")
-    fig.update_layout(
-        height=400,
-        showlegend=True,
-        xaxis_title="Fecha",
-        yaxis_title="Tareas"
+    generation = st.session_state.get(f"task_editor_generation_{project_id}", 0)
+    edited = st.data_editor(
+        rows,
+        key=f"tasks_editor_{project_id}_{generation}_{hash(tuple(task_ids))}",
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            'Estado': st.column_config.SelectboxColumn(options=TASK_STATUSES, required=True),
+            'Real (h)': st.column_config.NumberColumn(min_value=0.0, step=0.5, required=True),
+            'Responsable': st.column_config.SelectboxColumn(options=list(person_by_label)),
+            'Bloqueada por': st.column_config.NumberColumn(help="Tareas sin completar de las que depende"),
+            'Eliminar': st.column_config.CheckboxColumn(),
+        },
+        disabled=['Tarea', 'Estimado (h)', 'Inicio', 'Fin', 'Depende de', 'Bloqueada por'],
     )
     
-    return fig
+    versions = {task[0]: task[8] for task in tasks}
+    for task_id, row in edited.iterrows():
+        task_id, old = int(task_id), saved.loc[task_id]
+        changes = {}
+        if row['Eliminar']:
+            changes['delete'] = True
+        if row['Estado'] != old['Estado']:
+            changes['status'] = row['Estado']
+        if row['Real (h)'] != old['Real (h)']:
+            changes['actual_hours'] = float(row['Real (h)'])
+        assignee = person_by_label.get(row['Responsable'])
+        if assignee != person_by_label.get(old['Responsable']):
+            changes['assignee_id'] = assignee
+        if changes:
+            # Se conserva la versión leída con el primer cambio: si la tarea
+            # cambia después en otra sesión, el guardado lo detecta
+            changes['version'] = buffer.get(task_id, {}).get('version', versions[task_id])
+            buffer[task_id] = changes
+        else:
+            buffer.pop(task_id, None)
+
+
+def flush_task_edits(project_id, buffer):
+    """Guarda el buffer en una transacción y vuelve a ejecutar la página completa"""
+    saved, conflicts, changed = save_task_edits(buffer)
+    # Re-nivelar solo lo que depende de las tareas reasignadas
+    leveling = st.session_state.get('leveling')
+    if leveling:
+        for task_id in saved:
+            if 'assignee_id' in buffer[task_id] and task_id in leveling.index:
+                save_dates(leveling, st.session_state.leveling_dates,
+                           leveling.update_task(task_id, assignee_id=buffer[task_id]['assignee_id']))
+    if saved:
+        st.session_state[f"schedule_summary_{project_id}"] = (
+            reschedule_summary(saved, changed) or f"Se guardaron cambios en {len(saved)} tareas.")
+    if conflicts:
+        st.session_state[f"task_conflicts_{project_id}"] = len(conflicts)
+    buffer.clear()
+    reset_task_editor(project_id)
+    st.rerun()
+
 
-def calculate_kpis(tasks):
-    if not tasks:
-        return {}
+def show_project_detail(project):
+    """Tareas, generación con IA, Gantt y métricas del proyecto abierto"""
+    total_tasks = project_kpis(project[0])['total_tasks']
     
-    total_estimated = sum(task[3] for task in tasks if task[3])
-    total_actual = sum(task[4] for task in tasks if task[4])
-    completed_tasks = sum(1 for task in tasks if task[5] == 'completed')
-    total_tasks = len(tasks)
+    # Resumen de la última planificación (sobrevive al st.rerun)
+    schedule_summary = st.session_state.pop(f"schedule_summary_{project[0]}", None)
+    if schedule_summary:
+        st.success(schedule_summary)
     
-    completion_ratio = completed_tasks / total_tasks if total_tasks > 0 else 0
-    accuracy_ratio = 1 - abs(total_estimated - total_actual) / total_estimated if total_estimated > 0 else 0
+    # Generar tareas con IA
+    with st.expander("🤖 Generar Tareas con IA", expanded=False):
+        ai_config = get_ai_config()
+        if ai_config:
+            st.info("Usando configuración: " + ai_config[1] + " - " + ai_config[2])
+            
+            refresh = st.checkbox("Ignorar caché y regenerar", key=f"ai_refresh_{project[0]}",
+                                  help="Vuelve a consultar a la IA aunque exista una respuesta guardada para este proyecto y modelo.")
+            
+            # Calendario laboral para calcular las fechas
+            col1, col2 = st.columns(2)
+            with col1:
+                hours_per_day = st.number_input("Horas de trabajo por día", min_value=1.0, max_value=24.0,
+                                                value=8.0, step=0.5, key=f"cal_hours_{project[0]}")
+            with col2:
+                work_weekends = st.checkbox("Trabajar fines de semana", key=f"cal_weekends_{project[0]}")
+            holidays_text = st.text_input("Festivos (YYYY-MM-DD separados por comas)", key=f"cal_holidays_{project[0]}")
+            plan_mode = st.selectbox("Modo de planificación", list(AI_PLAN_MODES), format_func=AI_PLAN_MODES.get,
+                                     key=f"ai_mode_{project[0]}",
+                                     help="Por épicas, la IA divide primero el proyecto en épicas y las desglosa "
+                                          "todas a la vez: más rápido y más detallado en proyectos grandes.")
+            
+            latest_job = get_latest_ai_job(project[0])
+            job_active = latest_job is not None and latest_job['status'] in ('queued', 'running')
+            if st.button("Generar plan de tareas con IA", key=f"ai_btn_{project[0]}", disabled=job_active):
+                try:
+                    workdays = list(range(7) if work_weekends else range(5))
+                    holidays = parse_holidays(holidays_text)
+                    WorkCalendar(hours_per_day, workdays, holidays)
+                except ValueError as e:
+                    st.error(f"Calendario no válido: {e}")
+                    st.stop()
+                
+                # La generación la hace un proceso trabajador; aquí solo se encola
+                enqueue_ai_jobs([project[0]], ai_config[1], ai_config[2], {
+                    'use_cache': not refresh,
+                    'hours_per_day': hours_per_day,
+                    'workdays': workdays,
+                    'holidays': sorted(day.isoformat() for day in holidays),
+                    'hierarchical': plan_mode,
+                })
+                st.rerun()
+            
+            show_ai_job_status(project[0])
+        
+    # Añadir tareas manualmente
+    with st.expander("✏️ Añadir Tarea Manualmente", expanded=False):
+        col1, col2 = st.columns(2)
+        with col1:
+            task_desc = st.text_input("Descripción de la tarea", key=f"desc_{project[0]}")
+            estimated_hours = st.number_input("Horas estimadas", min_value=0.5, step=0.5, value=8.0, key=f"hours_{project[0]}")
+        with col2:
+            start_date = st.date_input("Fecha de inicio", value=datetime.date.today(), key=f"start_{project[0]}")
+            end_date = st.date_input("Fecha de fin", value=datetime.date.today() + timedelta(days=7), key=f"end_{project[0]}")
+        task_names = get_task_names(project[0])
+        task_deps = st.multiselect("Depende de", list(task_names), format_func=task_names.get,
+                                   key=f"deps_{project[0]}")
+        
+        if st.button("Añadir Tarea", key=f"add_task_{project[0]}"):
+            if task_desc:
+                add_task(project[0], task_desc, estimated_hours, start_date, end_date, task_deps)
+                st.success("Tarea añadida exitosamente!")
+                st.rerun()
+            else:
+                st.error("Por favor, ingresa una descripción para la tarea.")
     
-    return {
-        'total_tasks': total_tasks,
-        'completed_tasks': completed_tasks,
-        'completion_ratio': completion_ratio,
-        'total_estimated_hours': total_estimated,
-        'total_actual_hours': total_actual,
-        'accuracy_ratio': accuracy_ratio
-    }
+    # Mostrar tareas existentes: una página filtrada en SQL, editada en bloque
+    if total_tasks:
+        st.markdown("### Tareas del Proyecto")
+        show_task_list(project[0])
+        
+        # Mostrar diagrama de Gantt
+        st.markdown("### Diagrama de Gantt")
+        gantt_chart = show_gantt_chart(project[0], f"project_{project[0]}")
+        if gantt_chart:
+            st.plotly_chart(gantt_chart, use_container_width=True)
+        else:
+            st.info("No hay suficientes tareas para generar un diagrama de Gantt.")
+        
+        # Mostrar KPIs
+        st.markdown("### Métricas del Proyecto")
+        kpis = project_kpis(project[0])
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Total Tareas", kpis['total_tasks'])
+            st.metric("Tareas Completadas", kpis['completed_tasks'])
+        with col2:
+            st.metric("Horas Estimadas", f"{kpis['total_estimated_hours']:.1f}")
+            st.metric("Horas Reales", f"{kpis['total_actual_hours']:.1f}")
+        with col3:
+            st.metric("Progreso", f"{kpis['completion_ratio']*100:.1f}%")
+            st.metric("Precisión Estimación", format_accuracy(kpis['accuracy_ratio']),
+                      help=ACCURACY_HELP)
+    else:
+        st.info("Este proyecto no tiene tareas aún. ¡Añade algunas tareas manualmente o genera un plan con IA!")
+
+def show_performance_panel():
+    """Estadísticas de las trazas: llamadas, latencias y filas por span, y exportación"""
+    enabled = st.checkbox("Registrar trazas", value=tracing.is_enabled(),
+                          help="Mide cada función de storage, el Gantt, los KPIs y cada rerun. "
+                               "Desactivado solo cuesta una comprobación por llamada.")
+    if enabled != tracing.is_enabled():
+        tracing.enable(enabled)
+        st.rerun()
+    st.caption("Las trazas son del proceso: incluyen las sesiones de todos los usuarios. "
+               "También se activan al arrancar con DEVPLANNER_TRACE=1.")
+
+    stats = tracing.get_span_stats()
+    if not stats:
+        st.info("Aún no hay trazas. Activa el registro y navega por la aplicación.")
+        return
+    import pandas as pd
+    import plotly.express as px
+
+    breakdown = tracing.last_breakdown()
+    if breakdown:
+        st.markdown("### Último rerun")
+        st.caption("Tiempo propio de cada capa; «app» es Streamlit y el renderizado de widgets.")
+        cols = st.columns(min(len(breakdown), 5))
+        for col, (category, ms) in zip(cols, breakdown.items()):
+            col.metric(category, f"{ms:.1f} ms")
+
+    st.markdown("### Spans")
+    st.dataframe(pd.DataFrame([{
+        'Span': s['name'],
+        'Llamadas': s['count'],
+        'Total (ms)': round(s['total_ms'], 1),
+        'Media (ms)': round(s['mean_ms'], 2),
+        'p50 (≤ ms)': s['p50_ms'],
+        'p95 (≤ ms)': s['p95_ms'],
+        'Máx (ms)': round(s['max_ms'], 1),
+        'Filas': s['rows'],
+        'Errores': s['errors'],
+    } for s in stats]), use_container_width=True, hide_index=True)
+
+    by_name = {s['name']: s for s in stats}
+    selected = st.selectbox("Histograma de latencias", list(by_name), key="trace_span")
+    histogram = pd.DataFrame([
+        {'Latencia': f"≤ {bound} ms" if bound is not None else "más", 'Llamadas': calls}
+        for bound, calls in by_name[selected]['histogram']
+    ])
+    st.plotly_chart(px.bar(histogram, x='Latencia', y='Llamadas'), use_container_width=True)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("Descargar JSON lines", tracing.export_jsonl(),
+                           file_name="devplanner-trace.jsonl", mime="application/x-ndjson")
+    with col2:
+        st.download_button("Descargar traza de Chrome", tracing.export_chrome_trace(),
+                           file_name="devplanner-trace.json", mime="application/json",
+                           help="Se abre en chrome://tracing o en ui.perfetto.dev")
+    with col3:
+        if st.button("Reiniciar trazas"):
+            tracing.reset()
+            st.rerun()
+
+
+@st.cache_resource
+def bootstrap_db():
+    """Aplica las migraciones una sola vez por proceso, no en cada rerun"""
+    return init_db()
+
+
+@st.cache_resource
+def snapshot_job():
+    """Hilo de instantáneas diarias, uno por proceso"""
+    return start_snapshot_job()
+
+
+@st.cache_resource
+def job_workers():
+    """Pool de trabajadores de la cola de IA, uno por proceso (None con DEVPLANNER_WORKERS=0)"""
+    return start_worker_pool(get_pool().db_path, DEFAULT_WORKERS)
 
 # Interfaz de usuario principal
 def main():
     # Inicializar base de datos
-    init_db()
+    bootstrap_db()
+    snapshot_job()
+    job_workers()
     
     st.markdown('<h1 class="main-header">🚀 DevPlanner</h1>', unsafe_allow_html=True)
     st.markdown('<p style="text-align: center; font-size: 1.2rem;">Tu asistente de planificación de proyectos con IA integrada</p>', unsafe_allow_html=True)
     
     # Sidebar
     with st.sidebar:
-        st.image("https://img.icons8.com/fluency/96/rocket.png", width=80)
+        st.image(os.path.join(ASSETS_DIR, "rocket.png"), width=80)
         st.title("Menú de Navegación")
         
         menu_option = st.radio(
             "Selecciona una opción:",
-            ["📋 Proyectos", "⚙️ Configuración de IA", "📊 KPIs y Métricas"]
+            ["📋 Proyectos", "👥 Equipo y Capacidad", "⚙️ Configuración de IA", "📊 KPIs y Métricas",
+             "⏱️ Rendimiento"]
         )
         
         st.markdown("---")
@@ -430,12 +690,37 @@ def main():
                 else:
                     st.error("Por favor, ingresa un nombre para el proyecto.")
         
-        # Lista de proyectos existentes
+        # Generación en lote para los proyectos sin tareas
+        with st.expander("⚡ Generar Planes en Lote con IA", expanded=False):
+            pending_projects = get_projects_without_tasks()
+            st.markdown(f"Proyectos sin tareas: **{len(pending_projects)}**")
+            job_counts = get_ai_job_counts()
+            if job_counts['queued'] or job_counts['running']:
+                st.caption(f"Cola de generación: {job_counts['queued']} en cola, {job_counts['running']} en curso.")
+            
+            if st.button("Planificar proyectos sin tareas", disabled=not pending_projects, use_container_width=True):
+                ai_config = get_ai_config()
+                queued = enqueue_ai_jobs([p[0] for p in pending_projects], ai_config[1], ai_config[2],
+                                         {'use_cache': True})
+                st.success(f"{queued} proyectos añadidos a la cola de generación. "
+                           "Los planes aparecerán en cada proyecto según terminen.")
+        
+        # Lista de proyectos existentes, por páginas y filtrada en SQL
         st.markdown("### Mis Proyectos")
-        projects = get_projects()
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            project_search = st.text_input("Buscar por nombre", key="project_search")
+        with col2:
+            project_filter = st.selectbox("Filtrar por estado", [None, "planning", "active", "completed", "on_hold"],
+                                          format_func=lambda status: status or "Todos", key="project_status_filter")
+        cursor = keyset_cursor("projects", (project_search, project_filter))
+        projects, next_cursor = get_projects_page(cursor, PROJECTS_PAGE_SIZE, project_search, project_filter)
         
         if not projects:
-            st.info("Aún no hay proyectos creados. ¡Comienza creando uno nuevo!")
+            if project_search or project_filter:
+                st.info("Ningún proyecto coincide con la búsqueda.")
+            else:
+                st.info("Aún no hay proyectos creados. ¡Comienza creando uno nuevo!")
         else:
             for project in projects:
                 with st.container():
@@ -446,137 +731,111 @@ def main():
                         st.markdown(f"**Descripción:** {project[2]}")
                         st.markdown(f"**Estado:** {project[4]}")
                         st.markdown(f"**Creado:** {project[3]}")
+                        # Resumen de project_stats: una fila por proyecto, sin tocar las tareas
+                        project_summary = project_kpis(project[0])
+                        if project_summary['total_tasks']:
+                            st.caption(f"{project_summary['total_tasks']} tareas · "
+                                       f"{project_summary['completion_ratio']*100:.0f}% completado · "
+                                       f"{project_summary['total_estimated_hours']:.1f} h estimadas · "
+                                       f"{project_summary['start_date'] or '?'} → {project_summary['end_date'] or '?'}")
                         st.markdown('</div>', unsafe_allow_html=True)
                     with col2:
                         if st.button("Abrir", key=f"btn_{project[0]}"):
                             st.session_state.current_project = project[0]
                     
                     # Mostrar tareas si el proyecto está seleccionado
-                    if 'current_project' in st.session_state and st.session_state.current_project == project[0]:
-                        tasks = get_tasks(project[0])
-                        
-                        # Generar tareas con IA
-                        with st.expander("🤖 Generar Tareas con IA", expanded=False):
-                            ai_config = get_ai_config()
-                            if ai_config:
-                                st.info("Usando configuración: " + ai_config[1] + " - " + ai_config[2])
-                                
-                                if st.button("Generar plan de tareas con IA", key=f"ai_btn_{project[0]}"):
-                                    with st.spinner("Generando tareas con IA..."):
-                                        ai_tasks = generate_tasks_with_ai(
-                                            project[2],  # Usar la descripción del proyecto actual
-                                            ai_config[1], 
-                                            ai_config[2],
-                                            ai_config[3] if ai_config[3] else None
-                                        )
-                                        
-                                        if ai_tasks:
-                                            st.success(f"IA ha generado {len(ai_tasks)} tareas!")
-                                            
-                                            # Calcular fechas basadas en duraciones
-                                            start_date = datetime.date.today()
-                                            for i, task in enumerate(ai_tasks):
-                                                duration = max(1, round(task['estimated_hours'] / 8))  # Mínimo 1 día
-                                                end_date = start_date + timedelta(days=duration)
-                                                
-                                                # Guardar tarea
-                                                add_task(
-                                                    project[0],
-                                                    task['description'],
-                                                    task['estimated_hours'],
-                                                    start_date,
-                                                    end_date,
-                                                    str(task.get('dependencies', []))
-                                                )
-                                                
-                                                # La siguiente tarea comienza después de esta (a menos que tenga dependencias)
-                                                if not task.get('dependencies'):
-                                                    start_date = end_date
-                                            
-                                            st.rerun()
-                                        else:
-                                            st.error("No se pudieron generar tareas. Revisa la configuración de IA.")
-                            
-                        # Añadir tareas manualmente
-                        with st.expander("✏️ Añadir Tarea Manualmente", expanded=False):
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                task_desc = st.text_input("Descripción de la tarea", key=f"desc_{project[0]}")
-                                estimated_hours = st.number_input("Horas estimadas", min_value=0.5, step=0.5, value=8.0, key=f"hours_{project[0]}")
-                            with col2:
-                                start_date = st.date_input("Fecha de inicio", value=datetime.date.today(), key=f"start_{project[0]}")
-                                end_date = st.date_input("Fecha de fin", value=datetime.date.today() + timedelta(days=7), key=f"end_{project[0]}")
-                            
-                            if st.button("Añadir Tarea", key=f"add_task_{project[0]}"):
-                                if task_desc:
-                                    add_task(project[0], task_desc, estimated_hours, start_date, end_date)
-                                    st.success("Tarea añadida exitosamente!")
-                                    st.rerun()
-                                else:
-                                    st.error("Por favor, ingresa una descripción para la tarea.")
-                        
-                        # Mostrar tareas existentes
-                        if tasks:
-                            st.markdown("### Tareas del Proyecto")
-                            for task in tasks:
-                                col1, col2, col3, col4 = st.columns([3, 1, 1, 0.5])
-                                with col1:
-                                    st.markdown(f"**{task[2]}**")
-                                    st.markdown(f"Estimado: {task[3]} horas | Real: {task[4]} horas")
-                                    st.markdown(f"Fechas: {task[6]} a {task[7]}")
-                                with col2:
-                                    status = st.selectbox("Estado", ["pending", "in_progress", "completed"], 
-                                                        key=f"status_{task[0]}", index=["pending", "in_progress", "completed"].index(task[5]))
-                                    if status != task[5]:
-                                        # Actualizar estado en la base de datos
-                                        conn = get_db_connection()
-                                        c = conn.cursor()
-                                        c.execute('UPDATE tasks SET status = ? WHERE id = ?', (status, task[0]))
-                                        conn.commit()
-                                        conn.close()
-                                        st.rerun()
-                                with col3:
-                                    actual_hours = st.number_input("Horas reales", min_value=0.0, value=float(task[4]), step=0.5, key=f"actual_{task[0]}")
-                                    if actual_hours != task[4]:
-                                        conn = get_db_connection()
-                                        c = conn.cursor()
-                                        c.execute('UPDATE tasks SET actual_hours = ? WHERE id = ?', (actual_hours, task[0]))
-                                        conn.commit()
-                                        conn.close()
-                                        st.rerun()
-                                with col4:
-                                    if st.button("🗑️", key=f"delete_{task[0]}"):
-                                        conn = get_db_connection()
-                                        c = conn.cursor()
-                                        c.execute('DELETE FROM tasks WHERE id = ?', (task[0],))
-                                        conn.commit()
-                                        conn.close()
-                                        st.success("Tarea eliminada!")
-                                        st.rerun()
-                            
-                            # Mostrar diagrama de Gantt
-                            st.markdown("### Diagrama de Gantt")
-                            gantt_chart = create_gantt_chart(tasks)
-                            if gantt_chart:
-                                st.plotly_chart(gantt_chart, use_container_width=True)
-                            else:
-                                st.info("No hay suficientes tareas para generar un diagrama de Gantt.")
-                            
-                            # Mostrar KPIs
-                            st.markdown("### Métricas del Proyecto")
-                            kpis = calculate_kpis(tasks)
-                            col1, col2, col3 = st.columns(3)
-                            with col1:
-                                st.metric("Total Tareas", kpis['total_tasks'])
-                                st.metric("Tareas Completadas", kpis['completed_tasks'])
-                            with col2:
-                                st.metric("Horas Estimadas", f"{kpis['total_estimated_hours']:.1f}")
-                                st.metric("Horas Reales", f"{kpis['total_actual_hours']:.1f}")
-                            with col3:
-                                st.metric("Progreso", f"{kpis['completion_ratio']*100:.1f}%")
-                                st.metric("Precisión Estimación", f"{kpis['accuracy_ratio']*100:.1f}%")
-                        else:
-                            st.info("Este proyecto no tiene tareas aún. ¡Añade algunas tareas manualmente o genera un plan con IA!")
+                    if st.session_state.get('current_project') == project[0]:
+                        show_project_detail(project)
+            keyset_controls("projects", next_cursor)
+        
+        # El proyecto abierto puede no estar en la página actual
+        current_project = st.session_state.get('current_project')
+        if current_project and current_project not in {project[0] for project in projects}:
+            project = get_project(current_project)
+            if project:
+                st.markdown(f"### Proyecto abierto: {project[1]}")
+                show_project_detail(project)
+    
+    # Página de Equipo y Capacidad
+    elif menu_option == "👥 Equipo y Capacidad":
+        st.markdown('<h2 class="sub-header">Equipo y Capacidad</h2>', unsafe_allow_html=True)
+        
+        with st.expander("➕ Añadir Persona", expanded=False):
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                person_name = st.text_input("Nombre")
+            with col2:
+                person_hours = st.number_input("Horas por día", min_value=0.5, max_value=24.0, value=8.0, step=0.5)
+            person_workdays = st.multiselect("Días laborables", list(range(7)), default=list(range(5)),
+                                             format_func=WEEKDAY_NAMES.__getitem__)
+            if st.button("Añadir Persona", use_container_width=True):
+                if person_name and person_workdays:
+                    create_person(person_name, person_hours, person_workdays)
+                    st.rerun()
+                else:
+                    st.error("Indica un nombre y al menos un día laborable.")
+        
+        people = get_people()
+        time_off = get_time_off()
+        if not people:
+            st.info("Aún no hay personas en el equipo. Añade personas para asignarles tareas y nivelar la carga.")
+        for person in people:
+            col1, col2, col3 = st.columns([3, 2, 0.5])
+            with col1:
+                st.markdown(f"**{person[1]}** · {person[2]:g} h/día · "
+                            + ", ".join(WEEKDAY_NAMES[d][:3] for d in person[3]))
+                days_off = sorted(time_off.get(person[0], ()))
+                if days_off:
+                    st.caption("Días libres: " + ", ".join(str(d) for d in days_off))
+            with col2:
+                day_off = st.date_input("Día libre", value=None, key=f"time_off_{person[0]}")
+                if day_off and st.button("Añadir día libre", key=f"add_time_off_{person[0]}"):
+                    add_time_off(person[0], day_off)
+                    st.rerun()
+            with col3:
+                if st.button("🗑️", key=f"delete_person_{person[0]}"):
+                    delete_person(person[0])
+                    st.rerun()
+        
+        st.markdown("---")
+        st.markdown("### ⚖️ Nivelación de Recursos")
+        st.markdown("Reprograma todas las tareas pendientes de los proyectos en planificación o activos "
+                    "según la capacidad de cada persona y las dependencias entre tareas.")
+        rule = st.selectbox("Regla de prioridad", list(PRIORITY_RULES), index=list(PRIORITY_RULES).index(DEFAULT_RULE),
+                            format_func=PRIORITY_RULE_LABELS.get)
+        if st.button("⚖️ Nivelar proyectos activos", use_container_width=True):
+            start = time.perf_counter()
+            leveling, updated = level_active_projects(rule)
+            elapsed = time.perf_counter() - start
+            # Se conserva para re-nivelar de forma incremental al reasignar una tarea
+            st.session_state.leveling = leveling
+            st.session_state.leveling_dates = {
+                task_id: (leveling.start_date_of(task_id).isoformat(), leveling.end_date_of(task_id).isoformat())
+                for task_id in leveling.ids
+            }
+            st.success(f"{len(leveling.ids)} tareas niveladas en {elapsed * 1000:.0f} ms; "
+                       f"{updated} cambiaron de fechas.")
+        
+        leveling = st.session_state.get('leveling')
+        if leveling:
+            utilization = leveling.utilization()
+            if utilization:
+                import pandas as pd
+                import plotly.express as px
+                utilization_df = pd.DataFrame([{
+                    'Persona': row['name'],
+                    'Tareas': row['tasks'],
+                    'Horas asignadas': round(row['assigned_hours'], 1),
+                    'Capacidad (h)': round(row['capacity_hours'], 1),
+                    'Ocupación (%)': round(row['utilization'] * 100, 1),
+                    'Termina': row['finish_date'],
+                } for row in utilization.values()])
+                st.dataframe(utilization_df, use_container_width=True, hide_index=True)
+                fig_utilization = px.bar(utilization_df, x='Persona', y='Ocupación (%)',
+                                         title=f"Ocupación hasta {leveling.start_date + timedelta(days=leveling.horizon)}")
+                st.plotly_chart(fig_utilization, use_container_width=True)
+            if leveling.dropped_edges:
+                st.warning(f"Se ignoraron {len(leveling.dropped_edges)} dependencias circulares.")
     
     # Página de Configuración de IA
     elif menu_option == "⚙️ Configuración de IA":
@@ -588,30 +847,26 @@ def main():
             st.markdown('<div class="config-section">', unsafe_allow_html=True)
             st.markdown("### Proveedor de IA")
             
+            provider_names = list(PROVIDERS)
             ai_provider = st.radio(
                 "Selecciona tu proveedor de IA preferido:",
-                ["openai", "ollama"],
-                index=0 if ai_config[1] == "openai" else 1,
-                help="OpenAI para máxima compatibilidad, Ollama para uso local"
+                provider_names,
+                index=provider_names.index(ai_config[1]) if ai_config[1] in provider_names else 0,
+                format_func=lambda name: PROVIDERS[name].label,
+                help="OpenAI o Gemini en la nube, Ollama para uso local, Simulado para pruebas sin red"
             )
+            provider = PROVIDERS[ai_provider]
             
-            if ai_provider == "openai":
-                st.markdown("### Configuración de OpenAI")
-                ai_model = st.selectbox(
-                    "Modelo de OpenAI:",
-                    ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo"],
-                    index=["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo"].index(ai_config[2]) if ai_config[2] in ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo"] else 0
-                )
-                api_key = st.text_input("API Key de OpenAI", type="password", value=ai_config[3] if ai_config[3] else "", 
-                                      help="Tu clave API de OpenAI. Se almacenará localmente de forma segura.")
-            
+            st.markdown(f"### Configuración de {provider.label}")
+            ai_model = st.selectbox(
+                f"Modelo de {provider.label}:",
+                provider.models,
+                index=provider.models.index(ai_config[2]) if ai_config[2] in provider.models else 0
+            )
+            if provider.requires_api_key:
+                api_key = st.text_input(f"API Key de {provider.label}", type="password", value=ai_config[3] if ai_config[3] else "", 
+                                      help=f"Tu clave API de {provider.label}. Se almacenará localmente de forma segura.")
             else:
-                st.markdown("### Configuración de Ollama (Local)")
-                ai_model = st.selectbox(
-                    "Modelo de Ollama:",
-                    ["phi3", "llama2", "mistral", "mixtral", "codellama", "gemma", "llama3"],
-                    index=["phi3", "llama2", "mistral", "mixtral", "codellama", "gemma", "llama3"].index(ai_config[2]) if ai_config[2] in ["phi3", "llama2", "mistral", "mixtral", "codellama", "gemma", "llama3"] else 0
-                )
                 api_key = None
             
             st.markdown('</div>', unsafe_allow_html=True)
@@ -625,22 +880,109 @@ def main():
         st.markdown("### 🔌 Probar Conexión")
         
         current_config = get_ai_config()
-        if current_config:
-            if current_config[1] == "openai":
-                if current_config[3]:
-                    if st.button("🧪 Probar conexión con OpenAI"):
-                        if test_openai_connection(current_config[3]):
-                            st.success("✅ Conexión exitosa con OpenAI!")
-                        else:
-                            st.error("❌ No se pudo conectar con OpenAI. Verifica tu API key.")
+        if current_config and current_config[1] in PROVIDERS:
+            current_provider = PROVIDERS[current_config[1]]
+            if current_provider.requires_api_key and not current_config[3]:
+                st.warning(f"⚠️ Primero guarda tu API key de {current_provider.label} para poder probar la conexión.")
+            elif st.button(f"🧪 Probar conexión con {current_provider.label}"):
+                if current_provider.health(current_config[3]):
+                    st.success(f"✅ Conexión exitosa con {current_provider.label}!")
+                elif current_provider.requires_api_key:
+                    st.error(f"❌ No se pudo conectar con {current_provider.label}. Verifica tu API key.")
                 else:
-                    st.warning("⚠️ Primero guarda tu API key de OpenAI para poder probar la conexión.")
-            else:  # ollama
-                if st.button("🧪 Probar conexión con Ollama"):
-                    if test_ollama_connection():
-                        st.success("✅ Conexión exitosa con Ollama!")
-                    else:
-                        st.error("❌ No se pudo conectar con Ollama. Asegúrate de que esté instalado y ejecutándose.")
+                    st.error(f"❌ No se pudo conectar con {current_provider.label}. Asegúrate de que esté instalado y ejecutándose.")
+        
+        st.markdown("---")
+        st.markdown("### 🗃️ Caché de Respuestas de IA")
+        
+        cache_stats = get_ai_cache_stats()
+        lookups = cache_stats['hits'] + cache_stats['misses']
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Aciertos", cache_stats['hits'])
+        with col2:
+            st.metric("Fallos", cache_stats['misses'])
+        with col3:
+            st.metric("Tasa de acierto", f"{cache_stats['hits'] / lookups * 100:.1f}%" if lookups else "-")
+        with col4:
+            st.metric("Entradas", cache_stats['entries'])
+        
+        if st.button("🧹 Vaciar caché"):
+            clear_ai_cache()
+            st.success("Caché de respuestas vaciada.")
+            st.rerun()
+        
+        st.markdown("---")
+        st.markdown("### 🧵 Cola de Generación")
+        workers = job_workers()
+        limits = ', '.join(f"{provider} {limit}" for provider, limit in sorted(default_limits().items()))
+        if workers is None:
+            st.caption("Este servidor no arranca trabajadores (DEVPLANNER_WORKERS=0): los planes en cola "
+                       "los genera un `python worker.py` externo.")
+        elif workers.poll() is not None:
+            st.error("El pool de trabajadores se ha detenido. Reinicia la aplicación o lanza `python worker.py`.")
+        else:
+            st.caption(f"{DEFAULT_WORKERS} procesos trabajadores. Generaciones simultáneas por proveedor: "
+                       f"{limits or 'sin límite'}.")
+        job_counts = get_ai_job_counts()
+        for col, (status, label) in zip(st.columns(4), AI_JOB_STATUS_LABELS.items()):
+            col.metric(label, job_counts[status])
+        recent_jobs = [job for job in get_recent_ai_jobs() if job['started_at']]
+        if recent_jobs:
+            waits = sorted(job['started_at'] - job['created_at'] for job in recent_jobs)
+            runs = sorted(job['finished_at'] - job['started_at'] for job in recent_jobs)
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Espera en cola (mediana)", f"{waits[len(waits) // 2]:.1f} s")
+            with col2:
+                st.metric("Generación (mediana)", f"{runs[len(runs) // 2]:.1f} s",
+                          help=f"Últimos {len(recent_jobs)} trabajos terminados")
+        # Calidad de las respuestas: cuántas se pudieron usar tal cual y cuánto se tiró
+        reports = [job['result']['generation'] for job in get_recent_ai_jobs()
+                   if job['result'] and job['result'].get('generation')
+                   and not job['result']['generation'].get('cached')]
+        # Tiempos de la IA medidos por el trabajador (sin la espera en cola ni la planificación)
+        timed = [r for r in reports if r.get('total_time') is not None]
+        if timed:
+            first_task_times = sorted(r['time_to_first_task'] for r in timed if r['time_to_first_task'] is not None)
+            total_times = sorted(r['total_time'] for r in timed)
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Primera tarea (mediana)",
+                          f"{first_task_times[len(first_task_times) // 2]:.1f} s" if first_task_times else "-",
+                          help="Desde que el trabajador empieza hasta que recibe la primera tarea válida")
+            with col2:
+                st.metric("Plan completo (mediana)", f"{total_times[len(total_times) // 2]:.1f} s",
+                          help=f"Últimas {len(timed)} generaciones sin contar los aciertos de caché")
+        if reports:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Respuestas válidas a la primera",
+                          f"{sum(r['first_response_valid'] for r in reports) / len(reports) * 100:.0f}%",
+                          help="Planes cuyo JSON y todas sus tareas cumplían el esquema sin reparar nada")
+            with col2:
+                st.metric("Tareas corregidas / descartadas",
+                          f"{sum(r['fixed'] for r in reports)} / {sum(r['dropped'] for r in reports)}",
+                          help="Tareas inválidas que se pidieron de nuevo a la IA, sin regenerar el plan")
+            with col3:
+                st.metric("Tokens desperdiciados por plan",
+                          f"{sum(r['wasted_tokens'] for r in reports) / len(reports):.0f}",
+                          help="Estimación (4 caracteres por token) de la salida que no acabó en ninguna tarea")
+        
+        st.markdown("---")
+        st.markdown("### 🗄️ Caché de Lecturas")
+        st.caption("Resultados de consultas a la base de datos, válidos hasta la siguiente escritura.")
+        read_stats = get_read_cache_stats()
+        lookups = read_stats['hits'] + read_stats['misses']
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Tasa de acierto", f"{read_stats['hits'] / lookups * 100:.1f}%" if lookups else "-")
+        with col2:
+            st.metric("Consultas", lookups)
+        with col3:
+            st.metric("Invalidaciones", read_stats['invalidations'])
+        with col4:
+            st.metric("Entradas", f"{read_stats['entries']} / {read_stats['size']}")
         
         st.markdown("---")
         st.markdown("### Información de Configuración")
@@ -655,6 +997,20 @@ def main():
             
             **Recomendación:** Los modelos más ligeros como Phi-3 o TinyLlama son suficientes para la planificación de proyectos.
             """)
+        elif ai_provider == "gemini":
+            st.info("""
+            **Configuración para Google Gemini (Nube):**
+            1. Necesitas una [clave API de Google AI Studio](https://aistudio.google.com/app/apikey)
+            2. Ingresa tu clave API en el campo correspondiente
+            3. Selecciona el modelo que deseas usar
+            4. ¡Listo! DevPlanner usará la API de Gemini
+            """)
+        elif ai_provider == "stub":
+            st.info("""
+            **Proveedor simulado (pruebas):**
+            Genera planes deterministas en local, sin red ni coste. Útil para probar la aplicación
+            y medir el rendimiento del flujo de planificación sin depender de un modelo real.
+            """)
         else:
             st.info("""
             **Configuración para OpenAI (Nube):**
@@ -687,15 +1043,20 @@ def main():
             st.info("No hay proyectos para analizar. ¡Crea tu primer proyecto!")
             return
         
+        if st.radio("Vista", ["Portfolio", "Por proyecto"], horizontal=True, key="kpi_view") == "Portfolio":
+            show_portfolio_dashboard(projects)
+            return
+        
         project_options = {f"{p[1]} (ID: {p[0]})": p[0] for p in projects}
         selected_project = st.selectbox("Selecciona un proyecto para analizar:", list(project_options.keys()))
         
         if selected_project:
             project_id = project_options[selected_project]
-            tasks = get_tasks(project_id)
+            kpis = project_kpis(project_id)
             
-            if tasks:
-                kpis = calculate_kpis(tasks)
+            if kpis['total_tasks']:
+                import pandas as pd
+                import plotly.express as px
                 
                 # Mostrar KPIs principales
                 col1, col2, col3, col4 = st.columns(4)
@@ -708,17 +1069,14 @@ def main():
                     st.metric("Horas Estimadas", f"{kpis['total_estimated_hours']:.1f}")
                 with col4:
                     st.metric("Horas Reales", f"{kpis['total_actual_hours']:.1f}", 
-                             f"{kpis['accuracy_ratio']*100:.1f}%")
+                             format_accuracy(kpis['accuracy_ratio'], None), help=ACCURACY_HELP)
                 
                 # Gráficos de análisis
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     # Gráfico de estado de tareas
-                    status_counts = {}
-                    for task in tasks:
-                        status = task[5]
-                        status_counts[status] = status_counts.get(status, 0) + 1
+                    status_counts = kpis['status_counts']
                     
                     if status_counts:
                         status_df = pd.DataFrame({
@@ -743,14 +1101,14 @@ def main():
                 
                 # Diagrama de Gantt
                 st.markdown("### Diagrama de Gantt")
-                gantt_chart = create_gantt_chart(tasks)
+                gantt_chart = show_gantt_chart(project_id, "kpis")
                 if gantt_chart:
                     st.plotly_chart(gantt_chart, use_container_width=True)
                 
                 # Recomendaciones basadas en análisis
                 st.markdown("### Recomendaciones de IA")
                 
-                if kpis['accuracy_ratio'] < 0.7:
+                if kpis['accuracy_ratio'] is not None and kpis['accuracy_ratio'] < 0.7:
                     st.warning("""
                     **⚠️ Baja precisión en estimaciones:**
                     - Considera revisar tus técnicas de estimación
@@ -758,7 +1116,7 @@ def main():
                     - Desglosa tareas grandes en subtareas más pequeñas
                     """)
                 
-                if kpis['completion_ratio'] < 0.3 and len(tasks) > 5:
+                if kpis['completion_ratio'] < 0.3 and kpis['total_tasks'] > 5:
                     st.warning("""
                     **⚠️ Progreso lento del proyecto:**
                     - Revisa si hay cuellos de botella en las dependencias de tareas
@@ -777,5 +1135,11 @@ def main():
             else:
                 st.info("Este proyecto no tiene tareas para analizar.")
 
+    # Página de Rendimiento
+    elif menu_option == "⏱️ Rendimiento":
+        st.markdown('<h2 class="sub-header">Rendimiento</h2>', unsafe_allow_html=True)
+        show_performance_panel()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("app.rerun"):
+        main()
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""
+Planificación por épicas para proyectos grandes.
+
+Con una descripción larga, un único prompt choca con el contexto del
+modelo, tarda minutos y devuelve un plan plano y poco detallado. Aquí la
+planificación va en dos fases:
+
+1. Una petición divide el proyecto en épicas (build_epic_prompt).
+2. Cada épica se desglosa en tareas con su propia petición, todas a la vez
+   (con un límite de peticiones simultáneas por proveedor y un presupuesto
+   de tokens por plan), validadas y corregidas con PlanBuilder como en
+   generate_tasks().
+
+Los planes de las épicas se unen en uno: las tareas iniciales de cada épica
+dependen de las finales de las épicas de las que depende, y las tareas
+repetidas entre épicas se fusionan. La latencia pasa a ser la de la épica
+más lenta en vez de la suma, y el plan puede tener cientos de tareas.
+
+Cada fase se guarda en la caché de respuestas: repetir un plan, o
+reintentarlo tras un fallo, solo vuelve a pedir lo que falta.
+"""
+import asyncio
+import os
+import random
+import re
+import unicodedata
+
+from ai import (
+    AI_TEMPERATURE, EPIC_SCHEMA, MAX_EPICS, MAX_TASKS_PER_EPIC, PLAN_SCHEMA, REPAIR_RETRIES, REPAIR_SCHEMA, AIError,
+    PlanBuilder, build_epic_prompt, build_epic_task_prompt, estimate_tokens, extract_epics, get_provider,
+)
+from batch import BACKOFF_BASE, DEFAULT_RETRIES, RATE_LIMITS, RateLimiter
+from storage import ai_cache_key, get_cached_ai_response, put_cached_ai_response
+from tracing import traced
+
+# Descripciones a partir de las que se planifica por épicas (tokens estimados, ~2 páginas)
+HIERARCHICAL_MIN_TOKENS = int(os.environ.get('DEVPLANNER_HIERARCHICAL_MIN_TOKENS', '1000'))
+# Presupuesto de tokens (entrada más salida, estimados) de todas las peticiones de un plan
+PLAN_TOKEN_BUDGET = int(os.environ.get('DEVPLANNER_PLAN_TOKEN_BUDGET', '100000'))
+# Tokens de salida que se reservan por cada tarea o épica que se espera en una respuesta
+ITEM_OUTPUT_TOKENS = 60
+# Peticiones simultáneas al desglosar las épicas (sin entrada = DEFAULT_EPIC_CONCURRENCY)
+EPIC_CONCURRENCY = {
+    'ollama': 2,
+    'openai': 8,
+    'gemini': 4,
+}
+DEFAULT_EPIC_CONCURRENCY = 4
+# Similitud (Jaccard de palabras) a partir de la que dos tareas se consideran la misma
+DUPLICATE_SIMILARITY = 0.8
+# Horas de una épica sin desglosar y sin estimación propia
+DEFAULT_EPIC_HOURS = 40.0
+
+_STOPWORDS = frozenset('con del las los para por una uno unos unas que sus the and for'.split())
+
+
+def should_decompose(project_description, hierarchical=None):
+    """Si el proyecto se planifica por épicas: `hierarchical` o, si es None, según su longitud"""
+    if hierarchical is not None:
+        return bool(hierarchical)
+    return estimate_tokens(project_description or '') >= HIERARCHICAL_MIN_TOKENS
+
+
+class TokenBudget:
+    """
+    Presupuesto de tokens de un plan. Cada petición reserva lo que puede
+    gastar antes de enviarse y al terminar se anota lo que gastó: las
+    peticiones simultáneas no pueden pasarse del límite entre todas.
+    """
+
+    def __init__(self, limit=PLAN_TOKEN_BUDGET):
+        self.limit = limit
+        self.used = 0
+        self.reserved = 0
+
+    def reserve(self, tokens):
+        if self.limit and self.used + self.reserved + tokens > self.limit:
+            return False
+        self.reserved += tokens
+        return True
+
+    def release(self, reserved, used):
+        self.reserved -= reserved
+        self.used += used
+
+
+def _words(description):
+    """Palabras significativas de una descripción, sin acentos ni mayúsculas"""
+    text = unicodedata.normalize('NFKD', description.lower()).encode('ascii', 'ignore').decode()
+    # Los números se conservan siempre: 'Fase 1' y 'Fase 2' no son la misma tarea
+    return frozenset(word for word in re.findall(r'[a-z0-9]+', text)
+                     if word.isdigit() or len(word) > 2 and word not in _STOPWORDS)
+
+
+def _similar(a, b):
+    return bool(a and b) and len(a & b) / len(a | b) >= DUPLICATE_SIMILARITY
+
+
+def merge_epic_plans(epics, plans):
+    """
+    Une los planes de las épicas (`plans[i]`, None si la épica no se
+    desglosó) en un solo plan y devuelve (tareas, duplicados fusionados).
+
+    Las tareas sin dependencias de cada épica pasan a depender de las
+    tareas finales de sus épicas previas, y una épica sin plan queda como
+    una sola tarea. Como las épicas solo dependen de épicas anteriores, las
+    dependencias siguen apuntando siempre a tareas anteriores.
+
+    Una tarea igual a otra anterior (DUPLICATE_SIMILARITY) se descarta: sus
+    dependientes pasan a depender de la que se conserva y heredan las
+    dependencias de la descartada que aquella no cubre.
+    """
+    tasks, epic_ends = [], []
+    for epic, plan in zip(epics, plans):
+        if not plan:
+            plan = [{'description': epic['summary'] or epic['name'],
+                     'estimated_hours': epic['estimated_hours'] or DEFAULT_EPIC_HOURS, 'dependencies': []}]
+        offset = len(tasks)
+        entry = sorted({end for d in epic['dependencies'] for end in epic_ends[d]})
+        for task in plan:
+            tasks.append({
+                'description': f"[{epic['name']}] {task['description']}",
+                'estimated_hours': task['estimated_hours'],
+                'dependencies': [offset + d for d in task['dependencies']] or entry,
+                'words': _words(task['description']),
+            })
+        required = {d for task in plan for d in task['dependencies']}
+        epic_ends.append([offset + i for i in range(len(plan)) if i not in required])
+
+    canonical, inherited, kept = {}, {}, []
+    for i, task in enumerate(tasks):
+        dependencies = set()
+        for d in task['dependencies']:
+            dependencies.add(canonical[d])
+            dependencies.update(inherited.get(d, ()))
+        original = next((k for k in kept if _similar(tasks[k]['words'], task['words'])), None)
+        if original is None:
+            canonical[i] = i
+            task['dependencies'] = dependencies
+            kept.append(i)
+        else:
+            canonical[i] = original
+            inherited[i] = {d for d in dependencies if d > original}
+
+    positions = {index: position for position, index in enumerate(kept)}
+    merged = [{'description': tasks[i]['description'], 'estimated_hours': tasks[i]['estimated_hours'],
+               'dependencies': sorted(positions[d] for d in tasks[i]['dependencies'])} for i in kept]
+    return merged, len(tasks) - len(kept)
+
+
+def _sum_reports(reports):
+    """Métricas de PlanBuilder de todas las peticiones de un plan por épicas"""
+    total = {'first_response_valid': all(r['first_response_valid'] for r in reports),
+             'json_repaired': any(r['json_repaired'] for r in reports)}
+    for key in ('invalid', 'fixed', 'dropped', 'repair_requests', 'output_tokens', 'wasted_tokens'):
+        total[key] = sum(r[key] for r in reports)
+    return total
+
+
+async def plan_by_epics(project_description, ai_provider, ai_model, request, semaphore, limiter,
+                        retries=DEFAULT_RETRIES, budget=None, use_cache=True, report=None):
+    """
+    Genera el plan de un proyecto por épicas con `request` (la corrutina de
+    AIProvider.async_requester). `semaphore` y `limiter` limitan las
+    peticiones simultáneas y su ritmo; se comparten con batch.py para que
+    un lote no los multiplique. Las épicas que no caben en `budget` o
+    fallan tras los reintentos quedan como una sola tarea.
+
+    `report`, si se pasa un dict, recibe las métricas de PlanBuilder
+    sumadas y las del plan (épicas, desglosadas, sin presupuesto, fallidas,
+    duplicados y tokens). Lanza AIError si falla la fase de épicas.
+    """
+    budget = budget or TokenBudget()
+    cached = []
+
+    async def ask(prompt, schema, items):
+        """Texto de la respuesta, o None si la petición no cabe en el presupuesto"""
+        cost = estimate_tokens(prompt) + items * ITEM_OUTPUT_TOKENS
+        for attempt in range(retries + 1):
+            async with semaphore:
+                if not budget.reserve(cost):
+                    return None
+                await limiter.acquire()
+                try:
+                    text = await request(prompt, ai_model, schema)
+                except Exception as e:
+                    budget.release(cost, estimate_tokens(prompt))
+                    if attempt == retries or not getattr(e, 'retryable', False):
+                        raise
+                else:
+                    budget.release(cost, estimate_tokens(prompt) + estimate_tokens(text))
+                    return text
+            delay = BACKOFF_BASE * 2 ** attempt
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    def cache_key(prompt):
+        return ai_cache_key(ai_provider, ai_model, AI_TEMPERATURE, prompt)
+
+    def from_cache(prompt):
+        value = get_cached_ai_response(cache_key(prompt)) if use_cache else None
+        cached.append(value is not None)
+        return value
+
+    # Fase 1: épicas
+    prompt = build_epic_prompt(project_description)
+    epics = from_cache(prompt)
+    if epics is None:
+        text = await ask(prompt, EPIC_SCHEMA, MAX_EPICS)
+        if text is None:
+            raise AIError("El presupuesto de tokens no alcanza ni para dividir el proyecto en épicas.")
+        epics = extract_epics(text)
+        put_cached_ai_response(cache_key(prompt), ai_provider, ai_model, epics)
+
+    # Fase 2: tareas de cada épica, a la vez
+    async def expand(index):
+        epic = epics[index]
+        prompt = build_epic_task_prompt(project_description, epics, index)
+        builder = PlanBuilder()
+        tasks = from_cache(prompt)
+        if tasks is not None:
+            for item in tasks:
+                builder.add(item)
+            return builder.result(), None, 'cached'
+        try:
+            text = await ask(prompt, PLAN_SCHEMA, MAX_TASKS_PER_EPIC)
+            if text is None:
+                return None, None, 'skipped'
+            builder.add_response(text)
+            for _ in range(REPAIR_RETRIES):
+                if not builder.invalid:
+                    break
+                text = await ask(builder.repair_prompt(f"{epic['name']}: {epic['summary']}"), REPAIR_SCHEMA,
+                                 len(builder.invalid))
+                if text is None:
+                    break
+                builder.apply_repair(text)
+        except AIError as e:
+            return None, e.report or builder.report, 'failed'
+        tasks = builder.result()
+        if not tasks:
+            return None, builder.report, 'failed'
+        put_cached_ai_response(cache_key(prompt), ai_provider, ai_model, tasks)
+        return tasks, builder.report, 'expanded'
+
+    expansions = await asyncio.gather(*(expand(i) for i in range(len(epics))))
+    outcomes = [outcome for _, _, outcome in expansions]
+    if 'failed' in outcomes and not {'expanded', 'cached'} & set(outcomes):
+        failed = next(r for _, r, outcome in expansions if outcome == 'failed')
+        raise AIError("La IA no devolvió tareas válidas para ninguna épica.", retryable=True, report=failed)
+    tasks, duplicates = merge_epic_plans(epics, [plan for plan, _, _ in expansions])
+
+    if report is not None:
+        report.update(_sum_reports([r for _, r, _ in expansions if r]) if any(r for _, r, _ in expansions)
+                      else PlanBuilder().report)
+        report.update(
+            mode='epics',
+            cached=all(cached),
+            tasks=len(tasks),
+            epics=len(epics),
+            epics_expanded=outcomes.count('expanded') + outcomes.count('cached'),
+            epics_skipped=outcomes.count('skipped'),
+            epics_failed=outcomes.count('failed'),
+            duplicates=duplicates,
+            budget_tokens=budget.limit,
+            used_tokens=budget.used,
+        )
+    return tasks
+
+
+@traced
+def generate_tasks_by_epics(project_description, ai_provider, ai_model, api_key=None, use_cache=True,
+                            report=None, budget=PLAN_TOKEN_BUDGET, concurrency=None):
+    """Versión síncrona de plan_by_epics() para los trabajadores de la cola: devuelve la lista de tareas"""
+    provider = get_provider(ai_provider)
+    if provider.requires_api_key and not api_key:
+        raise AIError(f"Se requiere una API key de {provider.label}")
+    concurrency = concurrency or EPIC_CONCURRENCY.get(ai_provider, DEFAULT_EPIC_CONCURRENCY)
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        limiter = RateLimiter(RATE_LIMITS.get(ai_provider))
+        async with provider.async_requester(api_key, max_connections=concurrency) as request:
+            return await plan_by_epics(project_description, ai_provider, ai_model, request, semaphore, limiter,
+                                       budget=TokenBudget(budget), use_cache=use_cache, report=report)
+    return asyncio.run(run())
@@ -0,0 +1,153 @@
+"""
+Diagramas de Gantt de DevPlanner.
+
+Los datos salen directamente de SQLite a un DataFrame (pd.read_sql con
+parse_dates), sin recorrer tuplas en Python. Con pocas tareas se dibuja una
+barra por tarea, paginando el eje Y en SQL; por encima de un umbral se
+agrupan en carriles (por estado o responsable) con una barra por tramo de
+tareas consecutivas, para que el gráfico siga siendo legible y ligero.
+"""
+import math
+
+import storage
+from tracing import traced
+
+# pandas y plotly se importan dentro de las funciones: importar este módulo
+# (por sus constantes) no debe cargarlos.
+
+# Por encima de este número de tareas el modo automático agrupa
+GANTT_DETAIL_THRESHOLD = 300
+# Tareas por página en el modo detalle
+GANTT_PAGE_SIZE = 50
+# Barras máximas en el modo agrupado
+GANTT_MAX_BARS = 200
+GANTT_ROW_HEIGHT = 22
+GANTT_MIN_HEIGHT = 400
+
+STATUS_COLORS = {
+    'pending': '#FFC107',
+    'in_progress': '#2196F3',
+    'completed': '#4CAF50'
+}
+
+# Carriles posibles del modo agrupado: etiqueta -> columna del DataFrame
+GANTT_LANES = {
+    'Estado': 'Status',
+    'Responsable': 'Assignee',
+}
+
+# Columnas del DataFrame -> expresión SQL
+_GANTT_COLUMNS = {
+    'Id': 't.id',
+    'Task': 't.description',
+    'Start': 't.start_date',
+    'Finish': 't.end_date',
+    'Hours': 't.estimated_hours',
+    'Status': 't.status',
+    'Assignee': "COALESCE(p.name, 'Sin asignar')",
+}
+
+
+@traced
+def count_gantt_tasks(project_id):
+    with storage.connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM tasks WHERE project_id = ? AND start_date IS NOT NULL',
+                            (project_id,)).fetchone()[0]
+
+
+@traced
+def load_gantt_frame(project_id, columns=tuple(_GANTT_COLUMNS), offset=0, limit=None):
+    """
+    Tareas del proyecto con las columnas pedidas. Con `limit` devuelve solo
+    esa página, ordenada por inicio; pedir solo lo necesario abarata la lectura.
+    """
+    import pandas as pd
+    sql = 'SELECT ' + ', '.join(f'{_GANTT_COLUMNS[c]} AS "{c}"' for c in columns) + ' FROM tasks t'
+    if 'Assignee' in columns:
+        sql += ' LEFT JOIN people p ON p.id = t.assignee_id'
+    sql += ' WHERE t.project_id = ? AND t.start_date IS NOT NULL'
+    params = [project_id]
+    if limit is not None:
+        sql += ' ORDER BY t.start_date, t.id LIMIT ? OFFSET ?'
+        params += [limit, offset]
+    with storage.connection() as conn:
+        return pd.read_sql(sql, conn, params=params,
+                           parse_dates=[c for c in ('Start', 'Finish') if c in columns])
+
+
+@traced
+def aggregate_gantt_frame(df, lane='Status', max_bars=GANTT_MAX_BARS):
+    """
+    Agrupa las tareas en carriles: dentro de cada carril, cada tramo de
+    tareas consecutivas (por inicio) se resume en una barra de su primer
+    inicio a su último fin.
+    """
+    per_bar = max(1, math.ceil(len(df) / max_bars))
+    df = df.sort_values(['Start', 'Id']).assign(Done=lambda d: (d['Status'] == 'completed') * 100.0)
+    bucket = df.groupby(lane, sort=False).cumcount() // per_bar
+    bars = df.groupby([df[lane], bucket.rename('Tramo')], sort=False).agg(
+        Start=('Start', 'min'), Finish=('Finish', 'max'), Tareas=('Id', 'size'),
+        Hours=('Hours', 'sum'), Done=('Done', 'mean'))
+    return bars.reset_index().rename(columns={'Done': 'Completado (%)'}).round({'Completado (%)': 1})
+
+
+def _layout(fig, rows, title, y_title="Tareas"):
+    fig.update_yaxes(autorange="reversed")
+    fig.update_layout(
+        height=max(GANTT_MIN_HEIGHT, rows * GANTT_ROW_HEIGHT + 120),
+        showlegend=True,
+        xaxis_title="Fecha",
+        yaxis_title=y_title,
+        title=title,
+    )
+    return fig
+
+
+@traced
+def create_gantt_chart(project_id, mode='auto', page=0, page_size=GANTT_PAGE_SIZE, lane='Status'):
+    """
+    Figura de Gantt de un proyecto, o None si no hay tareas con fechas.
+
+    mode: 'detail' (una barra por tarea, página `page`), 'grouped' (carriles
+    de `lane`) o 'auto' (agrupa por encima de GANTT_DETAIL_THRESHOLD tareas).
+    """
+    total = count_gantt_tasks(project_id)
+    if not total:
+        return None
+    import plotly.express as px
+    if mode == 'auto':
+        mode = 'grouped' if total > GANTT_DETAIL_THRESHOLD else 'detail'
+
+    if mode == 'grouped':
+        columns = ('Id', 'Start', 'Finish', 'Hours', 'Status') + ((lane,) if lane != 'Status' else ())
+        bars = aggregate_gantt_frame(load_gantt_frame(project_id, columns), lane)
+        fig = px.timeline(
+            bars,
+            x_start="Start",
+            x_end="Finish",
+            y=lane,
+            color="Completado (%)",
+            color_continuous_scale=[STATUS_COLORS['pending'], STATUS_COLORS['completed']],
+            range_color=(0, 100),
+            hover_data=["Tareas", "Hours"],
+        )
+        lane_label = next((label for label, column in GANTT_LANES.items() if column == lane), lane)
+        return _layout(fig, bars[lane].nunique(), f"Diagrama de Gantt del Proyecto ({total} tareas agrupadas)",
+                       lane_label)
+
+    pages = math.ceil(total / page_size)
+    page = min(max(page, 0), pages - 1)
+    df = load_gantt_frame(project_id, ('Task', 'Start', 'Finish', 'Hours', 'Status'), page * page_size, page_size)
+    fig = px.timeline(
+        df,
+        x_start="Start",
+        x_end="Finish",
+        y="Task",
+        color="Status",
+        color_discrete_map=STATUS_COLORS,
+        hover_data=["Hours"],
+    )
+    title = "Diagrama de Gantt del Proyecto"
+    if pages > 1:
+        title += f" (página {page + 1} de {pages})"
+    return _layout(fig, len(df), title)
@@ -0,0 +1,92 @@
+"""
+KPIs de proyectos de DevPlanner.
+
+Se calculan a partir de project_stats, la tabla de agregados por proyecto
+que mantienen los triggers de tasks: un proyecto es una fila, y el resumen de
+todos los proyectos lee una fila por proyecto en vez de todas sus tareas.
+"""
+import storage
+from tracing import traced
+
+# Estados con contador propio en project_stats
+_STATUS_COLUMNS = {
+    'pending': 'pending_tasks',
+    'in_progress': 'in_progress_tasks',
+    'completed': 'completed_tasks',
+}
+
+
+def accuracy_ratio(estimated, actual):
+    """
+    Precisión de la estimación entre 0 y 1: 1 - |estimado - real| / estimado.
+
+    None si no hay horas estimadas con las que comparar (antes daba 0 y
+    disparaba la recomendación de mejorar las estimaciones); 0 como mínimo
+    cuando lo real dobla o más lo estimado (antes salía negativa).
+    """
+    if not estimated or estimated <= 0:
+        return None
+    return max(0.0, 1 - abs(estimated - (actual or 0)) / estimated)
+
+
+def empty_kpis():
+    return {
+        'total_tasks': 0,
+        'completed_tasks': 0,
+        'completion_ratio': 0,
+        'total_estimated_hours': 0.0,
+        'total_actual_hours': 0.0,
+        'accuracy_ratio': None,
+        'status_counts': {},
+        'start_date': None,
+        'end_date': None,
+    }
+
+
+def kpis_from_stats(stats):
+    """KPIs a partir de una fila de storage.get_project_stats()"""
+    if not stats or not stats['total_tasks']:
+        return empty_kpis()
+    status_counts = {status: stats[column] for status, column in _STATUS_COLUMNS.items() if stats[column]}
+    other = stats['total_tasks'] - sum(status_counts.values())
+    if other:
+        status_counts['other'] = other
+    return {
+        'total_tasks': stats['total_tasks'],
+        'completed_tasks': stats['completed_tasks'],
+        'completion_ratio': stats['completed_tasks'] / stats['total_tasks'],
+        'total_estimated_hours': stats['estimated_hours'],
+        'total_actual_hours': stats['actual_hours'],
+        # Solo tareas terminadas con horas estimadas y reales: las pendientes aún
+        # no tienen horas reales y hundirían la precisión
+        'accuracy_ratio': accuracy_ratio(stats['measured_estimated_hours'], stats['measured_actual_hours']),
+        'status_counts': status_counts,
+        'start_date': stats['min_start_date'],
+        'end_date': stats['max_end_date'],
+    }
+
+
+@traced(rows=lambda kpis: 1)
+def project_kpis(project_id):
+    """KPIs de un proyecto; total_tasks es 0 si no tiene tareas"""
+    return kpis_from_stats(storage.get_project_stats(project_id))
+
+
+@traced
+def portfolio_kpis():
+    """{project_id: kpis} de todos los proyectos, en una lectura de project_stats"""
+    return {project_id: kpis_from_stats(stats) for project_id, stats in storage.get_project_stats().items()}
+
+
+@traced(rows=lambda totals: totals['projects'])
+def portfolio_totals():
+    """KPIs de todos los proyectos sumados, más `projects`: cuántos tienen tareas"""
+    totals = dict.fromkeys(storage.PROJECT_STATS_COLUMNS[1:9], 0)
+    projects = 0
+    for stats in storage.get_project_stats().values():
+        if stats['total_tasks']:
+            projects += 1
+            for column in totals:
+                totals[column] += stats[column]
+    totals.update(min_start_date=None, max_end_date=None)
+    return dict(kpis_from_stats(totals), projects=projects)
@@ -0,0 +1,373 @@
+"""
+Nivelación de recursos de DevPlanner.
+
+Reparte en el tiempo las tareas de todos los proyectos activos según la
+capacidad real de cada persona (horas por día, días laborables y días
+libres). Es un planificador de lista en serie: en cada paso toma, entre las
+tareas cuyas dependencias ya están colocadas, la de mayor prioridad según la
+regla elegida, y la coloca lo antes posible en el calendario de su
+responsable. Las tareas sin responsable no consumen capacidad.
+
+Uso sin interfaz:
+    python leveling.py                    # nivela y guarda las fechas
+    python leveling.py --rule shortest --dry-run
+"""
+import argparse
+import datetime
+import heapq
+import time
+
+import storage
+from scheduler import DEFAULT_CALENDAR, schedule_tasks
+
+# Margen para comparar horas en coma flotante
+EPSILON = 1e-9
+
+
+class Person:
+    """Calendario de capacidad de una persona"""
+
+    def __init__(self, id, name, hours_per_day=8.0, workdays=(0, 1, 2, 3, 4), time_off=()):
+        self.id = id
+        self.name = name
+        self.hours_per_day = hours_per_day
+        self.workdays = frozenset(workdays)
+        self.time_off = frozenset(time_off)
+
+    def hours_on(self, date):
+        if date.weekday() in self.workdays and date not in self.time_off:
+            return self.hours_per_day
+        return 0.0
+
+
+class _Capacity:
+    """
+    Horas libres por día de una persona desde la fecha de inicio.
+
+    next_free[d] apunta hacia el siguiente día con horas libres (conjuntos
+    disjuntos con compresión de caminos), así que saltar los días ya llenos
+    no cuesta más a medida que se llena la agenda.
+    """
+
+    def __init__(self, person, start_date):
+        self.person = person
+        self.start_date = start_date
+        self.capacity = []
+        self.free = []
+        self.next_free = []
+
+    def _extend(self, day):
+        one_day = datetime.timedelta(days=1)
+        date = self.start_date + len(self.free) * one_day
+        while len(self.free) <= day:
+            hours = self.person.hours_on(date)
+            d = len(self.free)
+            self.capacity.append(hours)
+            self.free.append(hours)
+            self.next_free.append(d if hours > EPSILON else d + 1)
+            date += one_day
+
+    def find(self, day):
+        """Primer día >= day con horas libres"""
+        if day >= len(self.free):
+            self._extend(day)
+        root = day
+        while self.next_free[root] != root:
+            root = self.next_free[root]
+            if root >= len(self.free):
+                self._extend(root)
+        while self.next_free[day] != root:
+            self.next_free[day], day = root, self.next_free[day]
+        return root
+
+    def take(self, day, hours):
+        self.free[day] -= hours
+        if self.free[day] <= EPSILON:
+            self.free[day] = 0.0
+            self.next_free[day] = day + 1
+
+    def give(self, day, hours):
+        self.free[day] += hours
+
+    def reset_links(self):
+        """Rehace los enlaces al siguiente día libre tras devolver horas"""
+        self.next_free = [d if free > EPSILON else d + 1 for d, free in enumerate(self.free)]
+
+    def book(self, day, hours):
+        """Reserva `hours` desde `day`; devuelve (primer día, último día, [(día, horas)])"""
+        if hours <= EPSILON:
+            return day, day - 1, []
+        allocations = []
+        d = start = self.find(day)
+        while True:
+            amount = min(self.free[d], hours)
+            self.take(d, amount)
+            allocations.append((d, amount))
+            hours -= amount
+            if hours <= EPSILON:
+                return start, d, allocations
+            d = self.find(d + 1)
+
+
+class _Unbounded(_Capacity):
+    """Tareas sin responsable: calendario por defecto y capacidad ilimitada"""
+
+    def __init__(self, start_date):
+        super().__init__(Person(None, '', DEFAULT_CALENDAR.hours_per_day, DEFAULT_CALENDAR.workdays,
+                                DEFAULT_CALENDAR.holidays), start_date)
+
+    def take(self, day, hours):
+        pass
+
+    def give(self, day, hours):
+        pass
+
+    def reset_links(self):
+        pass
+
+
+def _priority_min_slack(leveling, i):
+    # Inicio más tardío sin retrasar su proyecto (regla LST)
+    return leveling.latest_start[i]
+
+
+def _priority_shortest(leveling, i):
+    return leveling.hours[i]
+
+
+def _priority_most_successors(leveling, i):
+    return -len(leveling.successors[i])
+
+
+def _priority_project(leveling, i):
+    # Los proyectos más antiguos primero; dentro de cada uno, por holgura
+    return leveling.project_rank[i], leveling.latest_start[i]
+
+
+PRIORITY_RULES = {
+    'min_slack': _priority_min_slack,
+    'shortest': _priority_shortest,
+    'most_successors': _priority_most_successors,
+    'project': _priority_project,
+}
+DEFAULT_RULE = 'min_slack'
+
+
+class Leveling:
+    """
+    Resultado de nivelar un conjunto de tareas entre varias personas.
+
+    `tasks` es una secuencia de dicts con id, hours (horas pendientes),
+    assignee_id, predecessors (ids) y opcionalmente project_id. Las fechas
+    siguen el convenio de scheduler: end_date es el día siguiente al último
+    día de trabajo.
+    """
+
+    def __init__(self, tasks, people, start_date=None, rule=DEFAULT_RULE):
+        if rule not in PRIORITY_RULES:
+            raise ValueError(f"Regla de prioridad desconocida: {rule}")
+        self.start_date = start_date or datetime.date.today()
+        self.rule = rule
+        self.people = {person.id: person for person in people}
+        self.ids = [task['id'] for task in tasks]
+        self.index = {task_id: i for i, task_id in enumerate(self.ids)}
+        self.hours = [max(0.0, task['hours'] or 0.0) for task in tasks]
+        self.assignees = [task.get('assignee_id') for task in tasks]
+        self.project_ids = [task.get('project_id') for task in tasks]
+        ranks = {}
+        self.project_rank = [ranks.setdefault(p, len(ranks)) for p in self.project_ids]
+
+        # Dependencias dentro del conjunto (las de tareas completadas ya no limitan)
+        index = self.index
+        plan = schedule_tasks(
+            [{'estimated_hours': hours,
+              'dependencies': [index[p] for p in task.get('predecessors', ()) if p in index]}
+             for hours, task in zip(self.hours, tasks)],
+            self.start_date, break_cycles=True)
+        self.predecessors = plan.predecessors
+        self.successors = [[] for _ in self.ids]
+        for i, preds in enumerate(self.predecessors):
+            for p in preds:
+                self.successors[p].append(i)
+        self.latest_start = plan.latest_start
+        self.dropped_edges = [(self.ids[p], self.ids[i]) for p, i in plan.dropped_edges]
+
+        priority = PRIORITY_RULES[rule]
+        self.priority = [priority(self, i) for i in range(len(self.ids))]
+        self._run(0)
+
+    def _capacity(self, capacities, assignee):
+        if assignee not in capacities:
+            person = self.people.get(assignee)
+            capacities[assignee] = _Capacity(person, self.start_date) if person else _Unbounded(self.start_date)
+        return capacities[assignee]
+
+    def _rewind(self, keep):
+        """Deshace la colocación de las tareas despachadas desde la posición `keep`"""
+        touched = set()
+        for j in self.order[keep:]:
+            assignee = self.assignees[j]
+            capacity = self._capacities[assignee]
+            for day, hours in self.allocations[j]:
+                capacity.give(day, hours)
+            touched.add(assignee)
+        for assignee in touched:
+            self._capacities[assignee].reset_links()
+        del self.order[keep:]
+
+    def _run(self, keep):
+        """Serie de despacho a partir de la posición `keep` del orden actual"""
+        n = len(self.ids)
+        if keep == 0:
+            self.order = []
+            self.first_day = [0] * n
+            self.last_day = [-1] * n
+            self.allocations = [()] * n
+            self.eligible_at = [0] * n
+            self._capacities = {}
+        order, capacities = self.order, self._capacities
+        ready_day = [0] * n
+        remaining = [len(preds) for preds in self.predecessors]
+        dispatched = bytearray(n)
+        last_day, successors = self.last_day, self.successors
+        for i in order:
+            dispatched[i] = 1
+            for s in successors[i]:
+                remaining[s] -= 1
+                if last_day[i] + 1 > ready_day[s]:
+                    ready_day[s] = last_day[i] + 1
+
+        priority, eligible_at = self.priority, self.eligible_at
+        heap = [(priority[i], i) for i in range(n) if not dispatched[i] and remaining[i] == 0]
+        heapq.heapify(heap)
+        for _, i in heap:
+            if eligible_at[i] > keep:
+                eligible_at[i] = keep
+        while heap:
+            _, i = heapq.heappop(heap)
+            capacity = self._capacity(capacities, self.assignees[i])
+            first, last, allocations = capacity.book(ready_day[i], self.hours[i])
+            self.first_day[i], self.last_day[i], self.allocations[i] = first, last, allocations
+            order.append(i)
+            for s in self.successors[i]:
+                if last + 1 > ready_day[s]:
+                    ready_day[s] = last + 1
+                remaining[s] -= 1
+                if remaining[s] == 0:
+                    eligible_at[s] = len(order)
+                    heapq.heappush(heap, (priority[s], s))
+
+    def update_task(self, task_id, hours=None, assignee_id=...):
+        """
+        Re-nivelación incremental tras cambiar las horas pendientes o el
+        responsable de una tarea. Las tareas despachadas antes de que esta
+        fuera elegible no dependen de ella y se conservan; solo se vuelve a
+        colocar el resto. Las prioridades de las demás tareas no se recalculan.
+        Devuelve los ids de las tareas cuyas fechas han cambiado.
+        """
+        i = self.index[task_id]
+        keep = self.eligible_at[i]
+        before = {j: (self.first_day[j], self.last_day[j]) for j in self.order[keep:]}
+        self._rewind(keep)
+        if hours is not None:
+            self.hours[i] = max(0.0, hours)
+        if assignee_id is not ...:
+            self.assignees[i] = assignee_id
+        if self.rule == 'shortest':
+            self.priority[i] = _priority_shortest(self, i)
+        self._run(keep)
+        return [self.ids[j] for j, days in before.items() if days != (self.first_day[j], self.last_day[j])]
+
+    def start_date_of(self, task_id):
+        return self.start_date + datetime.timedelta(days=self.first_day[self.index[task_id]])
+
+    def end_date_of(self, task_id):
+        return self.start_date + datetime.timedelta(days=self.last_day[self.index[task_id]] + 1)
+
+    @property
+    def horizon(self):
+        """Días naturales desde el inicio hasta el final de la última tarea"""
+        return max(self.last_day, default=-1) + 1
+
+    def utilization(self):
+        """person_id -> horas asignadas, capacidad en el horizonte, ocupación, tareas y último día de trabajo"""
+        horizon = self.horizon
+        report = {}
+        for person in self.people.values():
+            capacity = self._capacity(self._capacities, person.id)
+            if horizon > len(capacity.capacity):
+                capacity._extend(horizon - 1)
+            report[person.id] = {'name': person.name, 'assigned_hours': 0.0, 'tasks': 0, 'last_day': -1,
+                                 'capacity_hours': sum(capacity.capacity[:horizon])}
+        for i in self.order:
+            row = report.get(self.assignees[i])
+            if row is not None:
+                row['assigned_hours'] += self.hours[i]
+                row['tasks'] += 1
+                row['last_day'] = max(row['last_day'], self.last_day[i])
+        for row in report.values():
+            row['utilization'] = row['assigned_hours'] / row['capacity_hours'] if row['capacity_hours'] else 0.0
+            last_day = row.pop('last_day')
+            row['finish_date'] = self.start_date + datetime.timedelta(days=last_day) if last_day >= 0 else None
+        return report
+
+
+def load_people():
+    time_off = storage.get_time_off()
+    return [Person(pid, name, hours, workdays, time_off.get(pid, ()))
+            for pid, name, hours, workdays, _ in storage.get_people()]
+
+
+def level_active_projects(rule=DEFAULT_RULE, start_date=None, save=True):
+    """
+    Nivela todas las tareas pendientes de los proyectos activos y guarda solo
+    las fechas que cambian. Devuelve (Leveling, número de filas actualizadas).
+    """
+    rows, edges = storage.get_leveling_data()
+    predecessors = {}
+    for task_id, depends_on_id in edges:
+        predecessors.setdefault(task_id, []).append(depends_on_id)
+    tasks = [{'id': task_id, 'project_id': project_id,
+              'hours': (estimated or 0) - (actual or 0),
+              'assignee_id': assignee_id,
+              'predecessors': predecessors.get(task_id, ())}
+             for task_id, project_id, estimated, actual, _, assignee_id, _, _ in rows]
+    leveling = Leveling(tasks, load_people(), start_date, rule)
+    updated = 0
+    if save:
+        stored = {row[0]: (row[6], row[7]) for row in rows}
+        updated = save_dates(leveling, stored)
+    return leveling, updated
+
+
+def save_dates(leveling, stored, task_ids=None):
+    """Persiste las fechas de `task_ids` (por defecto todas) que difieren de `stored`"""
+    changes = []
+    for task_id in leveling.ids if task_ids is None else task_ids:
+        start, end = leveling.start_date_of(task_id), leveling.end_date_of(task_id)
+        if stored.get(task_id) != (start.isoformat(), end.isoformat()):
+            changes.append((task_id, start, end))
+            stored[task_id] = (start.isoformat(), end.isoformat())
+    return storage.update_task_dates(changes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nivela las tareas de los proyectos activos entre el equipo")
+    parser.add_argument('--db', default=storage.DB_PATH, help="Ruta de la base de datos")
+    parser.add_argument('--rule', choices=sorted(PRIORITY_RULES), default=DEFAULT_RULE)
+    parser.add_argument('--dry-run', action='store_true', help="Calcula sin guardar las fechas")
+    args = parser.parse_args()
+
+    storage.set_pool(storage.ConnectionPool(args.db))
+    storage.init_db()
+    start = time.perf_counter()
+    leveling, updated = level_active_projects(args.rule, save=not args.dry_run)
+    print(f"{len(leveling.ids)} tareas niveladas en {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{updated} actualizadas")
+    for row in sorted(leveling.utilization().values(), key=lambda r: -r['utilization']):
+        print(f"  {row['name']:<24} {row['assigned_hours']:8.1f} h / {row['capacity_hours']:8.1f} h "
+              f"({row['utilization']:.0%}), {row['tasks']} tareas, termina {row['finish_date']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""
+Motor de planificación de DevPlanner.
+
+Construye un grafo dirigido acíclico con las dependencias entre tareas, lo
+ordena topológicamente en O(V+E) y calcula el método del camino crítico:
+inicio/fin más temprano y más tardío, holgura y camino crítico. Los cálculos
+se hacen en días laborables enteros y solo al final se convierten a fechas
+con un calendario laboral (días de trabajo, festivos y horas por día).
+"""
+import datetime
+import heapq
+import math
+
+
+class ScheduleError(Exception):
+    """Las dependencias forman un ciclo; `cycle` contiene las tareas implicadas"""
+
+    def __init__(self, message, cycle):
+        super().__init__(message)
+        self.cycle = cycle
+
+
+class WorkCalendar:
+    """Calendario laboral: días de la semana trabajados, festivos y capacidad diaria"""
+
+    def __init__(self, hours_per_day=8.0, workdays=(0, 1, 2, 3, 4), holidays=()):
+        if hours_per_day <= 0:
+            raise ValueError("hours_per_day debe ser positivo")
+        if not workdays:
+            raise ValueError("El calendario necesita al menos un día laborable")
+        self.hours_per_day = hours_per_day
+        self.workdays = frozenset(workdays)
+        self.holidays = frozenset(holidays)
+
+    def is_workday(self, date):
+        return date.weekday() in self.workdays and date not in self.holidays
+
+    def duration_days(self, hours):
+        """Días laborables que ocupa una tarea de `hours` horas (mínimo 1)"""
+        return max(1, math.ceil((hours or 0) / self.hours_per_day))
+
+    def next_workday(self, date):
+        """Primer día laborable >= date"""
+        while not self.is_workday(date):
+            date += datetime.timedelta(days=1)
+        return date
+
+    def add_workdays(self, date, count):
+        """El día laborable que queda `count` días laborables después de date (laborable)"""
+        one_day = datetime.timedelta(days=1)
+        while count > 0:
+            date += one_day
+            if self.is_workday(date):
+                count -= 1
+        return date
+
+    def workdays_between(self, start, end):
+        """Días laborables en [start, end)"""
+        count = 0
+        one_day = datetime.timedelta(days=1)
+        while start < end:
+            if self.is_workday(start):
+                count += 1
+            start += one_day
+        return count
+
+    def workdays_from(self, start_date, count):
+        """Lista con los `count` primeros días laborables a partir de start_date (incluido)"""
+        dates = []
+        date = start_date
+        one_day = datetime.timedelta(days=1)
+        while len(dates) < count:
+            if self.is_workday(date):
+                dates.append(date)
+            date += one_day
+        return dates
+
+
+# Calendario por defecto: lunes a viernes, 8 h/día, sin festivos
+DEFAULT_CALENDAR = WorkCalendar()
+
+
+class Schedule:
+    """
+    Resultado de schedule_tasks().
+
+    Los tiempos están en días laborables desde el inicio del proyecto; las
+    fechas se obtienen con start_date(i) y end_date(i). end_date es el primer
+    día laborable en que una tarea sucesora podría empezar.
+    """
+
+    def __init__(self, order, predecessors, durations, earliest_start, earliest_finish,
+                 latest_start, latest_finish, dropped_edges, dates):
+        self.order = order
+        self.predecessors = predecessors
+        self.durations = durations
+        self.earliest_start = earliest_start
+        self.earliest_finish = earliest_finish
+        self.latest_start = latest_start
+        self.latest_finish = latest_finish
+        self.slack = [ls - es for ls, es in zip(latest_start, earliest_start)]
+        self.dropped_edges = dropped_edges
+        self._dates = dates
+
+    @property
+    def length(self):
+        """Duración del proyecto en días laborables"""
+        return max(self.earliest_finish, default=0)
+
+    @property
+    def critical_tasks(self):
+        return [i for i in self.order if self.slack[i] == 0]
+
+    @property
+    def critical_path(self):
+        """Una cadena de tareas críticas, de la primera a la última"""
+        slack, es, ef = self.slack, self.earliest_start, self.earliest_finish
+        length = self.length
+        current = next((i for i in reversed(self.order) if slack[i] == 0 and ef[i] == length), None)
+        path = []
+        while current is not None:
+            path.append(current)
+            current = next((p for p in self.predecessors[current] if slack[p] == 0 and ef[p] == es[current]), None)
+        path.reverse()
+        return path
+
+    def start_date(self, i):
+        return self._dates[self.earliest_start[i]]
+
+    def end_date(self, i):
+        return self._dates[self.earliest_finish[i]]
+
+
+def predecessor_lists(dependencies):
+    """
+    Normaliza las dependencias: dependencies[i] son los índices de las tareas
+    de las que depende i. Se ignoran los índices fuera de rango y las
+    autodependencias; las listas ya válidas se reutilizan sin copiarlas.
+    """
+    n = len(dependencies)
+    predecessors = [()] * n
+    for i, deps in enumerate(dependencies):
+        if not deps:
+            continue
+        for d in deps:
+            if type(d) is not int or not 0 <= d < n or d == i:
+                deps = [d for d in deps if type(d) is int and 0 <= d < n and d != i]
+                break
+        predecessors[i] = deps
+    return predecessors
+
+
+def topological_order(predecessors, break_cycles=False):
+    """
+    Orden topológico en O(V+E): recorrido en profundidad sobre los
+    predecesores, emitiendo cada tarea después de todas las suyas.
+
+    Si hay un ciclo lanza ScheduleError con las tareas que lo forman, salvo con
+    break_cycles=True: entonces se descarta la dependencia que lo cierra (y se
+    quita de `predecessors`) y se sigue. Devuelve (orden, aristas descartadas como pares (predecesor, tarea)).
+    """
+    n = len(predecessors)
+    state = bytearray(n)   # 0 sin visitar, 1 en el camino actual, 2 terminada
+    # Tareas del camino actual en orden; la pila puede tener entradas viejas
+    # de una tarea que se apiló varias veces antes de visitarla
+    path = {}
+    order = []
+    dropped = []
+    for root in range(n):
+        if state[root]:
+            continue
+        stack = [root]
+        while stack:
+            u = stack[-1]
+            if state[u] == 0:
+                state[u] = 1
+                path[u] = None
+                for d in predecessors[u]:
+                    if state[d] == 0:
+                        stack.append(d)
+                    elif state[d] == 1:
+                        if not break_cycles:
+                            on_path = list(path)
+                            cycle = on_path[on_path.index(d):]
+                            raise ScheduleError("Las dependencias entre tareas forman un ciclo", cycle)
+                        dropped.append((d, u))
+                if dropped and dropped[-1][1] == u:
+                    removed = {d for d, task in dropped if task == u}
+                    predecessors[u] = [d for d in predecessors[u] if d not in removed]
+            else:
+                stack.pop()
+                if state[u] == 1:
+                    state[u] = 2
+                    del path[u]
+                    order.append(u)
+    return order, dropped
+
+
+def schedule_tasks(tasks, start_date=None, calendar=None, break_cycles=False):
+    """
+    Planifica las tareas respetando sus dependencias (método del camino crítico).
+
+    `tasks` es una secuencia de dicts con estimated_hours y, opcionalmente,
+    dependencies (índices de otras tareas de la lista). Cada tarea empieza en
+    cuanto terminan todas sus predecesoras.
+    """
+    calendar = calendar or DEFAULT_CALENDAR
+    start_date = start_date or datetime.date.today()
+    n = len(tasks)
+    hours_per_day = calendar.hours_per_day
+    durations = [max(1, math.ceil((task.get('estimated_hours') or 0) / hours_per_day)) for task in tasks]
+    predecessors = predecessor_lists([task.get('dependencies') for task in tasks])
+    order, dropped = topological_order(predecessors, break_cycles)
+
+    # Pasada hacia delante: inicio más temprano
+    es = [0] * n
+    ef = [0] * n
+    for u in order:
+        start = 0
+        for d in predecessors[u]:
+            if ef[d] > start:
+                start = ef[d]
+        es[u] = start
+        ef[u] = start + durations[u]
+
+    # Pasada hacia atrás: fin más tardío sin retrasar el proyecto
+    length = max(ef, default=0)
+    lf = [length] * n
+    ls = [0] * n
+    for u in reversed(order):
+        latest = ls[u] = lf[u] - durations[u]
+        for d in predecessors[u]:
+            if latest < lf[d]:
+                lf[d] = latest
+
+    dates = calendar.workdays_from(start_date, length + 1)
+    return Schedule(order, predecessors, durations, es, ef, ls, lf, dropped, dates)
+
+
+def parse_holidays(text):
+    """Fechas YYYY-MM-DD separadas por comas o saltos de línea; ValueError si alguna es inválida"""
+    holidays = set()
+    for part in text.replace('\n', ',').split(','):
+        part = part.strip()
+        if part:
+            holidays.add(datetime.date.fromisoformat(part))
+    return sorted(holidays)
+
+
+def progress_dates(start, end, status, estimated_hours, actual_hours, today=None, calendar=None):
+    """
+    Fechas de una tarea tras cambiar su estado o sus horas reales.
+
+    Completada: termina hoy, así que su fin (exclusivo, el primer día en que
+    puede empezar una sucesora) es el siguiente día laborable. Empezada (en
+    curso o con horas reales): termina cuando se agoten las horas pendientes
+    contando desde hoy, y al menos un día laborable más si ya se pasó de lo
+    estimado. Pendiente sin horas: no hay avance que cambie sus fechas, así
+    que conserva las que tenga (p. ej. puestas a mano); sin fin, su duración
+    estimada desde su inicio.
+    """
+    calendar = calendar or DEFAULT_CALENDAR
+    today = today or datetime.date.today()
+    if status == 'completed':
+        return min(start, today), calendar.next_workday(today + datetime.timedelta(days=1))
+    if status == 'in_progress' or actual_hours:
+        remaining = max((estimated_hours or 0) - (actual_hours or 0), 0)
+        return min(start, today), calendar.add_workdays(calendar.next_workday(max(start, today)),
+                                                        calendar.duration_days(remaining))
+    if end is not None:
+        return start, end
+    return start, calendar.add_workdays(calendar.next_workday(start), calendar.duration_days(estimated_hours))
+
+
+def propagate_delay(task_id, start, end, successors_of, calendar=None):
+    """
+    Propaga el cambio de fechas de una tarea solo por sus sucesoras.
+
+    successors_of(task_id) devuelve (id, start, end, status) de las sucesoras
+    directas. Las tareas pendientes que empezaban antes del nuevo fin de una
+    predecesora se desplazan conservando su duración en días laborables; las
+    empezadas o completadas no se mueven y cortan la propagación. Solo se
+    retrasa (nunca se adelanta), así que el recorrido se detiene en cuanto un
+    desplazamiento deja de afectar. Devuelve ({id: (start, end)} cambiados,
+    número de sucesoras consultadas).
+    """
+    calendar = calendar or DEFAULT_CALENDAR
+    changes = {task_id: (start, end)}
+    heap = [(start, task_id)]
+    visited = 0
+    while heap:
+        start, u = heapq.heappop(heap)
+        if changes[u][0] != start:
+            continue   # entrada obsoleta: u se volvió a desplazar después
+        end = changes[u][1]
+        for s, s_start, s_end, s_status in successors_of(u):
+            visited += 1
+            if s_status != 'pending' or s_start is None:
+                continue
+            current_start, current_end = changes.get(s, (s_start, s_end))
+            if end <= current_start:
+                continue
+            new_start = calendar.next_workday(end)
+            duration = calendar.workdays_between(current_start, current_end) if current_end else 0
+            changes[s] = (new_start, calendar.add_workdays(new_start, duration))
+            heapq.heappush(heap, (new_start, s))
+    return changes, visited
@@ -0,0 +1,194 @@
+"""
+Instantáneas diarias de KPIs de DevPlanner.
+
+Una vez al día se copia project_stats a project_snapshots (una fila por
+proyecto) y sus totales a portfolio_snapshots (una fila por día). Las
+gráficas de burn-up, burn-down, precisión y velocidad leen estas series
+compactas en vez de reconstruir el historial de las tareas.
+
+Para que las consultas sigan siendo rápidas con años de historia, las
+instantáneas antiguas se reducen: diarias los últimos SNAPSHOT_DAILY_DAYS
+días, una por semana hasta SNAPSHOT_WEEKLY_DAYS y una por mes después.
+
+Las toma un hilo en segundo plano de la aplicación (start_snapshot_job) o,
+sin interfaz, `python snapshots.py` desde cron.
+"""
+import argparse
+import datetime
+import sqlite3
+import threading
+
+import storage
+from tracing import traced
+
+# Agregados de project_stats que se guardan en cada instantánea
+SNAPSHOT_COLUMNS = (
+    'total_tasks', 'pending_tasks', 'in_progress_tasks', 'completed_tasks',
+    'estimated_hours', 'actual_hours', 'measured_estimated_hours', 'measured_actual_hours',
+)
+
+# Retención: diarias, luego semanales y después mensuales
+SNAPSHOT_DAILY_DAYS = 90
+SNAPSHOT_WEEKLY_DAYS = 730
+
+# Cada cuánto comprueba el hilo si falta la instantánea del día (segundos)
+SNAPSHOT_CHECK_INTERVAL = 3600
+
+_COLUMNS = ', '.join(SNAPSHOT_COLUMNS)
+
+
+@traced
+def take_snapshot(day=None):
+    """
+    Guarda la instantánea de `day` (hoy por defecto) de los proyectos con
+    tareas. Repetirla el mismo día la sustituye. Devuelve el número de proyectos.
+    """
+    day = (day or datetime.date.today()).isoformat()
+    with storage.transaction() as conn:
+        conn.execute(f'''
+            INSERT OR REPLACE INTO project_snapshots (day, project_id, {_COLUMNS})
+            SELECT ?, project_id, {_COLUMNS} FROM project_stats WHERE total_tasks > 0
+        ''', (day,))
+        conn.execute(f'''
+            INSERT OR REPLACE INTO portfolio_snapshots (day, projects, {_COLUMNS})
+            SELECT ?, COUNT(*), {', '.join(f'TOTAL({column})' for column in SNAPSHOT_COLUMNS)}
+            FROM project_stats WHERE total_tasks > 0
+        ''', (day,))
+        return conn.execute('SELECT projects FROM portfolio_snapshots WHERE day = ?', (day,)).fetchone()[0]
+
+
+def has_snapshot(day=None):
+    day = (day or datetime.date.today()).isoformat()
+    with storage.connection() as conn:
+        return conn.execute('SELECT 1 FROM portfolio_snapshots WHERE day = ?', (day,)).fetchone() is not None
+
+
+def _month(day):
+    return day[:7]
+
+
+def _iso_week(day):
+    # Semana ISO: la que cruza el cambio de año es una sola (%W la partía en dos)
+    return datetime.date.fromisoformat(day).isocalendar()[:2]
+
+
+def _downsample(conn, since, before, bucket):
+    """
+    Deja, en [since, before), solo la última instantánea de cada periodo
+    (`bucket`: día ISO -> clave del periodo). Todos los proyectos se
+    fotografían los mismos días, así que los días a borrar se eligen en
+    portfolio_snapshots (una fila por día) y se borran por la clave
+    (day, project_id). Devuelve las filas borradas.
+    """
+    days = [day for (day,) in conn.execute(
+        'SELECT day FROM portfolio_snapshots WHERE day >= ? AND day < ? ORDER BY day', (since, before))]
+    # En orden, el último día de cada periodo es el que queda
+    last = {bucket(day): day for day in days}
+    kept = set(last.values())
+    days = [(day,) for day in days if day not in kept]
+    deleted = conn.executemany('DELETE FROM project_snapshots WHERE day = ?', days).rowcount
+    return deleted + conn.executemany('DELETE FROM portfolio_snapshots WHERE day = ?', days).rowcount
+
+
+@traced
+def apply_retention(today=None, daily_days=SNAPSHOT_DAILY_DAYS, weekly_days=SNAPSHOT_WEEKLY_DAYS):
+    """Reduce las instantáneas antiguas a semanales y mensuales; devuelve las filas borradas"""
+    today = today or datetime.date.today()
+    daily_cutoff = (today - datetime.timedelta(days=daily_days)).isoformat()
+    weekly_cutoff = (today - datetime.timedelta(days=weekly_days)).isoformat()
+    with storage.transaction() as conn:
+        return (_downsample(conn, '', weekly_cutoff, _month)
+                + _downsample(conn, weekly_cutoff, daily_cutoff, _iso_week))
+
+
+def run_snapshot(today=None):
+    """Instantánea del día si falta, más la retención; devuelve True si se tomó"""
+    if has_snapshot(today):
+        return False
+    take_snapshot(today)
+    apply_retention(today)
+    return True
+
+
+class SnapshotJob(threading.Thread):
+    """Hilo que toma la instantánea diaria; comprueba cada `interval` segundos si falta"""
+
+    def __init__(self, interval=SNAPSHOT_CHECK_INTERVAL):
+        super().__init__(name='devplanner-snapshots', daemon=True)
+        self.interval = interval
+        self.last_run = None
+        self.last_error = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                if run_snapshot():
+                    self.last_run = datetime.datetime.now()
+                self.last_error = None
+            except sqlite3.Error as e:
+                # Base de datos ocupada o bloqueada: se reintenta en la siguiente vuelta
+                self.last_error = e
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start_snapshot_job(interval=SNAPSHOT_CHECK_INTERVAL):
+    job = SnapshotJob(interval)
+    job.start()
+    return job
+
+
+def _series(sql, params):
+    # pandas solo al leer series: el hilo de instantáneas no lo necesita
+    import pandas as pd
+    with storage.connection() as conn:
+        df = pd.read_sql(sql, conn, params=params, parse_dates=['day'])
+    # Burn-down y precisión de cada punto; NaN donde aún no hay horas que comparar
+    df['remaining_tasks'] = df['total_tasks'] - df['completed_tasks']
+    measured = df['measured_estimated_hours'].where(df['measured_estimated_hours'] > 0)
+    df['accuracy_ratio'] = (1 - (measured - df['measured_actual_hours']).abs() / measured).clip(lower=0)
+    return df
+
+
+@traced
+def portfolio_series(since=None):
+    """Serie de todos los proyectos desde `since` (fecha o None para toda la historia)"""
+    return _series(f'SELECT day, projects, {_COLUMNS} FROM portfolio_snapshots WHERE day >= ? ORDER BY day',
+                   ((since.isoformat() if since else ''),))
+
+
+@traced
+def project_series(project_id, since=None):
+    return _series(f'SELECT day, {_COLUMNS} FROM project_snapshots WHERE project_id = ? AND day >= ? ORDER BY day',
+                   (project_id, since.isoformat() if since else ''))
+
+
+def weekly_velocity(series):
+    """
+    Tareas completadas por semana. Entre instantáneas separadas más de una
+    semana (historia reducida o días sin instantánea) se reparte el avance.
+    """
+    completed = series.set_index('day')['completed_tasks'].resample('W').last().dropna()
+    weeks = completed.index.to_series().diff().dt.days / 7
+    velocity = (completed.diff() / weeks).clip(lower=0).dropna()
+    return velocity.rename('velocity').reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Toma la instantánea diaria de KPIs y aplica la retención")
+    parser.add_argument('--db', default=storage.DB_PATH, help="Ruta de la base de datos")
+    parser.add_argument('--day', type=datetime.date.fromisoformat, help="Día de la instantánea (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    storage.set_pool(storage.ConnectionPool(args.db))
+    storage.init_db()
+    projects = take_snapshot(args.day)
+    deleted = apply_retention(args.day)
+    print(f"Instantánea de {projects} proyectos; {deleted} instantáneas antiguas reducidas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1502 @@
+"""
+Capa de almacenamiento SQLite de DevPlanner.
+
+En lugar de abrir y cerrar una conexión por cada consulta, las funciones de
+este módulo toman prestada una conexión de larga duración de un pool de
+proceso. Cada conexión se configura una sola vez (modo WAL, PRAGMAs de
+rendimiento) y conserva su caché de sentencias preparadas entre llamadas.
+"""
+import argparse
+import datetime
+import functools
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from scheduler import progress_dates, propagate_delay
+from tracing import traced
+
+DB_PATH = os.environ.get('DEVPLANNER_DB', 'devplanner.db')
+POOL_SIZE = int(os.environ.get('DEVPLANNER_DB_POOL_SIZE', '4'))
+
+# Consultas guardadas en la caché de lecturas (0 la desactiva)
+READ_CACHE_SIZE = int(os.environ.get('DEVPLANNER_READ_CACHE_SIZE', '256'))
+# Los resultados con más filas no se guardan, para acotar la memoria
+READ_CACHE_MAX_ROWS = 10_000
+
+# Número de sentencias preparadas que sqlite3 mantiene por conexión
+STATEMENT_CACHE_SIZE = 256
+
+# PRAGMAs aplicados a cada conexión al abrirla
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',      # ~16 MB de caché de páginas
+    'PRAGMA mmap_size = 134217728',    # 128 MB mapeados en memoria
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA foreign_keys = ON',
+)
+
+
+def connect(db_path=DB_PATH):
+    """Abre una conexión configurada para uso compartido entre hilos"""
+    # isolation_level=None: modo autocommit; las escrituras agrupadas usan
+    # transaction() con BEGIN/COMMIT explícitos.
+    conn = sqlite3.connect(
+        db_path,
+        timeout=5.0,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones SQLite de tamaño fijo.
+
+    Las conexiones se crean bajo demanda hasta `size` y se reutilizan después.
+    Cada conexión la usa un único hilo a la vez. No usar con ':memory:', ya que
+    cada conexión vería una base de datos distinta.
+    """
+
+    def __init__(self, db_path=DB_PATH, size=POOL_SIZE):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._watch = None
+        self._watch_lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                conn = connect(self.db_path)
+                self._created += 1
+                return conn
+        # Pool agotado: esperar a que otro hilo devuelva una conexión
+        return self._idle.get()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Conexión dentro de una transacción de escritura (commit o rollback al salir)"""
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def data_version(self):
+        """
+        Versión de los datos: cambia cada vez que otra conexión confirma una
+        escritura, sea de este pool o de otro proceso. Se lee de una conexión
+        propia que nunca escribe (PRAGMA data_version).
+        """
+        with self._watch_lock:
+            if self._watch is None:
+                self._watch = connect(self.db_path)
+            return self._watch.execute('PRAGMA data_version').fetchone()[0]
+
+    def close(self):
+        with self._watch_lock:
+            if self._watch is not None:
+                self._watch.close()
+                self._watch = None
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._created -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Devuelve el pool de conexiones del proceso, creándolo la primera vez"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+
+def set_pool(pool):
+    """Sustituye el pool del proceso (p. ej. para apuntar a otra base de datos)"""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, pool
+    if old is not None and old is not pool:
+        old.close()
+    _read_cache.clear()
+
+
+def connection():
+    return get_pool().connection()
+
+
+def transaction():
+    return get_pool().transaction()
+
+
+class ReadCache:
+    """
+    Caché LRU de resultados de consultas de solo lectura.
+
+    Todas las entradas valen para una versión de los datos
+    (ConnectionPool.data_version): cualquier escritura confirmada, desde
+    cualquier función o proceso, la cambia y vacía la caché entera. La
+    invalidación es exacta sin que las funciones de escritura tengan que
+    avisar. Guarda como mucho `size` resultados de hasta `max_rows` filas.
+    """
+
+    def __init__(self, size=READ_CACHE_SIZE, max_rows=READ_CACHE_MAX_ROWS):
+        self.size = size
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.invalidations = self.evictions = 0
+
+    def get(self, key, version, load):
+        """Resultado de `key` para `version`; si no está, lo calcula con load()"""
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        # La versión se leyó antes de consultar: si alguien escribe entretanto,
+        # el resultado se guarda con la versión antigua y no se volverá a servir
+        value = load()
+        rows = len(value) if isinstance(value, (list, dict)) else 1
+        if self.size and rows <= self.max_rows:
+            with self._lock:
+                if version == self._version:
+                    self._entries[key] = value
+                    while len(self._entries) > self.size:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size': self.size,
+            }
+
+
+_read_cache = ReadCache()
+
+
+def cached_read(func):
+    """
+    Sirve `func` desde la caché de lecturas mientras no cambien los datos.
+    Los argumentos deben ser hashables; los resultados se comparten entre
+    llamadas y no deben modificarse. `func.uncached` consulta siempre.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        return _read_cache.get(key, get_pool().data_version(), lambda: func(*args, **kwargs))
+    wrapper.uncached = func
+    return wrapper
+
+
+def _first_len(result):
+    # Filas de las funciones que devuelven una tupla con las filas o ids primero,
+    # como (filas, cursor) de las paginadas
+    return len(result[0])
+
+
+def get_read_cache_stats():
+    return _read_cache.stats()
+
+
+def clear_read_cache():
+    _read_cache.clear()
+
+
+# Migraciones del esquema. Cada función lleva la base de datos de la versión
+# N-1 a la N; PRAGMA user_version guarda la última versión aplicada.
+def _migration_1_initial_schema(c):
+    # Tabla de proyectos
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'planning'
+        )
+    ''')
+
+    # Tabla de tareas
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            description TEXT NOT NULL,
+            estimated_hours REAL,
+            actual_hours REAL DEFAULT 0,
+            status TEXT DEFAULT 'pending',
+            start_date DATE,
+            end_date DATE,
+            dependencies TEXT,
+            FOREIGN KEY (project_id) REFERENCES projects (id)
+        )
+    ''')
+
+    # Tabla de configuraciones de IA
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ai_config (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ai_provider TEXT DEFAULT 'openai',
+            ai_model TEXT DEFAULT 'gpt-3.5-turbo',
+            api_key TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Insertar configuración por defecto si no existe
+    c.execute('''
+        INSERT INTO ai_config (ai_provider, ai_model)
+        SELECT 'openai', 'gpt-3.5-turbo'
+        WHERE NOT EXISTS (SELECT 1 FROM ai_config)
+    ''')
+
+
+def _migration_2_indexes(c):
+    # get_tasks() filtra por proyecto y ordena por fecha de inicio
+    c.execute('CREATE INDEX IF NOT EXISTS idx_tasks_project_start ON tasks (project_id, start_date)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_tasks_project_status ON tasks (project_id, status)')
+    # get_projects() y get_ai_config() ordenan por fecha de creación
+    c.execute('CREATE INDEX IF NOT EXISTS idx_projects_created_at ON projects (created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_ai_config_created_at ON ai_config (created_at)')
+
+
+def _migration_3_ai_cache(c):
+    # Caché persistente de respuestas de IA, indexada por hash de la petición
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            key TEXT PRIMARY KEY,
+            ai_provider TEXT,
+            ai_model TEXT,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hits INTEGER DEFAULT 0
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_ai_cache_last_used ON ai_cache (last_used_at)')
+
+
+def _legacy_dependency_edges(c):
+    """
+    Traduce la columna tasks.dependencies (str de una lista de índices de la
+    respuesta de la IA) a pares (task_id, depends_on_id).
+
+    Los índices se refieren a la posición dentro del bloque de tareas que
+    generó la IA: las filas consecutivas (por id) de un proyecto con la
+    columna rellena. Las tareas manuales la dejan a NULL y cortan el bloque.
+    Se descartan los índices inválidos o fuera de rango.
+    """
+    edges = []
+    block, block_project = [], None
+
+    def flush():
+        for position, (task_id, indices) in enumerate(block):
+            for index in indices:
+                if type(index) is int and 0 <= index < len(block) and index != position:
+                    edges.append((task_id, block[index][0]))
+        block.clear()
+
+    for task_id, project_id, raw in c.execute('SELECT id, project_id, dependencies FROM tasks ORDER BY project_id, id'):
+        if raw is None or project_id != block_project:
+            flush()
+            block_project = project_id
+        if raw is None:
+            continue
+        try:
+            indices = json.loads(raw)
+        except ValueError:
+            indices = []
+        block.append((task_id, indices if isinstance(indices, list) else []))
+    flush()
+    return edges
+
+
+def _migration_4_task_dependencies(c):
+    # Aristas del grafo de dependencias; la clave primaria sirve para buscar
+    # predecesores y el índice inverso para buscar sucesores
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS task_dependencies (
+            task_id INTEGER NOT NULL REFERENCES tasks (id) ON DELETE CASCADE,
+            depends_on_id INTEGER NOT NULL REFERENCES tasks (id) ON DELETE CASCADE,
+            PRIMARY KEY (task_id, depends_on_id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_task_dependencies_depends_on ON task_dependencies (depends_on_id, task_id)')
+
+    c.executemany('INSERT OR IGNORE INTO task_dependencies (task_id, depends_on_id) VALUES (?, ?)',
+                  _legacy_dependency_edges(c))
+    # La columna antigua queda sin uso
+    c.execute('UPDATE tasks SET dependencies = NULL WHERE dependencies IS NOT NULL')
+
+
+def _migration_5_people(c):
+    # Personas que ejecutan las tareas y su calendario de capacidad
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS people (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            hours_per_day REAL NOT NULL DEFAULT 8,
+            workdays TEXT NOT NULL DEFAULT '0,1,2,3,4',
+            active INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS person_time_off (
+            person_id INTEGER NOT NULL REFERENCES people (id) ON DELETE CASCADE,
+            date DATE NOT NULL,
+            PRIMARY KEY (person_id, date)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('ALTER TABLE tasks ADD COLUMN assignee_id INTEGER REFERENCES people (id) ON DELETE SET NULL')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_tasks_assignee ON tasks (assignee_id)')
+
+
+# Agregados por proyecto de project_stats, en el orden de sus columnas
+PROJECT_STATS_COLUMNS = (
+    'project_id', 'total_tasks', 'pending_tasks', 'in_progress_tasks', 'completed_tasks',
+    'estimated_hours', 'actual_hours', 'measured_estimated_hours', 'measured_actual_hours',
+    'min_start_date', 'max_end_date',
+)
+
+# Recalcula project_stats desde las tareas (reconstrucción y comprobación)
+_PROJECT_STATS_SELECT = '''
+    SELECT p.id, COUNT(t.id), COUNT(CASE WHEN t.status = 'pending' THEN 1 END),
+           COUNT(CASE WHEN t.status = 'in_progress' THEN 1 END), COUNT(CASE WHEN t.status = 'completed' THEN 1 END),
+           TOTAL(t.estimated_hours), TOTAL(t.actual_hours),
+           TOTAL(CASE WHEN t.status = 'completed' AND t.estimated_hours > 0 AND t.actual_hours > 0
+                      THEN t.estimated_hours END),
+           TOTAL(CASE WHEN t.status = 'completed' AND t.estimated_hours > 0 AND t.actual_hours > 0
+                      THEN t.actual_hours END),
+           MIN(t.start_date), MAX(t.end_date)
+    FROM projects p LEFT JOIN tasks t ON t.project_id = p.id
+    GROUP BY p.id
+'''
+
+
+def _stats_delta_sql(row, sign):
+    """
+    UPDATE que suma (sign='+') o resta (sign='-') la tarea `row` (NEW u OLD)
+    de la fila de su proyecto en project_stats.
+
+    Al sumar, los extremos de fechas se amplían directamente. Al restar, si la
+    tarea era la primera en empezar o la última en terminar, ese extremo se
+    recalcula con una consulta sobre las tareas del proyecto.
+    """
+    measured = f"{row}.status = 'completed' AND {row}.estimated_hours > 0 AND {row}.actual_hours > 0"
+    if sign == '+':
+        dates = f'''
+            min_start_date = COALESCE(MIN(min_start_date, {row}.start_date), min_start_date, {row}.start_date),
+            max_end_date = COALESCE(MAX(max_end_date, {row}.end_date), max_end_date, {row}.end_date)'''
+    else:
+        dates = f'''
+            min_start_date = CASE WHEN {row}.start_date <= min_start_date
+                THEN (SELECT MIN(start_date) FROM tasks WHERE project_id = {row}.project_id)
+                ELSE min_start_date END,
+            max_end_date = CASE WHEN {row}.end_date >= max_end_date
+                THEN (SELECT MAX(end_date) FROM tasks WHERE project_id = {row}.project_id)
+                ELSE max_end_date END'''
+    return f'''
+        UPDATE project_stats SET
+            total_tasks = total_tasks {sign} 1,
+            pending_tasks = pending_tasks {sign} ({row}.status = 'pending'),
+            in_progress_tasks = in_progress_tasks {sign} ({row}.status = 'in_progress'),
+            completed_tasks = completed_tasks {sign} ({row}.status = 'completed'),
+            estimated_hours = estimated_hours {sign} COALESCE({row}.estimated_hours, 0),
+            actual_hours = actual_hours {sign} COALESCE({row}.actual_hours, 0),
+            measured_estimated_hours = measured_estimated_hours {sign} CASE WHEN {measured} THEN {row}.estimated_hours ELSE 0 END,
+            measured_actual_hours = measured_actual_hours {sign} CASE WHEN {measured} THEN {row}.actual_hours ELSE 0 END,{dates}
+        WHERE project_id = {row}.project_id;
+    '''
+
+
+def _migration_6_project_stats(c):
+    # Agregados por proyecto que mantienen los triggers de tasks, para que los
+    # listados y los KPIs lean una fila por proyecto en vez de todas sus tareas.
+    # Cada proyecto tiene su fila desde que se crea, así los triggers de tareas
+    # solo hacen UPDATE.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS project_stats (
+            project_id INTEGER PRIMARY KEY REFERENCES projects (id) ON DELETE CASCADE,
+            total_tasks INTEGER NOT NULL DEFAULT 0,
+            pending_tasks INTEGER NOT NULL DEFAULT 0,
+            in_progress_tasks INTEGER NOT NULL DEFAULT 0,
+            completed_tasks INTEGER NOT NULL DEFAULT 0,
+            estimated_hours REAL NOT NULL DEFAULT 0,
+            actual_hours REAL NOT NULL DEFAULT 0,
+            measured_estimated_hours REAL NOT NULL DEFAULT 0,
+            measured_actual_hours REAL NOT NULL DEFAULT 0,
+            min_start_date DATE,
+            max_end_date DATE
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_projects_stats_insert AFTER INSERT ON projects
+        BEGIN INSERT INTO project_stats (project_id) VALUES (NEW.id); END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_insert AFTER INSERT ON tasks
+        BEGIN {_stats_delta_sql('NEW', '+')} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_delete AFTER DELETE ON tasks
+        BEGIN {_stats_delta_sql('OLD', '-')} END
+    ''')
+    # Solo las columnas agregadas; cambiar la descripción o el responsable no lo dispara
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_update
+        AFTER UPDATE OF project_id, status, estimated_hours, actual_hours, start_date, end_date ON tasks
+        BEGIN {_stats_delta_sql('OLD', '-')} {_stats_delta_sql('NEW', '+')} END
+    ''')
+    c.execute(f'INSERT INTO project_stats ({", ".join(PROJECT_STATS_COLUMNS)}) {_PROJECT_STATS_SELECT}')
+
+
+def _migration_7_snapshots(c):
+    # Instantáneas diarias de project_stats para las series temporales. La
+    # clave empieza por el día, así una consulta por rango de fechas lee filas
+    # contiguas; el índice por proyecto sirve para la serie de un proyecto.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS project_snapshots (
+            day DATE NOT NULL,
+            project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+            total_tasks INTEGER NOT NULL,
+            pending_tasks INTEGER NOT NULL,
+            in_progress_tasks INTEGER NOT NULL,
+            completed_tasks INTEGER NOT NULL,
+            estimated_hours REAL NOT NULL,
+            actual_hours REAL NOT NULL,
+            measured_estimated_hours REAL NOT NULL,
+            measured_actual_hours REAL NOT NULL,
+            PRIMARY KEY (day, project_id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_project_snapshots_project ON project_snapshots (project_id, day)')
+    # Totales de todos los proyectos por día: las gráficas del portfolio leen
+    # una fila por día en vez de una por proyecto y día
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+            day DATE PRIMARY KEY,
+            projects INTEGER NOT NULL,
+            total_tasks INTEGER NOT NULL,
+            pending_tasks INTEGER NOT NULL,
+            in_progress_tasks INTEGER NOT NULL,
+            completed_tasks INTEGER NOT NULL,
+            estimated_hours REAL NOT NULL,
+            actual_hours REAL NOT NULL,
+            measured_estimated_hours REAL NOT NULL,
+            measured_actual_hours REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _migration_8_list_indexes(c):
+    # Listado de proyectos filtrado por estado, paginado por (created_at, id)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_projects_status_created_at ON projects (status, created_at)')
+
+
+def _migration_9_task_versions(c):
+    # Versión de cada tarea para el control de concurrencia optimista de
+    # save_task_edits(): sube con cada cambio de los campos que se editan a
+    # mano, sea cual sea la función que los escriba. Los cambios de fechas
+    # de la replanificación no la tocan.
+    c.execute('ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_version
+        AFTER UPDATE OF description, estimated_hours, actual_hours, status, assignee_id ON tasks
+        WHEN NEW.description IS NOT OLD.description OR NEW.estimated_hours IS NOT OLD.estimated_hours
+             OR NEW.actual_hours IS NOT OLD.actual_hours OR NEW.status IS NOT OLD.status
+             OR NEW.assignee_id IS NOT OLD.assignee_id
+        BEGIN
+            UPDATE tasks SET version = OLD.version + 1 WHERE id = NEW.id;
+        END
+    ''')
+    # Los triggers de project_stats recalculan MAX(end_date) cuando cambia
+    # una tarea que termina la última; sin índice recorrían todo el proyecto
+    c.execute('CREATE INDEX IF NOT EXISTS idx_tasks_project_end ON tasks (project_id, end_date)')
+
+
+def _migration_10_ai_jobs(c):
+    # Cola persistente de generaciones con IA: la interfaz encola y los
+    # procesos de worker.py reservan por (status, id), el más antiguo primero
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ai_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+            ai_provider TEXT NOT NULL,
+            ai_model TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'failed')),
+            params TEXT NOT NULL DEFAULT '{}',
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_ai_jobs_status ON ai_jobs (status, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_ai_jobs_project ON ai_jobs (project_id, id)')
+
+
+MIGRATIONS = [
+    _migration_1_initial_schema,
+    _migration_2_indexes,
+    _migration_3_ai_cache,
+    _migration_4_task_dependencies,
+    _migration_5_people,
+    _migration_6_project_stats,
+    _migration_7_snapshots,
+    _migration_8_list_indexes,
+    _migration_9_task_versions,
+    _migration_10_ai_jobs,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Aplica las migraciones pendientes en una sola transacción.
+
+    Si el esquema ya está al día solo cuesta leer PRAGMA user_version.
+    Devuelve la versión final del esquema.
+    """
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return SCHEMA_VERSION
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Releer dentro del bloqueo por si otro proceso acaba de migrar
+        version = get_schema_version(conn)
+        c = conn.cursor()
+        for migration in MIGRATIONS[version:]:
+            migration(c)
+        c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return SCHEMA_VERSION
+
+
+# Inicialización de la base de datos
+@traced
+def init_db():
+    with connection() as conn:
+        return migrate(conn)
+
+
+# Funciones para proyectos
+@traced
+def create_project(name, description, status='planning'):
+    with transaction() as conn:
+        c = conn.execute('INSERT INTO projects (name, description, status) VALUES (?, ?, ?)',
+                         (name, description, status))
+        return c.lastrowid
+
+
+@traced
+@cached_read
+def get_projects():
+    with connection() as conn:
+        return conn.execute('SELECT * FROM projects ORDER BY created_at DESC').fetchall()
+
+
+def _like_pattern(text):
+    """Patrón LIKE que busca `text` literal en cualquier posición"""
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+@traced(rows=_first_len)
+@cached_read
+def get_projects_page(after=None, limit=20, search=None, status=None):
+    """
+    Una página de proyectos, de más reciente a más antiguo, paginada por clave:
+    `after` es el (created_at, id) del último proyecto de la página anterior,
+    así cada página cuesta lo mismo sin importar cuántas haya antes. Filtra
+    por estado y por nombre en SQL. Devuelve (filas, cursor de la página
+    siguiente o None); las filas tienen las columnas de get_projects().
+    """
+    where, params = [], []
+    if status:
+        where.append('status = ?')
+        params.append(status)
+    if search:
+        where.append("name LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(search))
+    if after:
+        where.append('(created_at, id) < (?, ?)')
+        params += after
+    sql = 'SELECT id, name, description, created_at, status FROM projects'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+    with connection() as conn:
+        rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    if len(rows) > limit:
+        return rows[:limit], (rows[limit - 1][3], rows[limit - 1][0])
+    return rows, None
+
+
+@traced
+def get_projects_without_tasks():
+    with connection() as conn:
+        return conn.execute('''
+            SELECT * FROM projects p
+            WHERE NOT EXISTS (SELECT 1 FROM tasks t WHERE t.project_id = p.id)
+            ORDER BY created_at DESC
+        ''').fetchall()
+
+
+@traced
+@cached_read
+def get_project(project_id):
+    with connection() as conn:
+        return conn.execute('SELECT * FROM projects WHERE id = ?', (project_id,)).fetchone()
+
+
+# Agregados por proyecto (project_stats)
+@traced
+@cached_read
+def get_project_stats(project_id=None):
+    """
+    Agregados de un proyecto como dict (None si no existe) o, sin project_id,
+    {project_id: dict} de todos los proyectos.
+    """
+    sql = f'SELECT {", ".join(PROJECT_STATS_COLUMNS)} FROM project_stats'
+    with connection() as conn:
+        if project_id is not None:
+            row = conn.execute(sql + ' WHERE project_id = ?', (project_id,)).fetchone()
+            return dict(zip(PROJECT_STATS_COLUMNS, row)) if row else None
+        return {row[0]: dict(zip(PROJECT_STATS_COLUMNS, row)) for row in conn.execute(sql)}
+
+
+# Tolerancia al comparar sumas de horas, que acumulan redondeos de coma flotante
+STATS_HOURS_TOLERANCE = 1e-6
+
+
+@traced
+def check_project_stats():
+    """
+    Compara project_stats con lo que resulta de recalcularla desde las tareas.
+    Devuelve una lista de (project_id, columna, valor guardado, valor esperado);
+    vacía si está al día.
+    """
+    with connection() as conn:
+        stored = {row[0]: row for row in conn.execute(f'SELECT {", ".join(PROJECT_STATS_COLUMNS)} FROM project_stats')}
+        expected = {row[0]: row for row in conn.execute(_PROJECT_STATS_SELECT)}
+    drift = []
+    for project_id in sorted(stored.keys() | expected.keys()):
+        have_row = stored.get(project_id) or (project_id,) + (None,) * (len(PROJECT_STATS_COLUMNS) - 1)
+        want_row = expected.get(project_id) or (project_id,) + (None,) * (len(PROJECT_STATS_COLUMNS) - 1)
+        for column, have, want in zip(PROJECT_STATS_COLUMNS[1:], have_row[1:], want_row[1:]):
+            if isinstance(want, float) and isinstance(have, float):
+                if abs(have - want) > STATS_HOURS_TOLERANCE:
+                    drift.append((project_id, column, have, want))
+            elif have != want:
+                drift.append((project_id, column, have, want))
+    return drift
+
+
+@traced
+def rebuild_project_stats():
+    """Recalcula project_stats desde cero; devuelve el número de proyectos"""
+    with transaction() as conn:
+        conn.execute('DELETE FROM project_stats')
+        return conn.execute(f'INSERT INTO project_stats ({", ".join(PROJECT_STATS_COLUMNS)}) '
+                            f'{_PROJECT_STATS_SELECT}').rowcount
+
+
+# Funciones para tareas
+@traced
+def add_task(project_id, description, estimated_hours, start_date, end_date, dependencies=None):
+    """Inserta una tarea; `dependencies` son ids de tareas existentes de las que depende"""
+    with transaction() as conn:
+        c = conn.execute('''
+            INSERT INTO tasks (project_id, description, estimated_hours, start_date, end_date)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (project_id, description, estimated_hours, start_date, end_date))
+        task_id = c.lastrowid
+        if dependencies:
+            conn.executemany('INSERT OR IGNORE INTO task_dependencies (task_id, depends_on_id) VALUES (?, ?)',
+                             [(task_id, depends_on_id) for depends_on_id in dependencies])
+        return task_id
+
+
+@traced
+def add_tasks(project_id, tasks):
+    """
+    Inserta varias tareas en una sola transacción y devuelve sus ids.
+
+    `tasks` es una secuencia de dicts con las claves description,
+    estimated_hours, start_date, end_date y opcionalmente dependencies: los
+    índices dentro de `tasks` de las tareas de las que depende cada una, como
+    los devuelve la IA. O se insertan todas o ninguna.
+    """
+    with transaction() as conn:
+        return _insert_tasks(conn, project_id, tasks)
+
+
+def _insert_tasks(conn, project_id, tasks):
+    rows = [
+        (project_id, task['description'], task['estimated_hours'], task['start_date'], task['end_date'])
+        for task in tasks
+    ]
+    if not rows:
+        return []
+    conn.executemany('''
+        INSERT INTO tasks (project_id, description, estimated_hours, start_date, end_date)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    # Con AUTOINCREMENT y el bloqueo de escritura de la transacción los ids son consecutivos
+    last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+    ids = list(range(last_id - len(rows) + 1, last_id + 1))
+    edges = [
+        (ids[i], ids[index])
+        for i, task in enumerate(tasks)
+        for index in task.get('dependencies') or ()
+        if type(index) is int and 0 <= index < len(ids) and index != i
+    ]
+    if edges:
+        conn.executemany('INSERT OR IGNORE INTO task_dependencies (task_id, depends_on_id) VALUES (?, ?)',
+                         edges)
+    return ids
+
+
+@traced
+@cached_read
+def get_tasks(project_id):
+    with connection() as conn:
+        return conn.execute('SELECT * FROM tasks WHERE project_id = ? ORDER BY start_date',
+                            (project_id,)).fetchall()
+
+
+# Columnas de las filas de get_tasks_page()
+TASK_PAGE_COLUMNS = ('id', 'description', 'estimated_hours', 'actual_hours', 'status',
+                     'start_date', 'end_date', 'assignee_id', 'version')
+
+
+@traced(rows=_first_len)
+@cached_read
+def get_tasks_page(project_id, after=None, limit=50, search=None, status=None):
+    """
+    Una página de tareas del proyecto por fecha de inicio, paginada por clave
+    como get_projects_page(): `after` es el (start_date, id) de la última
+    tarea de la página anterior. Las tareas sin fecha van primero. Devuelve
+    (filas con TASK_PAGE_COLUMNS, cursor de la página siguiente o None).
+    """
+    where, params = ['project_id = ?'], [project_id]
+    if status:
+        where.append('status = ?')
+        params.append(status)
+    if search:
+        where.append("description LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(search))
+    if after:
+        start, task_id = after
+        if start is None:
+            where.append('(start_date IS NOT NULL OR id > ?)')
+            params.append(task_id)
+        else:
+            where.append('(start_date, id) > (?, ?)')
+            params += [start, task_id]
+    sql = (f'SELECT {", ".join(TASK_PAGE_COLUMNS)} FROM tasks WHERE {" AND ".join(where)} '
+           'ORDER BY start_date, id LIMIT ?')
+    with connection() as conn:
+        rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    if len(rows) > limit:
+        return rows[:limit], (rows[limit - 1][5], rows[limit - 1][0])
+    return rows, None
+
+
+@traced
+@cached_read
+def get_task_names(project_id):
+    """{id: descripción} de las tareas del proyecto, para elegir dependencias"""
+    with connection() as conn:
+        return dict(conn.execute('SELECT id, description FROM tasks WHERE project_id = ? ORDER BY start_date, id',
+                                 (project_id,)))
+
+
+@traced
+def update_task_status(task_id, status):
+    with transaction() as conn:
+        conn.execute('UPDATE tasks SET status = ? WHERE id = ?', (status, task_id))
+
+
+@traced
+def update_task_actual_hours(task_id, actual_hours):
+    with transaction() as conn:
+        conn.execute('UPDATE tasks SET actual_hours = ? WHERE id = ?', (actual_hours, task_id))
+
+
+def _parse_date(value):
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _reschedule_progress(conn, task_id, today=None, calendar=None):
+    """
+    Recalcula las fechas de una tarea tras cambiar su estado u horas reales y
+    retrasa solo las sucesoras afectadas, dentro de la transacción `conn`.
+    Devuelve (ids con fechas nuevas, número de sucesoras consultadas).
+    """
+    row = conn.execute('SELECT start_date, end_date, status, estimated_hours, actual_hours FROM tasks WHERE id = ?',
+                       (task_id,)).fetchone()
+    if row is None or row[0] is None:
+        return [], 0
+    start, end = _parse_date(row[0]), _parse_date(row[1])
+    new_start, new_end = progress_dates(start, end, row[2], row[3], row[4], today, calendar)
+
+    def successors_of(u):
+        return [(s, _parse_date(s_start), _parse_date(s_end), s_status)
+                for s, s_start, s_end, s_status in conn.execute('''
+                    SELECT t.id, t.start_date, t.end_date, t.status
+                    FROM task_dependencies d JOIN tasks t ON t.id = d.task_id
+                    WHERE d.depends_on_id = ?
+                ''', (u,))]
+
+    visited = 0
+    changes = {task_id: (new_start, new_end)}
+    # Un fin anterior al previsto no adelanta a nadie: solo se propagan retrasos
+    if end is None or new_end > end:
+        changes, visited = propagate_delay(task_id, new_start, new_end, successors_of, calendar)
+    if (new_start, new_end) == (start, end):
+        del changes[task_id]
+    conn.executemany('UPDATE tasks SET start_date = ?, end_date = ? WHERE id = ?',
+                     [(s_start, s_end, s) for s, (s_start, s_end) in changes.items()])
+    return list(changes), visited
+
+
+@traced(rows=_first_len)
+def update_task_progress(task_id, status=None, actual_hours=None, today=None, calendar=None):
+    """
+    Cambia el estado o las horas reales de una tarea y replanifica de forma
+    incremental: recalcula sus fechas y retrasa solo las sucesoras afectadas.
+
+    Todo ocurre en una transacción y solo se escriben las filas que cambian.
+    Devuelve (ids con fechas nuevas, número de sucesoras consultadas).
+    """
+    with transaction() as conn:
+        if status is not None:
+            conn.execute('UPDATE tasks SET status = ? WHERE id = ?', (status, task_id))
+        if actual_hours is not None:
+            conn.execute('UPDATE tasks SET actual_hours = ? WHERE id = ?', (actual_hours, task_id))
+        return _reschedule_progress(conn, task_id, today, calendar)
+
+
+# Campos de una tarea que se pueden editar en lote con save_task_edits()
+TASK_EDIT_FIELDS = ('status', 'actual_hours', 'assignee_id')
+
+
+@traced(rows=_first_len)
+def save_task_edits(edits, today=None, calendar=None):
+    """
+    Guarda un lote de ediciones de tareas en una sola transacción.
+
+    `edits` es {task_id: cambios}, donde cambios lleva 'version' (la versión
+    leída al mostrar la tarea) y cualquiera de TASK_EDIT_FIELDS, o
+    'delete': True. Control de concurrencia optimista: si la versión de una
+    tarea ya no coincide (otra sesión la editó) o la tarea ya no existe, sus
+    cambios no se aplican. Los cambios de estado u horas reales replanifican
+    las sucesoras como update_task_progress().
+
+    Devuelve (ids guardados, ids en conflicto, ids con fechas nuevas).
+    """
+    if not edits:
+        return [], [], []
+    task_ids = list(edits)
+    with transaction() as conn:
+        versions = dict(conn.execute(f'SELECT id, version FROM tasks WHERE id IN ({",".join("?" * len(task_ids))})',
+                                     task_ids).fetchall())
+        saved = [t for t in task_ids if versions.get(t) == edits[t]['version']]
+        conflicts = [t for t in task_ids if versions.get(t) != edits[t]['version']]
+
+        conn.executemany('DELETE FROM tasks WHERE id = ?', [(t,) for t in saved if edits[t].get('delete')])
+        updates = [t for t in saved if not edits[t].get('delete')]
+        for field in TASK_EDIT_FIELDS:
+            conn.executemany(f'UPDATE tasks SET {field} = ? WHERE id = ?',
+                             [(edits[t][field], t) for t in updates if field in edits[t]])
+
+        rescheduled = set()
+        for t in updates:
+            if 'status' in edits[t] or 'actual_hours' in edits[t]:
+                rescheduled.update(_reschedule_progress(conn, t, today, calendar)[0])
+    return saved, conflicts, sorted(rescheduled)
+
+
+@traced
+def delete_task(task_id):
+    with transaction() as conn:
+        conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+
+
+# Dependencias entre tareas
+@traced
+def add_task_dependency(task_id, depends_on_id):
+    """Añade la arista task_id -> depends_on_id; ValueError si cerraría un ciclo"""
+    with transaction() as conn:
+        if task_id == depends_on_id or depends_on_id in _transitive(conn, _SUCCESSORS_SQL, task_id):
+            raise ValueError("La dependencia crearía un ciclo")
+        conn.execute('INSERT OR IGNORE INTO task_dependencies (task_id, depends_on_id) VALUES (?, ?)',
+                     (task_id, depends_on_id))
+
+
+@traced
+def remove_task_dependency(task_id, depends_on_id):
+    with transaction() as conn:
+        conn.execute('DELETE FROM task_dependencies WHERE task_id = ? AND depends_on_id = ?',
+                     (task_id, depends_on_id))
+
+
+@traced
+def get_predecessors(task_id):
+    """Ids de las tareas de las que depende directamente task_id"""
+    with connection() as conn:
+        return [row[0] for row in conn.execute(
+            'SELECT depends_on_id FROM task_dependencies WHERE task_id = ?', (task_id,))]
+
+
+@traced
+def get_successors(task_id):
+    """Ids de las tareas que dependen directamente de task_id"""
+    with connection() as conn:
+        return [row[0] for row in conn.execute(
+            'SELECT task_id FROM task_dependencies WHERE depends_on_id = ?', (task_id,))]
+
+
+@traced
+def get_project_dependencies(project_id):
+    """Todas las aristas (task_id, depends_on_id) de un proyecto"""
+    with connection() as conn:
+        return conn.execute('''
+            SELECT d.task_id, d.depends_on_id
+            FROM tasks t JOIN task_dependencies d ON d.task_id = t.id
+            WHERE t.project_id = ?
+        ''', (project_id,)).fetchall()
+
+
+# Cierres transitivos con CTE recursivas. UNION (no UNION ALL) descarta los
+# nodos ya visitados, así que terminan aunque haya ciclos en datos antiguos.
+_PREDECESSORS_SQL = '''
+    WITH RECURSIVE closure(id) AS (
+        SELECT depends_on_id FROM task_dependencies WHERE task_id = ?
+        UNION
+        SELECT d.depends_on_id FROM task_dependencies d JOIN closure c ON d.task_id = c.id
+    )
+'''
+_SUCCESSORS_SQL = '''
+    WITH RECURSIVE closure(id) AS (
+        SELECT task_id FROM task_dependencies WHERE depends_on_id = ?
+        UNION
+        SELECT d.task_id FROM task_dependencies d JOIN closure c ON d.depends_on_id = c.id
+    )
+'''
+
+
+def _transitive(conn, cte, task_id):
+    return {row[0] for row in conn.execute(f'{cte} SELECT id FROM closure', (task_id,))}
+
+
+@traced
+def get_all_predecessors(task_id):
+    """Ids de todas las tareas de las que depende task_id, directa o indirectamente"""
+    with connection() as conn:
+        return _transitive(conn, _PREDECESSORS_SQL, task_id)
+
+
+@traced
+def get_all_successors(task_id):
+    """Ids de todas las tareas que dependen de task_id, directa o indirectamente"""
+    with connection() as conn:
+        return _transitive(conn, _SUCCESSORS_SQL, task_id)
+
+
+@traced
+def get_blocking_tasks(task_id):
+    """Tareas sin completar de las que depende task_id, directa o indirectamente"""
+    with connection() as conn:
+        return conn.execute(f'''
+            {_PREDECESSORS_SQL}
+            SELECT t.* FROM closure c JOIN tasks t ON t.id = c.id
+            WHERE t.status != 'completed'
+            ORDER BY t.start_date
+        ''', (task_id,)).fetchall()
+
+
+@traced
+def get_predecessor_names(task_ids):
+    """{task_id: [descripciones de sus predecesoras directas]} de las tareas dadas"""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return {}
+    names = {}
+    with connection() as conn:
+        for task_id, description in conn.execute(f'''
+            SELECT d.task_id, t.description
+            FROM task_dependencies d JOIN tasks t ON t.id = d.depends_on_id
+            WHERE d.task_id IN ({",".join("?" * len(task_ids))})
+            ORDER BY d.task_id, t.start_date, t.id
+        ''', task_ids):
+            names.setdefault(task_id, []).append(description)
+    return names
+
+
+@traced
+def get_blocked_task_counts(project_id, task_ids=None):
+    """
+    task_id -> número de tareas sin completar que la bloquean, para todo el
+    proyecto o solo para `task_ids` (por ejemplo, la página que se muestra)
+    """
+    if task_ids is None:
+        start, params = 'WHERE t.project_id = ?', [project_id]
+    else:
+        task_ids = list(task_ids)
+        if not task_ids:
+            return {}
+        start, params = f'WHERE t.project_id = ? AND t.id IN ({",".join("?" * len(task_ids))})', [project_id] + task_ids
+    with connection() as conn:
+        return dict(conn.execute(f'''
+            WITH RECURSIVE upstream(task_id, id) AS (
+                SELECT d.task_id, d.depends_on_id
+                FROM tasks t JOIN task_dependencies d ON d.task_id = t.id
+                {start}
+                UNION
+                SELECT u.task_id, d.depends_on_id FROM upstream u JOIN task_dependencies d ON d.task_id = u.id
+            )
+            SELECT u.task_id, COUNT(*) FROM upstream u JOIN tasks t ON t.id = u.id
+            WHERE t.status != 'completed'
+            GROUP BY u.task_id
+        ''', params).fetchall())
+
+
+# Personas y capacidad
+@traced
+def create_person(name, hours_per_day=8.0, workdays=(0, 1, 2, 3, 4)):
+    with transaction() as conn:
+        c = conn.execute('INSERT INTO people (name, hours_per_day, workdays) VALUES (?, ?, ?)',
+                         (name, hours_per_day, ','.join(map(str, sorted(workdays)))))
+        return c.lastrowid
+
+
+@traced
+@cached_read
+def get_people(active_only=True):
+    """Filas (id, name, hours_per_day, workdays, active); workdays como tupla de enteros (0 = lunes)"""
+    with connection() as conn:
+        rows = conn.execute('SELECT * FROM people' + (' WHERE active = 1' if active_only else '') + ' ORDER BY name').fetchall()
+    return [(pid, name, hours, tuple(int(d) for d in workdays.split(',') if d), active)
+            for pid, name, hours, workdays, active in rows]
+
+
+@traced
+def update_person(person_id, name, hours_per_day, workdays, active=True):
+    with transaction() as conn:
+        conn.execute('UPDATE people SET name = ?, hours_per_day = ?, workdays = ?, active = ? WHERE id = ?',
+                     (name, hours_per_day, ','.join(map(str, sorted(workdays))), int(active), person_id))
+
+
+@traced
+def delete_person(person_id):
+    # Sus tareas quedan sin asignar (ON DELETE SET NULL)
+    with transaction() as conn:
+        conn.execute('DELETE FROM people WHERE id = ?', (person_id,))
+
+
+@traced
+def add_time_off(person_id, date):
+    with transaction() as conn:
+        conn.execute('INSERT OR IGNORE INTO person_time_off (person_id, date) VALUES (?, ?)', (person_id, date))
+
+
+@traced
+def remove_time_off(person_id, date):
+    with transaction() as conn:
+        conn.execute('DELETE FROM person_time_off WHERE person_id = ? AND date = ?', (person_id, date))
+
+
+@traced
+def get_time_off():
+    """person_id -> conjunto de fechas libres"""
+    time_off = {}
+    with connection() as conn:
+        for person_id, date in conn.execute('SELECT person_id, date FROM person_time_off'):
+            time_off.setdefault(person_id, set()).add(datetime.date.fromisoformat(date))
+    return time_off
+
+
+@traced
+def assign_task(task_id, person_id):
+    with transaction() as conn:
+        conn.execute('UPDATE tasks SET assignee_id = ? WHERE id = ?', (person_id, task_id))
+
+
+# Estados de proyecto que entran en la nivelación de recursos
+LEVELED_PROJECT_STATUSES = ('planning', 'active')
+
+
+@traced
+def get_leveling_data():
+    """
+    Tareas sin completar de los proyectos activos y sus dependencias, para la
+    nivelación. Devuelve (tareas, aristas): cada tarea es (id, project_id,
+    estimated_hours, actual_hours, status, assignee_id, start_date, end_date),
+    ordenadas por antigüedad del proyecto.
+    """
+    placeholders = ','.join('?' * len(LEVELED_PROJECT_STATUSES))
+    with connection() as conn:
+        tasks = conn.execute(f'''
+            SELECT t.id, t.project_id, t.estimated_hours, t.actual_hours, t.status, t.assignee_id,
+                   t.start_date, t.end_date
+            FROM projects p JOIN tasks t ON t.project_id = p.id
+            WHERE p.status IN ({placeholders}) AND t.status != 'completed'
+            ORDER BY p.created_at, p.id, t.id
+        ''', LEVELED_PROJECT_STATUSES).fetchall()
+        edges = conn.execute(f'''
+            SELECT d.task_id, d.depends_on_id
+            FROM projects p JOIN tasks t ON t.project_id = p.id
+            JOIN task_dependencies d ON d.task_id = t.id
+            WHERE p.status IN ({placeholders}) AND t.status != 'completed'
+        ''', LEVELED_PROJECT_STATUSES).fetchall()
+    return tasks, edges
+
+
+@traced
+def update_task_dates(changes):
+    """Guarda en una transacción las fechas nuevas: secuencia de (task_id, start_date, end_date)"""
+    changes = list(changes)
+    if changes:
+        with transaction() as conn:
+            conn.executemany('UPDATE tasks SET start_date = ?, end_date = ? WHERE id = ?',
+                             [(start, end, task_id) for task_id, start, end in changes])
+    return len(changes)
+
+
+# Funciones para IA
+@traced
+@cached_read
+def get_ai_config():
+    with connection() as conn:
+        return conn.execute('SELECT * FROM ai_config ORDER BY created_at DESC LIMIT 1').fetchone()
+
+
+@traced
+def save_ai_config(ai_provider, ai_model, api_key=None):
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO ai_config (ai_provider, ai_model, api_key)
+            VALUES (?, ?, ?)
+        ''', (ai_provider, ai_model, api_key))
+
+
+# Caché de respuestas de IA
+AI_CACHE_TTL = 7 * 24 * 3600      # segundos
+AI_CACHE_MAX_ENTRIES = 500
+
+_ai_cache_stats = {'hits': 0, 'misses': 0}
+_ai_cache_stats_lock = threading.Lock()
+
+
+def ai_cache_key(ai_provider, ai_model, temperature, prompt):
+    payload = json.dumps([ai_provider, ai_model, temperature, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _count_ai_cache(outcome):
+    with _ai_cache_stats_lock:
+        _ai_cache_stats[outcome] += 1
+
+
+@traced
+def get_cached_ai_response(key, ttl=AI_CACHE_TTL):
+    """Devuelve la respuesta cacheada (ya decodificada) o None si no existe o caducó"""
+    now = time.time()
+    with connection() as conn:
+        row = conn.execute('SELECT response FROM ai_cache WHERE key = ? AND created_at >= ?',
+                           (key, now - ttl)).fetchone()
+        if row is None:
+            _count_ai_cache('misses')
+            return None
+        conn.execute('UPDATE ai_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?', (now, key))
+    _count_ai_cache('hits')
+    return json.loads(row[0])
+
+
+@traced
+def put_cached_ai_response(key, ai_provider, ai_model, response,
+                           ttl=AI_CACHE_TTL, max_entries=AI_CACHE_MAX_ENTRIES):
+    """Guarda una respuesta y expulsa las caducadas y las menos usadas recientemente"""
+    now = time.time()
+    with transaction() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO ai_cache (key, ai_provider, ai_model, response, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (key, ai_provider, ai_model, json.dumps(response, ensure_ascii=False), now, now))
+        conn.execute('DELETE FROM ai_cache WHERE created_at < ?', (now - ttl,))
+        conn.execute('''
+            DELETE FROM ai_cache WHERE key IN (
+                SELECT key FROM ai_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (max_entries,))
+
+
+@traced
+def clear_ai_cache():
+    with transaction() as conn:
+        conn.execute('DELETE FROM ai_cache')
+
+
+@traced
+def get_ai_cache_stats():
+    with connection() as conn:
+        entries = conn.execute('SELECT COUNT(*) FROM ai_cache').fetchone()[0]
+    with _ai_cache_stats_lock:
+        return dict(_ai_cache_stats, entries=entries)
+
+
+# Cola de trabajos de IA
+AI_JOB_COLUMNS = ('id', 'project_id', 'ai_provider', 'ai_model', 'status', 'params', 'result', 'error',
+                  'attempts', 'worker', 'created_at', 'started_at', 'finished_at')
+_AI_JOB_SELECT = f'SELECT {", ".join(AI_JOB_COLUMNS)} FROM ai_jobs'
+
+
+def _ai_job(row):
+    """Fila de ai_jobs como dict, con params y result ya decodificados"""
+    if row is None:
+        return None
+    job = dict(zip(AI_JOB_COLUMNS, row))
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+@traced
+def enqueue_ai_jobs(project_ids, ai_provider, ai_model, params=None):
+    """
+    Encola la generación del plan de cada proyecto, salvo los que ya tienen
+    un trabajo en cola o en curso. Devuelve cuántos trabajos se encolaron.
+    """
+    now, params = time.time(), json.dumps(params or {})
+    with transaction() as conn:
+        return conn.executemany('''
+            INSERT INTO ai_jobs (project_id, ai_provider, ai_model, params, created_at)
+            SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS (
+                SELECT 1 FROM ai_jobs WHERE project_id = ? AND status IN ('queued', 'running')
+            )
+        ''', [(project_id, ai_provider, ai_model, params, now, project_id) for project_id in project_ids]).rowcount
+
+
+@traced(rows=lambda job: 0 if job is None else 1)
+def claim_ai_job(worker, limits=None):
+    """
+    Reserva el trabajo en cola más antiguo cuyo proveedor no haya llegado a
+    su límite de trabajos en curso (`limits`: proveedor -> máximo). El
+    recuento y la reserva van en la misma transacción BEGIN IMMEDIATE, así
+    que dos procesos nunca se llevan el mismo trabajo. None si no hay ninguno.
+    """
+    with transaction() as conn:
+        running = dict(conn.execute(
+            "SELECT ai_provider, COUNT(*) FROM ai_jobs WHERE status = 'running' GROUP BY ai_provider"))
+        full = [provider for provider, limit in (limits or {}).items() if running.get(provider, 0) >= limit]
+        rows = conn.execute(f'''
+            UPDATE ai_jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1, result = NULL
+            WHERE id = (
+                SELECT id FROM ai_jobs
+                WHERE status = 'queued' AND ai_provider NOT IN ({", ".join("?" * len(full))})
+                ORDER BY id LIMIT 1
+            )
+            RETURNING {", ".join(AI_JOB_COLUMNS)}
+        ''', (worker, time.time(), *full)).fetchall()
+    return _ai_job(rows[0]) if rows else None
+
+
+@traced
+def update_ai_job_progress(job_id, worker, result):
+    """Guarda el resultado parcial de un trabajo en curso (las tareas recibidas hasta ahora)"""
+    with transaction() as conn:
+        conn.execute("UPDATE ai_jobs SET result = ? WHERE id = ? AND status = 'running' AND worker = ?",
+                     (json.dumps(result), job_id, worker))
+
+
+@traced(rows=lambda ids: 0 if ids is None else len(ids))
+def complete_ai_job(job_id, worker, result, tasks=()):
+    """
+    Guarda las tareas del plan y marca el trabajo como hecho en la misma
+    transacción, solo si `worker` sigue siendo su dueño: un trabajador que
+    cae o se da por perdido no duplica el plan al reintentarse. Devuelve los
+    ids de las tareas, o None si el trabajo ya no le pertenecía.
+    """
+    with transaction() as conn:
+        row = conn.execute("SELECT project_id FROM ai_jobs WHERE id = ? AND status = 'running' AND worker = ?",
+                           (job_id, worker)).fetchone()
+        if row is None:
+            return None
+        ids = _insert_tasks(conn, row[0], tasks)
+        conn.execute("UPDATE ai_jobs SET status = 'done', result = ?, error = NULL, finished_at = ? WHERE id = ?",
+                     (json.dumps(result), time.time(), job_id))
+        return ids
+
+
+@traced
+def fail_ai_job(job_id, worker, error, retry=False, result=None):
+    """Marca el trabajo como fallido, o lo devuelve a la cola si `retry`; `result` guarda sus métricas"""
+    with transaction() as conn:
+        conn.execute('''
+            UPDATE ai_jobs SET status = ?, error = ?, result = ?, worker = NULL, finished_at = ?
+            WHERE id = ? AND status = 'running' AND worker = ?
+        ''', ('queued' if retry else 'failed', str(error), json.dumps(result) if result else None,
+              None if retry else time.time(), job_id, worker))
+
+
+@traced
+def requeue_stale_ai_jobs(timeout, max_attempts):
+    """
+    Trabajos en curso desde hace más de `timeout` segundos (su trabajador
+    cayó o se colgó): vuelven a la cola, o fallan si ya agotaron los
+    intentos. Devuelve cuántos había.
+    """
+    now = time.time()
+    with transaction() as conn:
+        return conn.execute('''
+            UPDATE ai_jobs SET
+                status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                finished_at = CASE WHEN attempts >= ? THEN ? END,
+                error = 'El trabajador no terminó a tiempo', worker = NULL
+            WHERE status = 'running' AND started_at < ?
+        ''', (max_attempts, max_attempts, now, now - timeout)).rowcount
+
+
+@traced
+def purge_ai_jobs(older_than):
+    """Borra los trabajos terminados hace más de `older_than` segundos"""
+    with transaction() as conn:
+        return conn.execute("DELETE FROM ai_jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                            (time.time() - older_than,)).rowcount
+
+
+@traced(rows=lambda job: 0 if job is None else 1)
+@cached_read
+def get_latest_ai_job(project_id):
+    with connection() as conn:
+        return _ai_job(conn.execute(f'{_AI_JOB_SELECT} WHERE project_id = ? ORDER BY id DESC LIMIT 1',
+                                    (project_id,)).fetchone())
+
+
+@traced
+@cached_read
+def get_ai_job_position(job_id):
+    """Posición en la cola (1 = el siguiente en reservarse)"""
+    with connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM ai_jobs WHERE status = 'queued' AND id <= ?",
+                            (job_id,)).fetchone()[0]
+
+
+@traced
+@cached_read
+def get_recent_ai_jobs(limit=50):
+    """Últimos trabajos terminados, del más reciente al más antiguo"""
+    with connection() as conn:
+        return [_ai_job(row) for row in conn.execute(
+            f"{_AI_JOB_SELECT} WHERE status IN ('done', 'failed') ORDER BY finished_at DESC LIMIT ?", (limit,))]
+
+
+@traced
+@cached_read
+def get_ai_job_counts():
+    """Trabajos por estado, con todos los estados presentes"""
+    with connection() as conn:
+        counts = dict(conn.execute('SELECT status, COUNT(*) FROM ai_jobs GROUP BY status'))
+    return {status: counts.get(status, 0) for status in ('queued', 'running', 'done', 'failed')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de la base de datos de DevPlanner")
+    parser.add_argument('--db', default=DB_PATH, help="Ruta de la base de datos")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('check-stats', help="Comprueba que project_stats coincide con las tareas")
+    sub.add_parser('rebuild-stats', help="Recalcula project_stats desde las tareas")
+    args = parser.parse_args()
+
+    set_pool(ConnectionPool(args.db))
+    init_db()
+    if args.command == 'check-stats':
+        drift = check_project_stats()
+        for project_id, column, have, want in drift:
+            print(f"  proyecto {project_id}: {column} = {have}, esperado {want}")
+        if drift:
+            raise SystemExit(f"project_stats desincronizada en {len({d[0] for d in drift})} proyectos; "
+                             "ejecuta 'python storage.py rebuild-stats'")
+        print("project_stats al día")
+    else:
+        print(f"project_stats recalculada: {rebuild_project_stats()} proyectos")
+
+
+if __name__ == '__main__':
+    main()
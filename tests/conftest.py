@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos de DevPlanner están en la raíz del repositorio, sin paquete
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Pool de storage apuntando a una base de datos nueva e inicializada"""
+    storage.set_pool(storage.ConnectionPool(str(tmp_path / 'test.db')))
+    storage.init_db()
+    yield storage
+    storage.get_pool().close()
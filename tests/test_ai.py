@@ -0,0 +1,23 @@
+from ai import PlanBuilder, extract_tasks
+
+
+def test_accented_bare_word_is_an_invalid_task():
+    # Palabra sin comillas que empieza por una letra acentuada: tarea inválida, no una excepción
+    items = extract_tasks('{"tasks": [{"description": Índice, "estimated_hours": 8}]}')
+    builder = PlanBuilder()
+    assert [builder.add(item) for item in items] == [None]
+    assert list(builder.invalid) == [0]
+
+
+def test_repair_skips_malformed_indexes():
+    builder = PlanBuilder()
+    builder.add({'description': "Diseñar el esquema", 'estimated_hours': 4})
+    builder.add({'description': "Crear la API", 'estimated_hours': 'mucho'})
+    # Índices que no son enteros (ni True, que vale 1 como clave) se ignoran
+    builder.apply_repair('{"tasks": [%s]}' % ', '.join(
+        '{"index": %s, "description": "Crear la API", "estimated_hours": 8}' % index
+        for index in ('[1]', '{"a": 1}', 'true', '"1"', '1.5')))
+    assert list(builder.invalid) == [1]
+    builder.apply_repair('{"tasks": [{"index": 1, "description": "Crear la API", "estimated_hours": 8}]}')
+    assert builder.invalid == {}
+    assert builder.result()[1]['estimated_hours'] == 8
@@ -0,0 +1,29 @@
+import datetime
+
+import pytest
+
+from scheduler import ScheduleError, progress_dates, topological_order
+
+
+def test_cycle_lists_only_its_tasks():
+    # La tarea 2 se apila dos veces (desde 0 y desde 1) antes de visitarse; 2 y 3 forman el ciclo
+    predecessors = [[2, 1], [2], [3], [2]]
+    with pytest.raises(ScheduleError) as error:
+        topological_order(predecessors)
+    assert sorted(error.value.cycle) == [2, 3]
+
+
+def test_completed_task_ends_after_today():
+    # Miércoles: el fin es exclusivo, la sucesora puede empezar el jueves
+    today = datetime.date(2024, 1, 10)
+    start, end = progress_dates(datetime.date(2024, 1, 8), datetime.date(2024, 1, 20), 'completed', 16, 12,
+                                today=today)
+    assert (start, end) == (datetime.date(2024, 1, 8), datetime.date(2024, 1, 11))
+    # Viernes: el siguiente día laborable es el lunes
+    assert progress_dates(today, today, 'completed', 8, 8, today=datetime.date(2024, 1, 12))[1] == \
+        datetime.date(2024, 1, 15)
+
+
+def test_status_only_edit_keeps_manual_dates():
+    start, end = datetime.date(2024, 1, 8), datetime.date(2024, 2, 1)
+    assert progress_dates(start, end, 'pending', 8, 0, today=datetime.date(2024, 1, 3)) == (start, end)
@@ -0,0 +1,22 @@
+import datetime
+
+import snapshots
+
+
+def _days(db):
+    with db.connection() as conn:
+        return [day for (day,) in conn.execute('SELECT day FROM portfolio_snapshots ORDER BY day')]
+
+
+def test_weekly_retention_keeps_one_snapshot_per_iso_week(db):
+    project_id = db.create_project('Instantáneas', 'retención')
+    db.add_task(project_id, 'Tarea', 8.0, '2024-12-23', '2024-12-24')
+    first = datetime.date(2024, 12, 23)
+    for offset in range(21):
+        snapshots.take_snapshot(first + datetime.timedelta(days=offset))
+
+    # Todo el intervalo queda en el tramo semanal de la retención
+    snapshots.apply_retention(today=datetime.date(2025, 1, 13) + datetime.timedelta(days=90))
+
+    # La semana del 30/12 al 5/1 cruza el cambio de año y conserva una sola instantánea
+    assert _days(db) == ['2024-12-29', '2025-01-05', '2025-01-12']
@@ -0,0 +1,128 @@
+import datetime
+
+import pytest
+
+import storage
+
+
+def _query_plan(sql, params=()):
+    with storage.connection() as conn:
+        return ' | '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+
+
+def _seed(projects=5, tasks_per_project=20):
+    project_ids = [storage.create_project(f'Proyecto {i}', 'consulta') for i in range(projects)]
+    for project_id in project_ids:
+        storage.add_tasks(project_id, [{
+            'description': f'Tarea {i}',
+            'estimated_hours': 8.0,
+            'start_date': f'2024-01-{i % 28 + 1:02d}',
+            'end_date': f'2024-02-{i % 28 + 1:02d}',
+        } for i in range(tasks_per_project)])
+
+
+@pytest.mark.parametrize('sql, params, index', [
+    ('SELECT * FROM tasks WHERE project_id = ? ORDER BY start_date', (1,), 'idx_tasks_project_start'),
+    ('SELECT COUNT(*) FROM tasks WHERE project_id = ? AND status = ?', (1, 'completed'), 'idx_tasks_project_status'),
+    ('SELECT * FROM project_stats WHERE project_id = ?', (1,), 'INTEGER PRIMARY KEY'),
+    ('SELECT * FROM projects ORDER BY created_at DESC', (), 'idx_projects_created_at'),
+    ('SELECT * FROM ai_config ORDER BY created_at DESC LIMIT 1', (), 'idx_ai_config_created_at'),
+])
+def test_hot_queries_use_index(db, sql, params, index):
+    _seed()
+    plan = _query_plan(sql, params)
+    assert index in plan, plan
+    assert 'TEMP B-TREE' not in plan, plan
+
+
+def test_ai_cache_hit(db):
+    key = storage.ai_cache_key('openai', 'gpt-4o', 0.7, 'prompt')
+    storage.put_cached_ai_response(key, 'openai', 'gpt-4o', [{'description': 'A'}])
+    assert storage.get_cached_ai_response(key) == [{'description': 'A'}]
+
+
+@pytest.mark.parametrize('changed', [
+    ('ollama', 'gpt-4o', 0.7, 'prompt'),
+    ('openai', 'gpt-4o-mini', 0.7, 'prompt'),
+    ('openai', 'gpt-4o', 0.2, 'prompt'),
+    ('openai', 'gpt-4o', 0.7, 'otro prompt'),
+])
+def test_ai_cache_miss_when_key_changes(db, changed):
+    key = storage.ai_cache_key('openai', 'gpt-4o', 0.7, 'prompt')
+    storage.put_cached_ai_response(key, 'openai', 'gpt-4o', [{'description': 'A'}])
+    assert storage.get_cached_ai_response(storage.ai_cache_key(*changed)) is None
+
+
+def test_ai_cache_expires_after_ttl(db, monkeypatch):
+    key = storage.ai_cache_key('openai', 'gpt-4o', 0.7, 'prompt')
+    storage.put_cached_ai_response(key, 'openai', 'gpt-4o', [])
+    now = storage.time.time()
+    monkeypatch.setattr(storage.time, 'time', lambda: now + storage.AI_CACHE_TTL + 1)
+    assert storage.get_cached_ai_response(key) is None
+
+
+def test_ai_cache_evicts_least_recently_used(db, monkeypatch):
+    clock = iter(range(1_000_000, 2_000_000))
+    monkeypatch.setattr(storage.time, 'time', lambda: next(clock))
+    keys = [storage.ai_cache_key('openai', 'gpt-4o', 0.7, f'prompt {i}') for i in range(3)]
+    storage.put_cached_ai_response(keys[0], 'openai', 'gpt-4o', [0], max_entries=2)
+    storage.put_cached_ai_response(keys[1], 'openai', 'gpt-4o', [1], max_entries=2)
+    # Leer la primera la hace la más reciente: la que sobra es la segunda
+    assert storage.get_cached_ai_response(keys[0]) == [0]
+    storage.put_cached_ai_response(keys[2], 'openai', 'gpt-4o', [2], max_entries=2)
+    assert storage.get_cached_ai_response(keys[1]) is None
+    assert storage.get_cached_ai_response(keys[0]) == [0]
+    assert storage.get_cached_ai_response(keys[2]) == [2]
+
+
+def _task_rows():
+    with storage.connection() as conn:
+        return {row[0]: row[1:] for row in conn.execute('SELECT id, start_date, end_date, version FROM tasks')}
+
+
+def test_progress_edit_only_touches_descendants(db):
+    project_id = storage.create_project('DAG', 'replanificación')
+    # A -> B -> C -> D, A -> E y F suelta; se retrasa B
+    dates = [('2024-01-01', '2024-01-02'), ('2024-01-02', '2024-01-04'), ('2024-01-04', '2024-01-05'),
+             ('2024-01-05', '2024-01-08'), ('2024-01-02', '2024-01-03'), ('2024-01-01', '2024-01-03')]
+    dependencies = [[], [0], [1], [2], [0], []]
+    a, b, c, d, e, f = storage.add_tasks(project_id, [{
+        'description': name, 'estimated_hours': 8.0, 'start_date': start, 'end_date': end, 'dependencies': deps,
+    } for name, (start, end), deps in zip('ABCDEF', dates, dependencies)])
+    before = _task_rows()
+
+    changed, _ = storage.update_task_progress(b, status='in_progress', actual_hours=100,
+                                              today=datetime.date(2024, 1, 15))
+
+    after = _task_rows()
+    modified = {task_id for task_id in before if before[task_id] != after[task_id]}
+    assert modified == set(changed) == {b, c, d}
+    assert modified <= storage.get_all_successors(b) | {b}
+    assert all(before[task_id] == after[task_id] for task_id in (a, e, f))
+
+
+def test_progress_edit_in_large_project_writes_only_its_subtree(db):
+    # Abanico de 10.001 tareas: una raíz y 2.500 cadenas de 4 que dependen de ella. Se retrasa la
+    # primera tarea de una cadena; solo se pueden reescribir esa tarea y las 3 que la siguen.
+    # `python bench.py reschedule` mide lo mismo con 50.000 tareas y dependencias aleatorias.
+    from ai import plan_to_task_rows
+
+    chains, length = 2500, 4
+    plan = [{'description': 'Raíz', 'estimated_hours': 8.0, 'dependencies': []}]
+    for _ in range(chains):
+        for step in range(length):
+            plan.append({'description': f'Paso {step}', 'estimated_hours': 8.0,
+                         'dependencies': [0 if step == 0 else len(plan) - 1]})
+    project_id = storage.create_project('Abanico', 'replanificación')
+    ids = storage.add_tasks(project_id, plan_to_task_rows(plan, start_date=datetime.date(2024, 1, 1)))
+    subtree = set(ids[1 + length * 1000:1 + length * 1001])
+    edited = ids[1 + length * 1000]
+    before = _task_rows()
+
+    changed, visited = storage.update_task_progress(edited, status='in_progress', actual_hours=100,
+                                                    today=datetime.date(2024, 2, 1))
+
+    assert set(changed) == subtree
+    assert visited <= length
+    after = _task_rows()
+    assert {task_id for task_id in before if before[task_id] != after[task_id]} == subtree
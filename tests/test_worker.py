@@ -0,0 +1,25 @@
+import worker
+
+
+def test_job_reports_progress_and_generation_times(db, monkeypatch):
+    project_id = db.create_project("Tienda", "Tienda online con carrito y pagos")
+    db.enqueue_ai_jobs([project_id], 'stub', 'stub', {'use_cache': False, 'hierarchical': False})
+    job = db.claim_ai_job('pruebas')
+    received = []
+    update = db.update_ai_job_progress
+
+    def spy(job_id, name, result):
+        received.append(len(result['progress']))
+        update(job_id, name, result)
+        # Las tareas recibidas ya se ven desde fuera mientras el trabajo sigue en curso
+        assert db.get_latest_ai_job.uncached(project_id)['result'] == result
+
+    monkeypatch.setattr(worker, 'PROGRESS_INTERVAL', 0)
+    monkeypatch.setattr(db, 'update_ai_job_progress', spy)
+    worker.run_job(job, 'pruebas')
+
+    job = db.get_latest_ai_job(project_id)
+    assert job['status'] == 'done'
+    assert received == list(range(1, job['result']['tasks'] + 1))
+    generation = job['result']['generation']
+    assert 0 <= generation['time_to_first_task'] <= generation['total_time']
@@ -0,0 +1,238 @@
+"""
+Trazas de rendimiento de DevPlanner.
+
+Spans ligeros alrededor de las rutas calientes (funciones de storage,
+generación con IA, Gantt, KPIs y cada rerun de la aplicación). Por cada
+nombre se acumulan llamadas, histograma de latencias y filas devueltas, y
+los últimos eventos se guardan en un búfer acotado que se puede exportar
+como JSON lines o en el formato de trazas de Chrome (chrome://tracing,
+Perfetto).
+
+Desactivadas, cada función instrumentada solo paga una comprobación de un
+booleano. Se activan con DEVPLANNER_TRACE=1 o con enable().
+"""
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Límites superiores (ms) de los cubos del histograma; el último cubo es el resto
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Eventos que se conservan para exportar
+TRACE_BUFFER_SIZE = int(os.environ.get('DEVPLANNER_TRACE_BUFFER', '20000'))
+
+_enabled = os.environ.get('DEVPLANNER_TRACE', '') not in ('', '0')
+_lock = threading.Lock()
+_stats = {}
+_events = deque(maxlen=TRACE_BUFFER_SIZE)
+_bounds_ns = [int(bound * 1e6) for bound in HISTOGRAM_BOUNDS_MS]
+_origin_ns = time.perf_counter_ns()
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _events.clear()
+
+
+def count_rows(result):
+    """Filas de un resultado: longitud de listas, dicts y DataFrames; 1 para una fila suelta"""
+    if result is None:
+        return 0
+    if isinstance(result, tuple):
+        return 1
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def _error_name(exc_type):
+    # Las excepciones de control (st.rerun, st.stop) heredan de BaseException y no son errores
+    return exc_type.__name__ if exc_type and issubclass(exc_type, Exception) else None
+
+
+def _record(name, start_ns, end_ns, rows, attrs, error):
+    duration = end_ns - start_ns
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = {'count': 0, 'total_ns': 0, 'max_ns': 0, 'rows': 0, 'errors': 0,
+                                    'buckets': [0] * (len(_bounds_ns) + 1)}
+        stats['count'] += 1
+        stats['total_ns'] += duration
+        stats['max_ns'] = max(stats['max_ns'], duration)
+        stats['rows'] += rows or 0
+        stats['errors'] += error is not None
+        stats['buckets'][bisect.bisect_left(_bounds_ns, duration)] += 1
+        _events.append((name, start_ns, duration, threading.get_ident(), rows, attrs, error))
+
+
+class Span:
+    """Mide un bloque `with`; asignar `span.rows` registra las filas devueltas"""
+    __slots__ = ('name', 'attrs', 'rows', 'start_ns')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.rows = None
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record(self.name, self.start_ns, time.perf_counter_ns(), self.rows, self.attrs, _error_name(exc_type))
+
+
+class _NullSpan:
+    """Span que no mide nada, compartido cuando las trazas están desactivadas"""
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **attrs):
+    return Span(name, attrs) if _enabled else _NULL_SPAN
+
+
+def traced(func=None, *, name=None, rows=count_rows):
+    """
+    Decorador que registra cada llamada como un span `name` (por defecto
+    módulo.función). `rows` calcula las filas a partir del resultado.
+    Se usa como @traced o @traced(name=..., rows=...).
+    """
+    if func is None:
+        return functools.partial(traced, name=name, rows=rows)
+    span_name = name or f'{func.__module__}.{func.__name__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter_ns()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            _record(span_name, start, time.perf_counter_ns(), None, None, _error_name(type(e)))
+            raise
+        _record(span_name, start, time.perf_counter_ns(), rows(result), None, None)
+        return result
+    return wrapper
+
+
+def _percentile(buckets, count, fraction):
+    """Límite superior (ms) del cubo que contiene el percentil; None si cae en el último"""
+    seen = 0
+    for bound, bucket in zip(HISTOGRAM_BOUNDS_MS, buckets):
+        seen += bucket
+        if seen >= count * fraction:
+            return bound
+    return None
+
+
+def get_span_stats():
+    """Resumen por nombre de span, de más a menos tiempo total"""
+    with _lock:
+        snapshot = [(name, dict(stats, buckets=list(stats['buckets']))) for name, stats in _stats.items()]
+    summary = []
+    for name, stats in snapshot:
+        count = stats['count']
+        summary.append({
+            'name': name,
+            'count': count,
+            'total_ms': stats['total_ns'] / 1e6,
+            'mean_ms': stats['total_ns'] / count / 1e6,
+            'p50_ms': _percentile(stats['buckets'], count, 0.5),
+            'p95_ms': _percentile(stats['buckets'], count, 0.95),
+            'max_ms': stats['max_ns'] / 1e6,
+            'rows': stats['rows'],
+            'errors': stats['errors'],
+            'histogram': list(zip(HISTOGRAM_BOUNDS_MS + (None,), stats['buckets'])),
+        })
+    return sorted(summary, key=lambda s: -s['total_ms'])
+
+
+def get_events():
+    """Eventos del búfer: (nombre, inicio ns, duración ns, hilo, filas, atributos, error)"""
+    with _lock:
+        return list(_events)
+
+
+def last_breakdown(root='app.rerun'):
+    """
+    Tiempo propio (ms) por categoría, el prefijo del nombre del span, dentro
+    del último span `root` terminado: qué parte fue SQLite, IA, Gantt... y
+    cuánto quedó en el propio `root` (en un rerun, Streamlit y los widgets).
+    None si no hay ninguno en el búfer.
+    """
+    events = get_events()
+    roots = [event for event in events if event[0] == root]
+    if not roots:
+        return None
+    _, root_start, root_duration, root_thread = roots[-1][:4]
+    inside = sorted((event for event in events
+                     if event[3] == root_thread and event[1] >= root_start
+                     and event[1] + event[2] <= root_start + root_duration),
+                    key=lambda event: (event[1], -event[2]))
+    self_ns, stack = {}, []
+    for name, start, duration, *_ in inside:
+        while stack and stack[-1][0] <= start:
+            stack.pop()
+        category = name.split('.')[0]
+        if stack:
+            self_ns[stack[-1][1]] -= duration
+        self_ns[category] = self_ns.get(category, 0) + duration
+        stack.append((start + duration, category))
+    return {category: ns / 1e6 for category, ns in sorted(self_ns.items(), key=lambda item: -item[1])}
+
+
+def _event_dict(name, start_ns, duration_ns, thread_id, rows, attrs, error):
+    event = {'name': name, 'ts_us': (start_ns - _origin_ns) / 1000, 'dur_us': duration_ns / 1000,
+             'thread': thread_id, 'rows': rows}
+    if attrs:
+        event['attrs'] = attrs
+    if error:
+        event['error'] = error
+    return event
+
+
+def export_jsonl():
+    """Eventos del búfer como JSON lines, uno por línea"""
+    return ''.join(json.dumps(_event_dict(*event), ensure_ascii=False, default=str) + '\n'
+                   for event in get_events())
+
+
+def export_chrome_trace():
+    """Eventos del búfer en el formato de trazas de Chrome (eventos completos 'X')"""
+    pid = os.getpid()
+    events = []
+    for name, start_ns, duration_ns, thread_id, rows, attrs, error in get_events():
+        args = dict(attrs or {}, rows=rows)
+        if error:
+            args['error'] = error
+        events.append({'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': thread_id,
+                       'ts': (start_ns - _origin_ns) / 1000, 'dur': duration_ns / 1000, 'args': args})
+    return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}, default=str)
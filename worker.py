@@ -0,0 +1,246 @@
+"""
+Trabajadores de la cola de generación de planes con IA.
+
+La interfaz no genera los planes: encola un trabajo en la tabla ai_jobs
+(storage.enqueue_ai_jobs) y consulta su estado. Un pool de procesos
+independiente de Streamlit reserva los trabajos, genera las tareas con la
+IA, las planifica y las guarda. Una generación larga ya no bloquea la
+sesión ni se pierde si el navegador recarga o se desconecta, y el número de
+generaciones simultáneas lo fijan los trabajadores y el límite de cada
+proveedor, no las pestañas abiertas.
+
+La reserva (storage.claim_ai_job) es atómica entre procesos y respeta el
+límite de trabajos en curso por proveedor en toda la base de datos, aunque
+haya varios pools. Los trabajos de un trabajador que cae vuelven a la cola
+pasado JOB_TIMEOUT.
+
+La aplicación arranca un pool al iniciarse (DEVPLANNER_WORKERS procesos;
+0 para no arrancarlo y usar uno externo). Uso sin interfaz:
+    python worker.py                                  # DEVPLANNER_WORKERS procesos
+    python worker.py --workers 8 --limit ollama=1 --limit openai=8
+"""
+import argparse
+import datetime
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+import storage
+from ai import AIError, generate_tasks, plan_to_task_rows
+from epics import generate_tasks_by_epics, should_decompose
+from scheduler import WorkCalendar, schedule_tasks
+from tracing import traced
+
+# Procesos trabajadores por pool
+DEFAULT_WORKERS = int(os.environ.get('DEVPLANNER_WORKERS', '2'))
+# Trabajos en curso a la vez por proveedor (sin entrada = sin límite). Un
+# Ollama local atiende una generación cada vez; las APIs admiten más.
+PROVIDER_CONCURRENCY = {
+    'ollama': 1,
+    'openai': 4,
+    'gemini': 2,
+}
+
+POLL_INTERVAL = 1.0            # segundos entre consultas con la cola vacía
+JOB_TIMEOUT = 600              # un trabajo en curso más tiempo se da por perdido
+MAX_ATTEMPTS = 3               # intentos por trabajo (errores reintentables y caídas)
+MAINTENANCE_INTERVAL = 60      # cada cuánto se recuperan trabajos perdidos y se purgan los viejos
+JOB_RETENTION = 30 * 24 * 3600  # segundos que se guardan los trabajos terminados
+PROGRESS_INTERVAL = 1.0        # segundos mínimos entre escrituras de las tareas recibidas
+
+
+def parse_limits(items):
+    """Límites por proveedor a partir de 'proveedor=N' (lista o texto separado por comas)"""
+    if isinstance(items, str):
+        items = items.split(',')
+    limits = {}
+    for item in items:
+        item = item.strip()
+        if not item:
+            continue
+        provider, _, value = item.partition('=')
+        try:
+            limits[provider.strip()] = int(value)
+        except ValueError:
+            raise ValueError(f"Límite no válido: {item!r} (se espera proveedor=N)") from None
+    return limits
+
+
+def default_limits():
+    """PROVIDER_CONCURRENCY con los cambios de DEVPLANNER_PROVIDER_CONCURRENCY"""
+    return dict(PROVIDER_CONCURRENCY, **parse_limits(os.environ.get('DEVPLANNER_PROVIDER_CONCURRENCY', '')))
+
+
+@traced(name='worker.plan_job', rows=lambda result: len(result[1]))
+def plan_job(job, progress=None):
+    """
+    Genera y planifica el plan de un trabajo; devuelve (resumen, filas de
+    tareas). Mientras llegan las tareas llama a `progress` con las recibidas,
+    como mucho cada PROGRESS_INTERVAL segundos.
+    """
+    project = storage.get_project(job['project_id'])
+    if project is None:
+        raise AIError("El proyecto ya no existe")
+    params = job['params']
+    # La API key no se guarda en la cola: se toma de la configuración si es del mismo proveedor
+    config = storage.get_ai_config()
+    api_key = config[3] if config and config[1] == job['ai_provider'] else None
+
+    report = {}
+    start = time.perf_counter()
+    # Descripciones largas (o si se pidió): por épicas, en paralelo; el resto, en una sola petición
+    if should_decompose(project[2], params.get('hierarchical')):
+        # Las épicas se fusionan al final: las tareas llegan todas juntas
+        tasks = generate_tasks_by_epics(project[2], job['ai_provider'], job['ai_model'], api_key or None,
+                                        use_cache=params.get('use_cache', True), report=report)
+        first_task = time.perf_counter() - start
+    else:
+        tasks, first_task, last_progress = [], None, None
+        for task in generate_tasks(project[2], job['ai_provider'], job['ai_model'], api_key or None,
+                                   use_cache=params.get('use_cache', True), report=report):
+            tasks.append(task)
+            now = time.perf_counter()
+            if first_task is None:
+                first_task = now - start
+            if progress and (last_progress is None or now - last_progress >= PROGRESS_INTERVAL):
+                progress(tasks)
+                last_progress = now
+    report.update(time_to_first_task=first_task, total_time=time.perf_counter() - start)
+    calendar = WorkCalendar(params.get('hours_per_day', 8.0), params.get('workdays', range(5)),
+                            [datetime.date.fromisoformat(day) for day in params.get('holidays', ())])
+    plan = schedule_tasks(tasks, calendar=calendar, break_cycles=True)
+    summary = {
+        'tasks': len(tasks),
+        'length': plan.length,
+        'critical_path': list(plan.critical_path),
+        'dropped_edges': len(plan.dropped_edges),
+        'generation': report,
+    }
+    return summary, plan_to_task_rows(tasks, plan=plan)
+
+
+def run_job(job, worker):
+    """Ejecuta un trabajo reservado y guarda el resultado o el error"""
+    def progress(tasks):
+        storage.update_ai_job_progress(job['id'], worker, {'progress': [
+            {'description': task['description'], 'estimated_hours': task['estimated_hours']} for task in tasks]})
+
+    try:
+        summary, rows = plan_job(job, progress)
+    except AIError as e:
+        # Las métricas de una respuesta inválida también cuentan para la tasa de éxito
+        storage.fail_ai_job(job['id'], worker, e, retry=e.retryable and job['attempts'] < MAX_ATTEMPTS,
+                            result={'generation': e.report} if e.report else None)
+    except Exception as e:
+        storage.fail_ai_job(job['id'], worker, f"{type(e).__name__}: {e}")
+    else:
+        storage.complete_ai_job(job['id'], worker, summary, rows)
+
+
+def work(db_path, limits, stop, parent_pid=None, poll_interval=POLL_INTERVAL):
+    """
+    Bucle de un proceso trabajador: reserva y ejecuta trabajos hasta que se
+    activa `stop` o, si se indica, termina el proceso `parent_pid`.
+    """
+    # Ctrl+C llega a todo el grupo de procesos: solo el pool decide cuándo parar
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    storage.set_pool(storage.ConnectionPool(db_path, size=2))
+    storage.init_db()
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    next_maintenance = 0.0
+    while not stop.is_set():
+        if parent_pid and os.getppid() != parent_pid:
+            break
+        try:
+            if time.monotonic() >= next_maintenance:
+                storage.requeue_stale_ai_jobs(JOB_TIMEOUT, MAX_ATTEMPTS)
+                storage.purge_ai_jobs(JOB_RETENTION)
+                next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+            job = storage.claim_ai_job(name, limits)
+        except sqlite3.OperationalError:
+            # Base de datos ocupada: se reintenta en la siguiente vuelta
+            job = None
+        if job is None:
+            stop.wait(poll_interval)
+        else:
+            run_job(job, name)
+    storage.get_pool().close()
+
+
+def run_pool(db_path, workers=DEFAULT_WORKERS, limits=None, parent_pid=None):
+    """
+    Arranca `workers` procesos y los vigila: reinicia los que mueren y los
+    para todos con SIGINT/SIGTERM o cuando termina `parent_pid`.
+    """
+    db_path = os.path.abspath(db_path)
+    limits = default_limits() if limits is None else limits
+    # spawn: los procesos no heredan hilos ni conexiones abiertas del padre
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+
+    def start(index):
+        process = context.Process(target=work, args=(db_path, limits, stop, os.getpid()),
+                                  name=f'devplanner-worker-{index}', daemon=True)
+        process.start()
+        return process
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    processes = [start(i) for i in range(max(1, workers))]
+    while not stop.wait(POLL_INTERVAL):
+        if parent_pid and os.getppid() != parent_pid:
+            stop.set()
+            break
+        for i, process in enumerate(processes):
+            if not process.is_alive():
+                processes[i] = start(i)
+    for process in processes:
+        process.join(timeout=JOB_TIMEOUT)
+
+
+def start_worker_pool(db_path, workers=DEFAULT_WORKERS):
+    """
+    Lanza el pool en un proceso aparte (`python worker.py`), ligado a este
+    proceso: termina cuando este termina. Devuelve el Popen, o None si
+    `workers` es 0.
+    """
+    if workers <= 0:
+        return None
+    return subprocess.Popen([
+        sys.executable, os.path.abspath(__file__),
+        '--db', os.path.abspath(db_path),
+        '--workers', str(workers),
+        '--parent-pid', str(os.getpid()),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Procesos trabajadores de la cola de generación con IA")
+    parser.add_argument('--db', default=storage.DB_PATH, help="Ruta de la base de datos")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Procesos trabajadores")
+    parser.add_argument('--limit', action='append', default=[], metavar='PROVEEDOR=N',
+                        help="Trabajos en curso a la vez para un proveedor (repetible)")
+    parser.add_argument('--parent-pid', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    try:
+        limits = dict(default_limits(), **parse_limits(args.limit))
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    # Migrar antes de arrancar los procesos, para que no compitan por hacerlo
+    storage.set_pool(storage.ConnectionPool(args.db))
+    storage.init_db()
+    storage.get_pool().close()
+    if not args.parent_pid:
+        limits_text = ', '.join(f'{provider}={limit}' for provider, limit in sorted(limits.items()))
+        print(f"{args.workers} trabajadores sobre {args.db} (límites: {limits_text or 'ninguno'})", flush=True)
+    run_pool(args.db, args.workers, limits, args.parent_pid)
+
+
+if __name__ == '__main__':
+    main()